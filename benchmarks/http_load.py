@@ -0,0 +1,128 @@
+"""End-to-end HTTP load test of `POST /detect_hate_speech/`, through the FastAPI app routing, validation,
+micro-batching, inference, and persistence.
+
+Without `--url`, the app is served in-process (with its dependencies wired like at startup) and, unless `--db` is
+given, with a stub database session. Every request has a distinct text, so none is served from the result cache.
+
+Usage: python -m benchmarks.http_load [--stub] [--db] [--url http://localhost:8000] [--concurrency 16]
+                                      [--n-requests 200] [--out FILE]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stub import StubAsyncSession, get_stub_async_session, patch_llama
+from benchmarks.utils import latency_summary, write_report
+from src.app import (
+    app,
+    get_detection_persister,
+    get_detection_result_cache,
+    get_inference_executor,
+    get_model_registry,
+)
+from src.config import CONFIGS, ResultCacheConfig
+from src.db import dispose_async_engine, get_async_session, init_async_engine
+from src.logging import configure_logging
+from src.persistence import DetectionPersister
+from src.result_cache import DetectionResultCache
+from tests.llm.test_detect_hate_speech import EXAMPLE_HATE_SPEECH, EXAMPLE_NOT_HATE_SPEECH
+
+
+async def run_http_load(client: httpx.AsyncClient, concurrency: int, n_requests: int) -> dict:
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+    texts = [EXAMPLE_NOT_HATE_SPEECH, EXAMPLE_HATE_SPEECH]
+    requests = iter(range(n_requests))
+    latencies: list[float] = []
+    status_codes: Counter[int] = Counter()
+
+    async def _client() -> None:
+        for idx in requests:
+            start = time.perf_counter()
+            resp = await client.post("/detect_hate_speech/", json={"text": f"{texts[idx % len(texts)]} #{idx}"})
+            latencies.append(time.perf_counter() - start)
+            status_codes[resp.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "n_requests": n_requests,
+        "throughput_rps": n_requests / elapsed,
+        "status_codes": {str(code): count for code, count in sorted(status_codes.items())},
+        "latency": latency_summary(latencies),
+    }
+
+
+async def run_in_process(concurrency: int, n_requests: int, db: bool) -> dict:
+    persister = get_detection_persister()
+    executor = get_inference_executor()
+    if not db:
+        result_cache = DetectionResultCache(config=ResultCacheConfig(db_lookup=False))
+        persister = DetectionPersister(
+            session_factory=StubAsyncSession,  # type: ignore[arg-type]  # duck-typed stand-in for `AsyncSession`
+            config=CONFIGS.persistence,
+        )
+        app.dependency_overrides = {
+            get_async_session: get_stub_async_session,
+            get_detection_result_cache: lambda: result_cache,
+            get_detection_persister: lambda: persister,
+        }
+    else:
+        init_async_engine()
+    get_model_registry().preload()
+    executor.start()
+    persister.start()
+    try:
+        # httpx types the ASGI scope and messages as `dict`s, Starlette as `MutableMapping`s
+        transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300.0) as client:
+            return await run_http_load(client=client, concurrency=concurrency, n_requests=n_requests)
+    finally:
+        await persister.stop()
+        executor.shutdown()
+        app.dependency_overrides = {}
+        await dispose_async_engine()
+
+
+async def run_remote(url: str, concurrency: int, n_requests: int) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=300.0) as client:
+        return await run_http_load(client=client, concurrency=concurrency, n_requests=n_requests)
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="use a stub Llama instead of the configured GGUF model")
+    parser.add_argument("--db", action="store_true", help="persist to the configured database instead of a stub")
+    parser.add_argument("--url", default=None, help="base URL of a running app, served in-process if not given")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--n-requests", type=int, default=200)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+
+    if args.url:
+        result = asyncio.run(run_remote(url=args.url, concurrency=args.concurrency, n_requests=args.n_requests))
+    else:
+        with patch_llama() if args.stub else nullcontext():
+            result = asyncio.run(run_in_process(concurrency=args.concurrency, n_requests=args.n_requests, db=args.db))
+    write_report(
+        report={
+            "model_name": CONFIGS.llm.model_name,
+            "stub": args.stub,
+            "url": args.url,
+            "batching": CONFIGS.llm.batching.model_dump(),
+            **result,
+        },
+        out_file=args.out,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Cold-start and per-request latency of serving detections from a warm `ModelRegistry` pool versus loading a new
+`LLMService` per request.
+
+Usage: python -m benchmarks.llm_service_pool [--stub] [--n-requests 20] [--n-baseline-requests 3] [--out FILE]
+"""
+import argparse
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from benchmarks.stub import patch_llama
+from benchmarks.utils import latency_summary, write_report
+from src.config import CONFIGS
+from src.llm import LLMService
+from src.llm.detect_hate_speech import llm_detect_hate_speech
+from src.llm.registry import ModelRegistry
+from src.logging import configure_logging
+
+SAMPLE_TEXT = "We have enough problems in the world. Stop hating on each other"
+
+
+def bench_pool(n_requests: int) -> dict:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm])
+    start = time.perf_counter()
+    registry.preload()
+    cold_start_s = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        with registry.acquire() as llm_service:
+            llm_detect_hate_speech(llm=llm_service, text=SAMPLE_TEXT)
+        latencies.append(time.perf_counter() - start)
+    return {"cold_start_s": cold_start_s, "per_request": latency_summary(latencies)}
+
+
+def bench_load_per_request(n_requests: int) -> dict:
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        llm_detect_hate_speech(llm=LLMService(), text=SAMPLE_TEXT)
+        latencies.append(time.perf_counter() - start)
+    return {"per_request": latency_summary(latencies)}
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="use a stub Llama instead of the configured GGUF model")
+    parser.add_argument("--n-requests", type=int, default=20)
+    parser.add_argument("--n-baseline-requests", type=int, default=3)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+
+    with patch_llama() if args.stub else nullcontext():
+        report = {
+            "model_name": CONFIGS.llm.model_name,
+            "stub": args.stub,
+            "pool_size": CONFIGS.llm.pool.size,
+            "warm_pool": bench_pool(n_requests=args.n_requests),
+            "load_per_request": bench_load_per_request(n_requests=args.n_baseline_requests),
+        }
+    write_report(report=report, out_file=args.out)
+
+
+if __name__ == "__main__":
+    main()
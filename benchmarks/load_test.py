@@ -0,0 +1,94 @@
+"""Throughput versus latency of detection requests at different micro-batching settings.
+
+Each setting `<max_batch_size>:<max_wait_ms>` is run in-process through the same `BatchScheduler` -> `InferenceExecutor`
+path as the API, with `--concurrency` clients sending `--n-requests` requests in total.
+
+Usage: python -m benchmarks.load_test [--stub] [--settings 1:0,4:10,8:25] [--concurrency 16] [--n-requests 200]
+"""
+import argparse
+import asyncio
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from benchmarks.stub import patch_llama
+from benchmarks.utils import latency_summary, write_report
+from src.config import CONFIGS, LLMBatchingConfig
+from src.llm.batching import BatchScheduler
+from src.llm.detect_hate_speech import llm_detect_hate_speech_batch
+from src.llm.executor import InferenceExecutor
+from src.llm.registry import ModelRegistry
+from src.logging import configure_logging
+from tests.llm.test_detect_hate_speech import EXAMPLE_HATE_SPEECH, EXAMPLE_NOT_HATE_SPEECH
+
+
+def parse_settings(settings: str) -> list[LLMBatchingConfig]:
+    configs = []
+    for setting in settings.split(","):
+        max_batch_size, max_wait_ms = setting.split(":")
+        configs.append(
+            LLMBatchingConfig(enabled=True, max_batch_size=int(max_batch_size), max_wait_ms=float(max_wait_ms))
+        )
+    return configs
+
+
+async def run_load(registry: ModelRegistry, batching: LLMBatchingConfig, concurrency: int, n_requests: int) -> dict:
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    scheduler = BatchScheduler(executor=executor, batch_fn=llm_detect_hate_speech_batch, config=batching)
+    texts = [EXAMPLE_NOT_HATE_SPEECH, EXAMPLE_HATE_SPEECH]
+    requests = iter(range(n_requests))
+    latencies: list[float] = []
+
+    async def _client() -> None:
+        for idx in requests:
+            start = time.perf_counter()
+            await scheduler.submit(texts[idx % len(texts)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+    return {
+        "max_batch_size": batching.max_batch_size,
+        "max_wait_ms": batching.max_wait_ms,
+        "throughput_rps": n_requests / elapsed,
+        "mean_batch_size": scheduler.status()["mean_batch_size"],
+        "latency": latency_summary(latencies),
+    }
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="use a stub Llama instead of the configured GGUF model")
+    parser.add_argument("--settings", type=parse_settings, default=parse_settings("1:0,4:10,8:25"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--n-requests", type=int, default=200)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+
+    with patch_llama() if args.stub else nullcontext():
+        registry = ModelRegistry(llm_configs=[CONFIGS.llm])
+        registry.preload()
+        results = [
+            asyncio.run(
+                run_load(registry=registry, batching=batching, concurrency=args.concurrency, n_requests=args.n_requests)
+            )
+            for batching in args.settings
+        ]
+    write_report(
+        report={
+            "model_name": CONFIGS.llm.model_name,
+            "stub": args.stub,
+            "pool_size": CONFIGS.llm.pool.size,
+            "concurrency": args.concurrency,
+            "n_requests": args.n_requests,
+            "results": results,
+        },
+        out_file=args.out,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Dashboard queries and retention on a synthetic multi-million-row results dataset, with the layout of
+`detect_hate_speech_result` before partitioning (`uuid` primary key only) versus after (monthly partitions and the
+indexes of `DetectHateSpeechSQLModel`).
+
+Both tables are generated server-side in a scratch `bench_partitions` schema of the configured database, dropped at
+the end, with rows spread over the last 12 months.
+
+Usage: python -m benchmarks.partitions [--n-rows 5000000] [--n-runs 10] [--out FILE]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.pool import NullPool
+
+from benchmarks.utils import latency_summary, write_report
+from src.config import CONFIGS
+from src.db import create_async_engine_from_config
+from src.logging import configure_logging
+from src.partitions import add_months
+
+SCHEMA = "bench_partitions"
+N_MONTHS = 12
+TARGETS = ["African", "Arab", "Asian", "Hispanic", "Islam", "Jewish", "Refugee", "Women", "Homosexual", "Other"]
+
+_COLUMNS = (
+    "uuid uuid NOT NULL, created_at timestamptz NOT NULL, is_hate_speech boolean NOT NULL, target_of_hate varchar[]"
+)
+
+_RANDOM_TARGET = f"ARRAY[(ARRAY{TARGETS})[1 + floor(random() * {len(TARGETS)})::int]]"
+
+# Rows over the last `N_MONTHS` months, 1 in 10 flagged as hate speech with one or two targets
+_GENERATE_ROWS = f"""
+INSERT INTO {{table}}
+SELECT gen_random_uuid(), now() - random() * interval '{N_MONTHS} months', hate, CASE WHEN hate THEN
+    {_RANDOM_TARGET} || CASE WHEN random() < 0.3 THEN {_RANDOM_TARGET} ELSE '{{{{}}}}' END
+    ELSE '{{{{}}}}' END
+FROM (SELECT random() < 0.1 AS hate FROM generate_series(1, :n_rows)) AS series
+"""  # noqa: S608
+
+QUERIES = {
+    "daily_counts_last_7_days": (
+        "SELECT date_trunc('day', created_at), count(*) FROM {table} "
+        "WHERE created_at >= now() - interval '7 days' GROUP BY 1"
+    ),
+    "hate_speech_last_30_days": (
+        "SELECT count(*) FROM {table} WHERE is_hate_speech AND created_at >= now() - interval '30 days'"
+    ),
+    "target_last_30_days": (
+        "SELECT count(*) FROM {table} WHERE target_of_hate @> ARRAY['Women']::varchar[] "
+        "AND created_at >= now() - interval '30 days'"
+    ),
+    "get_by_uuid": "SELECT * FROM {table} WHERE uuid = (SELECT uuid FROM {table} LIMIT 1)",
+}
+
+
+async def _create_tables(conn: AsyncConnection) -> None:
+    await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    await conn.execute(text(f"CREATE TABLE {SCHEMA}.flat ({_COLUMNS}, PRIMARY KEY (uuid))"))
+    await conn.execute(text(f"CREATE UNIQUE INDEX ix_flat_uuid ON {SCHEMA}.flat (uuid)"))
+    await conn.execute(
+        text(
+            f"CREATE TABLE {SCHEMA}.partitioned ({_COLUMNS}, PRIMARY KEY (uuid, created_at)) "
+            "PARTITION BY RANGE (created_at)"
+        )
+    )
+    current_month = datetime.now(tz=timezone.utc).date().replace(day=1)
+    for n_months in range(-N_MONTHS, 2):
+        month = add_months(current_month, n_months)
+        await conn.execute(
+            text(
+                f"CREATE TABLE {SCHEMA}.partitioned_p{month:%Y_%m} PARTITION OF {SCHEMA}.partitioned "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            )
+        )
+    for index in [
+        "(created_at)",
+        "(is_hate_speech, created_at)",
+        "USING gin (target_of_hate)",
+    ]:
+        await conn.execute(text(f"CREATE INDEX ON {SCHEMA}.partitioned {index}"))
+
+
+async def _time_query(conn: AsyncConnection, query: str, n_runs: int) -> dict:
+    latencies = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        await conn.execute(text(query))
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+
+async def _time_retention(conn: AsyncConnection) -> dict:
+    """Time to remove the rows of the oldest month"""
+    oldest_month = add_months(datetime.now(tz=timezone.utc).date().replace(day=1), -N_MONTHS)
+    delete_stmt = f"DELETE FROM {SCHEMA}.flat WHERE created_at < '{add_months(oldest_month, 1)}'"  # noqa: S608
+    start = time.perf_counter()
+    await conn.execute(text(delete_stmt))
+    delete_s = time.perf_counter() - start
+    partition = f"{SCHEMA}.partitioned_p{oldest_month:%Y_%m}"
+    start = time.perf_counter()
+    await conn.execute(text(f"ALTER TABLE {SCHEMA}.partitioned DETACH PARTITION {partition}"))
+    await conn.execute(text(f"DROP TABLE {partition}"))
+    drop_s = time.perf_counter() - start
+    return {"flat_delete_s": delete_s, "partitioned_drop_s": drop_s}
+
+
+async def run_partitions_benchmark(n_rows: int, n_runs: int) -> dict:
+    engine = create_async_engine_from_config(CONFIGS.db, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            await _create_tables(conn)
+            load_s = {}
+            for table in ["flat", "partitioned"]:
+                start = time.perf_counter()
+                await conn.execute(text(_GENERATE_ROWS.format(table=f"{SCHEMA}.{table}")), {"n_rows": n_rows})
+                await conn.execute(text(f"ANALYZE {SCHEMA}.{table}"))
+                load_s[table] = time.perf_counter() - start
+            queries = {
+                name: {
+                    table: await _time_query(conn, query.format(table=f"{SCHEMA}.{table}"), n_runs=n_runs)
+                    for table in ["flat", "partitioned"]
+                }
+                for name, query in QUERIES.items()
+            }
+            retention = await _time_retention(conn)
+            await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    finally:
+        await engine.dispose()
+    return {"n_rows": n_rows, "load_s": load_s, "queries": queries, "retention": retention}
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-rows", type=int, default=5_000_000)
+    parser.add_argument("--n-runs", type=int, default=10)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+    write_report(
+        report=asyncio.run(run_partitions_benchmark(n_rows=args.n_rows, n_runs=args.n_runs)), out_file=args.out
+    )
+
+
+if __name__ == "__main__":
+    main()
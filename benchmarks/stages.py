@@ -0,0 +1,140 @@
+"""Latency of each stage of a detection: model load, grammar construction, prompt formatting, prompt eval versus
+generation, output parsing, and the persistence done by the `detect_hate_speech` handler.
+
+The persistence stage needs the configured Postgres database and only runs with `--db`.
+
+Usage: python -m benchmarks.stages [--stub] [--db] [--n-runs 20] [--n-loads 3] [--out FILE]
+"""
+import argparse
+import asyncio
+import time
+from collections.abc import Callable, Iterator
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, cast
+
+from benchmarks.stub import STUB_RESULT, patch_llama
+from benchmarks.utils import latency_summary, write_report
+from src.config import CONFIGS
+from src.db import async_session_factory, dispose_async_engine, init_async_engine
+from src.llm import LLMService, get_llama_grammar, pydantic_model_to_llama_grammar
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT, INPUT_TEXT_KEY
+from src.logging import configure_logging
+from src.models import DetectHateSpeechResult, DetectHateSpeechSQLModel, LLMRun, LLMRunSQLModel
+from src.persistence import DetectionPersister
+
+SAMPLE_TEXT = "We have enough problems in the world. Stop hating on each other"
+
+
+def _time_runs(fn: Callable[[], Any], n_runs: int) -> dict:
+    latencies = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+
+def bench_model_load(n_loads: int) -> dict:
+    return _time_runs(LLMService, n_runs=n_loads)
+
+
+def bench_grammar(n_runs: int) -> dict:
+    get_llama_grammar(DetectHateSpeechResult)  # compiled on the first call only
+    return {
+        "build": _time_runs(lambda: pydantic_model_to_llama_grammar(DetectHateSpeechResult), n_runs=n_runs),
+        "cached": _time_runs(lambda: get_llama_grammar(DetectHateSpeechResult), n_runs=n_runs),
+    }
+
+
+def bench_prompt_format(n_runs: int) -> dict:
+    return _time_runs(lambda: HATE_SPEECH_DETECTION_PROMPT.format_inputs({INPUT_TEXT_KEY: SAMPLE_TEXT}), n_runs=n_runs)
+
+
+def bench_completion(llm_service: LLMService, n_runs: int) -> dict:
+    """Prompt eval (until the first generated token) versus generation of the rest, from an empty KV cache"""
+    prompt = HATE_SPEECH_DETECTION_PROMPT.format_inputs({INPUT_TEXT_KEY: SAMPLE_TEXT})
+    prompt_eval, generation, n_tokens = [], [], []
+    for _ in range(n_runs):
+        llm_service.model.reset()
+        start = time.perf_counter()
+        chunks = cast(
+            Iterator[dict],
+            llm_service.model.create_completion(
+                prompt=prompt,
+                stream=True,
+                grammar=get_llama_grammar(DetectHateSpeechResult),
+                **llm_service.default_run_configs,
+            ),
+        )
+        first_token_at = None
+        n_chunks = 0
+        for _chunk in chunks:
+            first_token_at = first_token_at or time.perf_counter()
+            n_chunks += 1
+        end = time.perf_counter()
+        prompt_eval.append((first_token_at or end) - start)
+        generation.append(end - (first_token_at or end))
+        n_tokens.append(max(n_chunks - 1, 0))  # the last chunk only has the finish reason
+    return {
+        "prompt_eval": latency_summary(prompt_eval),
+        "generation": latency_summary(generation),
+        "generation_tokens_per_s": sum(n_tokens) / sum(generation) if sum(generation) else None,
+    }
+
+
+def bench_parse(n_runs: int) -> dict:
+    output = STUB_RESULT.model_dump_json()
+    return _time_runs(lambda: DetectHateSpeechResult.model_validate_json(output), n_runs=n_runs)
+
+
+async def bench_db_persist(n_runs: int) -> dict:
+    """The transaction of the `detect_hate_speech` handler writing the LLM run and the detection result"""
+    llm_run = LLMRun(
+        prompt=SAMPLE_TEXT, llm_model_name=CONFIGS.llm.model_name, success=True, llm_model_configs={}, run_configs={}
+    )
+    init_async_engine()
+    persister = DetectionPersister(session_factory=async_session_factory, config=CONFIGS.persistence)
+    latencies = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        llm_run_sql = LLMRunSQLModel(**llm_run.model_dump())
+        detect_res = DetectHateSpeechSQLModel(text=SAMPLE_TEXT, llm_run_id=llm_run_sql.uuid, **STUB_RESULT.model_dump())
+        await persister.save([llm_run_sql, detect_res])
+        latencies.append(time.perf_counter() - start)
+    await dispose_async_engine()
+    return latency_summary(latencies)
+
+
+def run_stages(n_runs: int, n_loads: int, db: bool) -> dict:
+    llm_service = LLMService()
+    return {
+        "model_load": bench_model_load(n_loads=n_loads),
+        "grammar": bench_grammar(n_runs=n_runs),
+        "prompt_format": bench_prompt_format(n_runs=n_runs),
+        "completion": bench_completion(llm_service=llm_service, n_runs=n_runs),
+        "parse": bench_parse(n_runs=n_runs),
+        "db_persist": asyncio.run(bench_db_persist(n_runs=n_runs)) if db else {"skipped": "requires --db"},
+    }
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="use a stub Llama instead of the configured GGUF model")
+    parser.add_argument("--db", action="store_true", help="also benchmark the persistence to the configured database")
+    parser.add_argument("--n-runs", type=int, default=20)
+    parser.add_argument("--n-loads", type=int, default=3)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+
+    with patch_llama() if args.stub else nullcontext():
+        stages = run_stages(n_runs=args.n_runs, n_loads=args.n_loads, db=args.db)
+    write_report(
+        report={"model_name": CONFIGS.llm.model_name, "stub": args.stub, "n_runs": args.n_runs, "stages": stages},
+        out_file=args.out,
+    )
+
+
+if __name__ == "__main__":
+    main()
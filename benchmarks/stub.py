@@ -0,0 +1,223 @@
+import asyncio
+import re
+import threading
+import time
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import numpy as np
+
+import src.llm
+from src.models import DetectHateSpeechResult
+
+STUB_RESULT = DetectHateSpeechResult(is_hate_speech=False, target_of_hate=[], reasoning="Stub reasoning")
+
+# Words tokenized by the stub models, shared like the vocabulary of a GGUF file
+_STUB_VOCAB: dict[bytes, int] = {}
+
+
+class StubLlama:
+    """Offline stand-in for `llama_cpp.Llama` with configurable load, prompt eval, and per-token generation latency.
+
+    Like llama.cpp, prompt tokens already in the (simulated) KV cache are not evaluated again.
+    """
+
+    load_delay_s = 0.5
+    prompt_token_delay_s = 0.0005
+    token_delay_s = 0.002
+    batch_token_delay_s = 0.001  # added to a decoding step of a batch by each sequence after the first
+
+    def __init__(self, model_path: str, **kwargs: Any) -> None:
+        time.sleep(self.load_delay_s)
+        self.model_path = model_path
+        self.model_configs = kwargs
+        self.input_ids = np.zeros(kwargs.get("n_ctx", 2048), dtype=np.intc)
+        self.n_tokens = 0
+        self.prompt_eval_s = 0.0
+        self.generation_s = 0.0
+
+    def n_ctx(self) -> int:
+        return len(self.input_ids)
+
+    @property
+    def _input_ids(self) -> np.ndarray:
+        return self.input_ids[: self.n_tokens]
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list[int]:
+        # One token per word, ids after the BOS one
+        tokens = [_STUB_VOCAB.setdefault(word, len(_STUB_VOCAB) + 2) for word in text.split()]
+        return [1, *tokens] if add_bos else tokens
+
+    def detokenize(self, tokens: list[int]) -> bytes:
+        words = {token: word for word, token in _STUB_VOCAB.items()}
+        return b" ".join(words[token] for token in tokens if token in words)
+
+    def reset(self) -> None:
+        self.n_tokens = 0
+
+    def eval(self, tokens: list[int]) -> None:  # noqa: A003
+        time.sleep(len(tokens) * self.prompt_token_delay_s)
+        self.prompt_eval_s += len(tokens) * self.prompt_token_delay_s
+        self.input_ids[self.n_tokens : self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+
+    def create_completion(
+        self, prompt: str, max_tokens: int | None = 16, stream: bool = False, **kwargs: Any
+    ) -> dict | Iterator[dict]:
+        prompt_tokens = self.tokenize(prompt.encode("utf-8"))
+        n_cached = 0
+        for cached, token in zip(self._input_ids.tolist(), prompt_tokens[:-1], strict=False):
+            if cached != token:
+                break
+            n_cached += 1
+        self.n_tokens = n_cached
+        self.eval(prompt_tokens[n_cached:])
+
+        token_texts = _stub_token_texts(max_tokens=max_tokens)
+        text = "".join(token_texts)
+        completion_tokens = len(token_texts)
+        completion = {
+            "id": f"cmpl-{uuid.uuid4()}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": self.model_path,
+            "choices": [{"text": text, "index": 0, "logprobs": None, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(prompt_tokens),
+                "completion_tokens": completion_tokens,
+                "total_tokens": len(prompt_tokens) + completion_tokens,
+            },
+        }
+        if stream:
+            return self._stream_completion(completion=completion, token_texts=token_texts)
+        time.sleep(completion_tokens * self.token_delay_s)
+        self.generation_s += completion_tokens * self.token_delay_s
+        return completion
+
+    def _stream_completion(self, completion: dict, token_texts: list[str]) -> Iterator[dict]:
+        chunk = {key: value for key, value in completion.items() if key != "usage"}
+        for token_text in token_texts:
+            time.sleep(self.token_delay_s)
+            self.generation_s += self.token_delay_s
+            yield {**chunk, "choices": [{"text": token_text, "index": 0, "logprobs": None, "finish_reason": None}]}
+        yield {**chunk, "choices": [{"text": "", "index": 0, "logprobs": None, "finish_reason": "stop"}]}
+
+
+class StubAsyncSession:
+    """Offline stand-in for `AsyncSession` discarding the rows, with a configurable commit latency"""
+
+    commit_delay_s = 0.002
+
+    def add(self, instance: Any) -> None:
+        pass
+
+    def add_all(self, instances: list) -> None:
+        pass
+
+    async def execute(self, statement: Any) -> None:
+        pass
+
+    async def commit(self) -> None:
+        await asyncio.sleep(self.commit_delay_s)
+
+    async def get(self, entity: type, ident: Any) -> None:
+        return None
+
+    async def __aenter__(self) -> "StubAsyncSession":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        pass
+
+
+async def get_stub_async_session() -> AsyncIterator[StubAsyncSession]:
+    yield StubAsyncSession()
+
+
+def _stub_token_texts(max_tokens: int | None) -> list[str]:
+    # One (simulated) token per word or punctuation character, with the whitespaces preceding it
+    token_texts = re.findall(r"\s*(?:\w+|[^\w\s])", STUB_RESULT.model_dump_json())
+    return token_texts[:max_tokens] if max_tokens and max_tokens > 0 else token_texts
+
+
+def _stub_create_completions(  # noqa: PLR0913
+    model: StubLlama,
+    prompts_tokens: list[list[int]],
+    n_shared: int,
+    max_tokens: list[int],
+    grammars: list,
+    run_configs: dict,
+    cancel_event: threading.Event | None = None,
+) -> tuple[list[src.llm._SequenceCompletion], src.llm._CompletionTimings]:
+    n_cached = src.llm._common_prefix_len(model._input_ids.tolist(), prompts_tokens[0][:n_shared])
+    prompt_eval_s = (n_shared - n_cached + sum(len(tokens) - n_shared for tokens in prompts_tokens)) * (
+        model.prompt_token_delay_s
+    )
+    time.sleep(prompt_eval_s)
+    sequences_token_texts = [_stub_token_texts(max_tokens=seq_max_tokens) for seq_max_tokens in max_tokens]
+    generation_s = 0.0
+    for step in range(max(len(token_texts) for token_texts in sequences_token_texts)):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        n_active = sum(len(token_texts) > step for token_texts in sequences_token_texts)
+        step_s = model.token_delay_s + (n_active - 1) * model.batch_token_delay_s
+        time.sleep(step_s)
+        generation_s += step_s
+    model.input_ids[:n_shared] = prompts_tokens[0][:n_shared]
+    model.n_tokens = n_shared
+    completions = [
+        src.llm._SequenceCompletion(
+            text="".join(token_texts),
+            n_tokens=len(token_texts),
+            finish_reason="length" if len(token_texts) < len(_stub_token_texts(max_tokens=None)) else "stop",
+        )
+        for token_texts in sequences_token_texts
+    ]
+    return completions, src.llm._CompletionTimings(prompt_eval_s=prompt_eval_s, generation_s=generation_s)
+
+
+def _stub_copy_kv_state(model: StubLlama) -> bytes:
+    return model._input_ids.tobytes()
+
+
+def _stub_set_kv_state(model: StubLlama, kv_state: bytes, tokens: list[int]) -> None:
+    model.input_ids[: len(tokens)] = tokens
+    model.n_tokens = len(tokens)
+
+
+def _stub_set_n_threads(model: StubLlama, n_threads: int, n_threads_batch: int) -> None:
+    model.model_configs = {**model.model_configs, "n_threads": n_threads, "n_threads_batch": n_threads_batch}
+
+
+def _stub_reset_timings(model: StubLlama) -> None:
+    model.prompt_eval_s = model.generation_s = 0.0
+
+
+def _stub_get_timings(model: StubLlama) -> src.llm._CompletionTimings:
+    return src.llm._CompletionTimings(prompt_eval_s=model.prompt_eval_s, generation_s=model.generation_s)
+
+
+_PATCHED_LLAMA_FUNCTIONS = {
+    "_create_completions": _stub_create_completions,
+    "_copy_kv_state": _stub_copy_kv_state,
+    "_set_kv_state": _stub_set_kv_state,
+    "_set_n_threads": _stub_set_n_threads,
+    "_reset_timings": _stub_reset_timings,
+    "_get_timings": _stub_get_timings,
+}
+
+
+@contextmanager
+def patch_llama(stub_cls: type = StubLlama) -> Iterator[None]:
+    """Make `LLMService` build `stub_cls` instead of loading a GGUF model"""
+    originals = {name: getattr(src.llm, name) for name in ["_load_llama", *_PATCHED_LLAMA_FUNCTIONS]}
+    src.llm._load_llama = stub_cls
+    for name, stub_fn in _PATCHED_LLAMA_FUNCTIONS.items():
+        setattr(src.llm, name, stub_fn)
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(src.llm, name, original)
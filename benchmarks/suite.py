@@ -0,0 +1,126 @@
+"""Run all the benchmarks and save their results per commit, then compare the results of two commits.
+
+`run` saves `<results dir>/<commit>.json` (`<commit>-dirty.json` with uncommitted changes). `compare` prints the
+relative change of every latency and throughput metric, and exits with an error if one regressed by more than
+`--threshold`.
+
+Usage: python -m benchmarks run [--stub] [--db] [--n-runs 20] [--n-requests 200] [--results-dir DIR]
+       python -m benchmarks compare BASE.json HEAD.json [--threshold 0.1]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.http_load import run_in_process
+from benchmarks.stages import run_stages
+from benchmarks.stub import patch_llama
+from benchmarks.utils import write_report
+from src.config import CONFIGS, PROJECT_ROOT_PATH
+from src.logging import configure_logging
+
+RESULTS_DIR_PATH = Path(__file__).parent / "results"
+
+# Suffixes of the metrics compared between runs, lower is better for latencies, higher for throughputs
+_LATENCY_SUFFIXES = ("_ms", "_s")
+_THROUGHPUT_SUFFIXES = ("_per_s", "_rps")
+
+
+def git_commit() -> str:
+    def _git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=PROJECT_ROOT_PATH, capture_output=True, text=True, check=True  # noqa: S603, S607
+        ).stdout.strip()
+
+    try:
+        commit = _git("rev-parse", "--short", "HEAD")
+        return f"{commit}-dirty" if _git("status", "--porcelain", "--untracked-files=no") else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(stub: bool, db: bool, n_runs: int, n_requests: int, concurrency: int = 16) -> dict:
+    with patch_llama() if stub else nullcontext():
+        stages = run_stages(n_runs=n_runs, n_loads=min(n_runs, 3), db=db)
+        http_load = asyncio.run(run_in_process(concurrency=concurrency, n_requests=n_requests, db=db))
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(tz=timezone.utc),
+        "python": platform.python_version(),
+        "model_name": CONFIGS.llm.model_name,
+        "stub": stub,
+        "stages": stages,
+        "http_load": http_load,
+    }
+
+
+def flatten_metrics(report: dict, prefix: str = "") -> dict[str, float]:
+    """Latency and throughput metrics of a report, keyed by their dotted path"""
+    metrics = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten_metrics(value, prefix=f"{path}."))
+        elif (
+            isinstance(value, int | float)
+            and not isinstance(value, bool)
+            and key.endswith(_LATENCY_SUFFIXES + _THROUGHPUT_SUFFIXES)
+        ):
+            metrics[path] = float(value)
+    return metrics
+
+
+def compare_reports(base: dict, head: dict, threshold: float) -> list[dict]:
+    """Relative change of the metrics in both reports, `regression` if worse by more than `threshold`"""
+    base_metrics, head_metrics = flatten_metrics(base), flatten_metrics(head)
+    changes = []
+    for path in sorted(base_metrics.keys() & head_metrics.keys()):
+        base_value, head_value = base_metrics[path], head_metrics[path]
+        if not base_value:
+            continue
+        change = (head_value - base_value) / base_value
+        worse = -change if path.endswith(_THROUGHPUT_SUFFIXES) else change
+        changes.append(
+            {"metric": path, "base": base_value, "head": head_value, "change": change, "regression": worse > threshold}
+        )
+    return changes
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run all the benchmarks and save the results of the commit")
+    run_parser.add_argument("--stub", action="store_true", help="use a stub Llama instead of the configured GGUF model")
+    run_parser.add_argument("--db", action="store_true", help="persist to the configured database instead of a stub")
+    run_parser.add_argument("--n-runs", type=int, default=20)
+    run_parser.add_argument("--n-requests", type=int, default=200)
+    run_parser.add_argument("--results-dir", type=Path, default=RESULTS_DIR_PATH)
+    compare_parser = subparsers.add_parser("compare", help="compare the saved results of two commits")
+    compare_parser.add_argument("base", type=Path)
+    compare_parser.add_argument("head", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run_suite(stub=args.stub, db=args.db, n_runs=args.n_runs, n_requests=args.n_requests)
+        out_file = args.results_dir / f"{report['commit']}.json"
+        write_report(report=report, out_file=out_file)
+        sys.stdout.write(f"Saved benchmark results to {out_file}\n")
+        return
+
+    changes = compare_reports(
+        base=json.loads(args.base.read_text()), head=json.loads(args.head.read_text()), threshold=args.threshold
+    )
+    for change in changes:
+        sys.stdout.write(
+            f"{'REGRESSION ' if change['regression'] else ''}{change['metric']}: "
+            f"{change['base']:.3f} -> {change['head']:.3f} ({change['change']:+.1%})\n"
+        )
+    if any(change["regression"] for change in changes):
+        sys.exit(1)
@@ -0,0 +1,33 @@
+import json
+import statistics
+import sys
+from pathlib import Path
+
+
+def latency_summary(latencies_s: list[float]) -> dict:
+    """Summarize latencies in seconds as count, mean, and p50/p95/p99 in milliseconds"""
+    if not latencies_s:
+        return {"count": 0}
+    ordered = sorted(latencies_s)
+
+    def _percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": _percentile(0.5),
+        "p95_ms": _percentile(0.95),
+        "p99_ms": _percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def write_report(report: dict, out_file: Path | None = None) -> None:
+    """Write the benchmark report as JSON to `out_file`, or to stdout if not given"""
+    content = json.dumps(report, indent=2, default=str)
+    if out_file is None:
+        sys.stdout.write(content + "\n")
+        return
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    out_file.write_text(content + "\n")
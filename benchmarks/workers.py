@@ -0,0 +1,126 @@
+"""Memory and throughput of the app as worker processes are added, the models being loaded before forking them (see
+`src.prefork`).
+
+For each worker count, the app is started with `python -m src.app` on `--port`, with the configured model and database,
+then loaded with `benchmarks.http_load`. The RSS and PSS of the parent and of each worker are read from
+`/proc/<pid>/smaps_rollup` (Linux only) once the app is ready and after the load. The PSS splits the shared pages (e.g.:
+the mmap'd weights) between the processes sharing them, so the total PSS is the actual memory of the app.
+
+Usage: python -m benchmarks.workers [--workers 1,2,4] [--port 8100] [--concurrency 16] [--n-requests 200] [--out FILE]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.http_load import run_remote
+from benchmarks.utils import write_report
+from src.config import CONFIGS, PROJECT_ROOT_PATH
+from src.logging import configure_logging
+
+_READY_TIMEOUT_S = 600
+
+
+def process_memory_mb(pid: int) -> dict:
+    memory = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+            memory[f"{key.lower()}_mb"] = int(value.split()[0]) / 1024
+    return memory
+
+
+def child_pids(pid: int) -> list[int]:
+    return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+
+
+def app_memory_mb(pid: int) -> dict:
+    """Memory of the app process of `pid` and of its workers, if any"""
+    parent = process_memory_mb(pid)
+    workers = [process_memory_mb(child) for child in child_pids(pid)]
+    return {
+        "parent": parent,
+        "workers": workers,
+        "total_pss_mb": parent["pss_mb"] + sum(worker["pss_mb"] for worker in workers),
+    }
+
+
+async def _wait_ready(url: str, process: subprocess.Popen) -> float:
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.perf_counter() - start < _READY_TIMEOUT_S:
+            if process.poll() is not None:
+                raise RuntimeError(f"App exited with code {process.returncode}")
+            try:
+                if (await client.get("/health/")).status_code == httpx.codes.OK:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"App not ready after {_READY_TIMEOUT_S}s")
+
+
+async def run_with_workers(n_workers: int, port: int, concurrency: int, n_requests: int) -> dict:
+    env = {**os.environ, "DYNACONF_WORKERS__COUNT": str(n_workers), "DYNACONF_UVICORN__PORT": str(port)}
+    process = subprocess.Popen([sys.executable, "-m", "src.app"], cwd=PROJECT_ROOT_PATH, env=env)  # noqa: S603
+    url = f"http://localhost:{port}"
+    try:
+        ready_s = await _wait_ready(url=url, process=process)
+        memory_ready = app_memory_mb(process.pid)
+        load = await run_remote(url=url, concurrency=concurrency, n_requests=n_requests)
+        memory_loaded = app_memory_mb(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+    return {"ready_s": ready_s, "memory_ready": memory_ready, "memory_loaded": memory_loaded, **load}
+
+
+async def run_workers_benchmark(worker_counts: list[int], port: int, concurrency: int, n_requests: int) -> dict:
+    runs = {}
+    for n_workers in worker_counts:
+        runs[str(n_workers)] = await run_with_workers(
+            n_workers=n_workers, port=port, concurrency=concurrency, n_requests=n_requests
+        )
+    base_rps = runs[str(worker_counts[0])]["throughput_rps"]
+    for run in runs.values():
+        run["throughput_scaling"] = run["throughput_rps"] / base_rps
+    return runs
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--n-requests", type=int, default=200)
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+    runs = asyncio.run(
+        run_workers_benchmark(
+            worker_counts=[int(n_workers) for n_workers in args.workers.split(",")],
+            port=args.port,
+            concurrency=args.concurrency,
+            n_requests=args.n_requests,
+        )
+    )
+    write_report(
+        report={
+            "model_name": CONFIGS.llm.model_name,
+            "model_configs": CONFIGS.llm.model_configs,
+            "split_threads": CONFIGS.workers.split_threads,
+            "cpu_count": os.cpu_count(),
+            "runs": runs,
+        },
+        out_file=args.out,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,15 @@ import asyncio
 from logging.config import fileConfig
 
 from alembic import context
+from alembic.runtime.environment import NameFilterParentNames, NameFilterType
 from alembic.script import ScriptDirectory
 from sqlalchemy.engine import Connection
+from sqlalchemy.pool import NullPool
 
 from src.config import CONFIGS
-from src.db import async_engine
+from src.db import create_async_engine_from_config
 from src.models import BaseSQLModel
+from src.partitions import PARTITION_NAME_PATTERN
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -30,6 +33,11 @@ target_metadata = BaseSQLModel.metadata
 # ... etc.
 
 
+def include_name(name: str | None, type_: NameFilterType, _parent_names: NameFilterParentNames) -> bool:
+    # Partitions are managed by `src.partitions`, they are not tables of the models
+    return not (type_ == "table" and name is not None and PARTITION_NAME_PATTERN.match(name))
+
+
 def process_revision_directives(_context, _revision, _directives) -> None:  # type: ignore
     # extract Migration
     migration_script = _directives[0]
@@ -66,6 +74,7 @@ def run_migrations_offline() -> None:
         dialect_opts={"paramstyle": "named"},
         process_revision_directives=process_revision_directives,
         include_schemas=True,
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -78,6 +87,7 @@ def do_run_migrations(connection: Connection) -> None:
         target_metadata=target_metadata,
         process_revision_directives=process_revision_directives,
         include_schemas=True,
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -93,7 +103,7 @@ async def run_async_migrations() -> None:
     connectable = context.config.attributes.get("connection", None)
 
     if connectable is None:
-        connectable = async_engine
+        connectable = create_async_engine_from_config(CONFIGS.db, poolclass=NullPool)
 
     async with connectable.connect() as connection:
         await connection.run_sync(do_run_migrations)
@@ -0,0 +1,74 @@
+"""add llm config table and compact llm runs
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 22:14:05.731902
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: str | None = "0007"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+_JSONB_COLUMNS = ["llm_model_configs", "run_configs", "llm_outputs", "run_metadata"]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_config",
+        sa.Column("configs", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("config_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("config_hash"),
+    )
+    op.add_column("llm_run", sa.Column("prompt_template_id", sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column("llm_run", sa.Column("prompt_inputs", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column("llm_run", sa.Column("llm_model_config_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column("llm_run", sa.Column("run_config_hash", sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_foreign_key(None, "llm_run", "llm_config", ["llm_model_config_hash"], ["config_hash"])
+    op.create_foreign_key(None, "llm_run", "llm_config", ["run_config_hash"], ["config_hash"])
+    op.alter_column("llm_run", "prompt", existing_type=sa.VARCHAR(), nullable=True)
+    for column in _JSONB_COLUMNS:
+        op.alter_column(
+            "llm_run",
+            column,
+            existing_type=sa.JSON(),
+            type_=postgresql.JSONB(astext_type=sa.Text()),
+            existing_nullable=True,
+            postgresql_using=f"{column}::jsonb",
+        )
+
+
+def downgrade() -> None:
+    # Prompts of compact runs are rendered from their template in Python, expand them first
+    n_compact_runs = (
+        op.get_bind()
+        .execute(sa.text("SELECT count(*) FROM llm_run WHERE prompt IS NULL OR llm_model_configs IS NULL"))
+        .scalar()
+    )
+    if n_compact_runs:
+        raise RuntimeError(f"{n_compact_runs} LLM runs are compact, run `python -m src.backfill expand` first")
+    for column in reversed(_JSONB_COLUMNS):
+        op.alter_column(
+            "llm_run",
+            column,
+            existing_type=postgresql.JSONB(astext_type=sa.Text()),
+            type_=sa.JSON(),
+            existing_nullable=True,
+            postgresql_using=f"{column}::json",
+        )
+    op.alter_column("llm_run", "prompt", existing_type=sa.VARCHAR(), nullable=False)
+    op.drop_constraint("llm_run_run_config_hash_fkey", "llm_run", type_="foreignkey")
+    op.drop_constraint("llm_run_llm_model_config_hash_fkey", "llm_run", type_="foreignkey")
+    op.drop_column("llm_run", "run_config_hash")
+    op.drop_column("llm_run", "llm_model_config_hash")
+    op.drop_column("llm_run", "prompt_inputs")
+    op.drop_column("llm_run", "prompt_template_id")
+    op.drop_table("llm_config")
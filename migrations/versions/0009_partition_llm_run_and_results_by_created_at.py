@@ -0,0 +1,118 @@
+"""partition llm run and results by created at
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 23:05:37.194820
+
+"""
+from collections.abc import Sequence
+from datetime import date, datetime, timezone
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: str | None = "0008"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+_TABLES = ["llm_run", "detect_hate_speech_result"]
+_PREMAKE_MONTHS = 2
+
+
+def _add_months(month: date, n_months: int) -> date:
+    n = month.year * 12 + month.month - 1 + n_months
+    return date(n // 12, n % 12 + 1, 1)
+
+
+def _create_partitions(first_run_at: datetime | None) -> None:
+    """Monthly partitions of the months of the existing runs up to the next `_PREMAKE_MONTHS` ones, default otherwise"""
+    today = datetime.now(tz=timezone.utc).date().replace(day=1)
+    month = (first_run_at.date() if first_run_at else today).replace(day=1)
+    while month <= _add_months(today, _PREMAKE_MONTHS):
+        for table in _TABLES:
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            )
+        month = _add_months(month, 1)
+    for table in _TABLES:
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def upgrade() -> None:
+    # Foreign keys to a partitioned table must include its partition key, and prevent dropping its partitions
+    op.drop_constraint("detection_job_item_result_id_fkey", "detection_job_item", type_="foreignkey")
+    op.drop_constraint("detect_hate_speech_result_llm_run_id_fkey", "detect_hate_speech_result", type_="foreignkey")
+    op.drop_index("ix_detect_hate_speech_result_cache_key", table_name="detect_hate_speech_result")
+    for table in _TABLES:
+        # Redundant with the primary key
+        op.drop_index(f"ix_{table}_uuid", table_name=table)
+        op.rename_table(table, f"{table}_unpartitioned")
+        op.execute(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {table}_pkey TO {table}_unpartitioned_pkey")
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS, "
+            "created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL, PRIMARY KEY (uuid, created_at)) "
+            "PARTITION BY RANGE (created_at)"
+        )
+
+    # Same `created_at` as the copied runs below, so that none of them lands in the default partition
+    first_run_at = op.get_bind().execute(
+        sa.text("SELECT min(coalesce(start_run, end_run)) FROM llm_run_unpartitioned")
+    ).scalar()
+    _create_partitions(first_run_at=first_run_at)
+    op.execute("INSERT INTO llm_run SELECT *, coalesce(start_run, end_run, now()) FROM llm_run_unpartitioned")
+    op.execute(
+        "INSERT INTO detect_hate_speech_result "
+        "SELECT result.*, coalesce(llm_run.created_at, now()) FROM detect_hate_speech_result_unpartitioned AS result "
+        "LEFT JOIN llm_run ON llm_run.uuid = result.llm_run_id"
+    )
+    for table in _TABLES:
+        op.drop_table(f"{table}_unpartitioned")
+
+    op.create_foreign_key(None, "llm_run", "llm_config", ["llm_model_config_hash"], ["config_hash"])
+    op.create_foreign_key(None, "llm_run", "llm_config", ["run_config_hash"], ["config_hash"])
+    op.create_index("ix_llm_run_created_at", "llm_run", ["created_at"], unique=False)
+    op.create_index(
+        op.f("ix_detect_hate_speech_result_cache_key"), "detect_hate_speech_result", ["cache_key"], unique=False
+    )
+    op.create_index(
+        op.f("ix_detect_hate_speech_result_llm_run_id"), "detect_hate_speech_result", ["llm_run_id"], unique=False
+    )
+    op.create_index(
+        "ix_detect_hate_speech_result_created_at", "detect_hate_speech_result", ["created_at"], unique=False
+    )
+    op.create_index(
+        "ix_detect_hate_speech_result_is_hate_speech_created_at",
+        "detect_hate_speech_result",
+        ["is_hate_speech", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_detect_hate_speech_result_target_of_hate",
+        "detect_hate_speech_result",
+        ["target_of_hate"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    for table in _TABLES:
+        op.rename_table(table, f"{table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")  # noqa: S608
+        op.drop_table(f"{table}_partitioned")  # with its partitions and indexes
+        op.drop_column(table, "created_at")
+        op.create_primary_key(f"{table}_pkey", table, ["uuid"])
+        op.create_index(op.f(f"ix_{table}_uuid"), table, ["uuid"], unique=True)
+
+    op.create_index(
+        op.f("ix_detect_hate_speech_result_cache_key"), "detect_hate_speech_result", ["cache_key"], unique=False
+    )
+    op.create_foreign_key(None, "llm_run", "llm_config", ["llm_model_config_hash"], ["config_hash"])
+    op.create_foreign_key(None, "llm_run", "llm_config", ["run_config_hash"], ["config_hash"])
+    op.create_foreign_key(None, "detect_hate_speech_result", "llm_run", ["llm_run_id"], ["uuid"])
+    op.create_foreign_key(None, "detection_job_item", "detect_hate_speech_result", ["result_id"], ["uuid"])
@@ -1,42 +1,321 @@
-from collections.abc import Callable
+import time
+import uuid as uuid_pkg
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from enum import Enum
+from functools import cache
 from typing import Annotated
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, Response
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db import get_async_session
-from src.llm import LLMService
-from src.llm.detect_hate_speech import llm_detect_hate_speech
-from src.models import DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.batch import (
+    NDJSON_MEDIA_TYPE,
+    BatchDetector,
+    DetectHateSpeechBatchRequest,
+    iter_ndjson_texts,
+    iter_texts,
+)
+from src.db import (
+    async_session_factory,
+    dispose_async_engine,
+    get_async_session,
+    init_async_engine,
+    pool_status,
+)
+from src.explain import DetectionExplainer, ExplanationError
+from src.jobs import (
+    CreateDetectionJobRequest,
+    DetectionJobProgress,
+    JobSourceError,
+    JobWorker,
+    create_job,
+    get_job_progress,
+)
+from src.llm import LLMRunParsedModel
+from src.llm.batching import BatchScheduler
+from src.llm.detect_hate_speech import (
+    PrefilterCascade,
+    is_prefiltered,
+    llm_detect_hate_speech_batch,
+    llm_detect_hate_speech_verdict_batch,
+    prefilter_hate_speech,
+)
+from src.llm.executor import InferenceExecutor, InferenceQueueFullError, InferenceTimeoutError
+from src.llm.input_guard import InputGuard, InputTooLongError
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT, HATE_SPEECH_VERDICT_PROMPT
+from src.llm.registry import ModelRegistry, model_llm_configs
+from src.llm.reload import ModelReloader
+from src.llm.routing import ModelRouter, ModelRoutingError
+from src.metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    METRICS,
+    METRICS_MEDIA_TYPE,
+    record_llm_error,
+    record_llm_stage,
+    record_queue_wait,
+)
+from src.models import (
+    DetectHateSpeechResult,
+    DetectHateSpeechSQLModel,
+    DetectHateSpeechVerdict,
+    LLMRunSQLModel,
+)
+from src.partitions import PartitionMaintainer
+from src.persistence import DetectionPersister
+from src.prefork import PreforkServer
+from src.result_cache import CACHE_HEADER, DetectionResultCache, detection_cache_key
+from src.results import (
+    CountsGroupBy,
+    InvalidCursorError,
+    ResultCounts,
+    ResultFilters,
+    ResultsPage,
+    StoredLLMRun,
+    count_results,
+    get_result_llm_run,
+    iter_results,
+    list_results,
+)
+from src.startup import AppStarter, StartupPhases
+from src.streaming import SSE_MEDIA_TYPE, DetectionStreamer
 
-from .config import CONFIGS
-from .logging import logger
+from .config import CONFIGS, InputPolicy, load_configs
+from .logging import configure_logging, logger
 
-app = FastAPI()
+DetectionScheduler = BatchScheduler[str, LLMRunParsedModel[DetectHateSpeechResult]]
+VerdictScheduler = BatchScheduler[str, LLMRunParsedModel[DetectHateSpeechVerdict]]
+
+
+@cache
+def get_model_registry() -> ModelRegistry:
+    return ModelRegistry(llm_configs=model_llm_configs(CONFIGS.llm))
+
+
+@cache
+def get_model_router() -> ModelRouter:
+    return ModelRouter(registry=get_model_registry(), config=CONFIGS.llm.routing)
+
+
+@cache
+def get_inference_executor() -> InferenceExecutor:
+    return InferenceExecutor(registry=get_model_registry(), config=CONFIGS.llm.executor)
+
+
+@cache
+def get_model_reloader() -> ModelReloader:
+    return ModelReloader(registry=get_model_registry(), executor=get_inference_executor(), config=CONFIGS.llm.reload)
+
+
+@cache
+def get_detection_scheduler() -> DetectionScheduler:
+    return BatchScheduler(
+        executor=get_inference_executor(), batch_fn=llm_detect_hate_speech_batch, config=CONFIGS.llm.batching
+    )
+
+
+@cache
+def get_verdict_scheduler() -> VerdictScheduler:
+    return BatchScheduler(
+        executor=get_inference_executor(), batch_fn=llm_detect_hate_speech_verdict_batch, config=CONFIGS.llm.batching
+    )
+
+
+@cache
+def get_detection_guard() -> InputGuard[DetectHateSpeechResult]:
+    return InputGuard(scheduler=get_detection_scheduler(), registry=get_model_registry(), config=CONFIGS.llm.input)
+
+
+@cache
+def get_verdict_guard() -> InputGuard[DetectHateSpeechVerdict]:
+    return InputGuard(scheduler=get_verdict_scheduler(), registry=get_model_registry(), config=CONFIGS.llm.input)
+
+
+@cache
+def get_detection_result_cache() -> DetectionResultCache:
+    return DetectionResultCache(config=CONFIGS.result_cache)
+
+
+@cache
+def get_detection_explainer() -> DetectionExplainer:
+    return DetectionExplainer(
+        executor=get_inference_executor(),
+        result_cache=get_detection_result_cache(),
+        session_factory=async_session_factory,
+    )
+
+
+@cache
+def get_detection_persister() -> DetectionPersister:
+    return DetectionPersister(session_factory=async_session_factory, config=CONFIGS.persistence)
+
+
+@cache
+def get_partition_maintainer() -> PartitionMaintainer:
+    return PartitionMaintainer(session_factory=async_session_factory, config=CONFIGS.partitions)
+
+
+@cache
+def get_job_worker() -> JobWorker:
+    return JobWorker(
+        scheduler=PrefilterCascade(scheduler=get_detection_guard(), output_model=DetectHateSpeechResult),
+        result_cache=get_detection_result_cache(),
+        session_factory=async_session_factory,
+        config=CONFIGS.jobs,
+    )
+
+
+@cache
+def get_startup_phases() -> StartupPhases:
+    return StartupPhases()
+
+
+@cache
+def get_app_starter() -> AppStarter:
+    return AppStarter(
+        registry=get_model_registry(),
+        executor=get_inference_executor(),
+        phases=get_startup_phases(),
+        config=CONFIGS.startup,
+    )
+
+
+METRICS.callback(
+    "inference_queue_depth", "Inference jobs waiting for a worker", lambda: {(): get_inference_executor().queue_depth}
+)
+METRICS.callback(
+    "inference_in_flight", "Inference jobs being generated", lambda: {(): get_inference_executor().n_in_flight}
+)
+METRICS.callback(
+    "llm_models_loaded",
+    "Loaded model instances, per model",
+    lambda: {(name,): pool["loaded"] for name, pool in get_model_registry().status().items()},
+    label_names=["model"],
+)
+METRICS.callback(
+    "llm_routed_requests_total",
+    "Requests routed to each model",
+    lambda: {(name,): n_routed for name, n_routed in get_model_router().n_routed.items()},
+    label_names=["model"],
+    kind="counter",
+)
+METRICS.callback(
+    "result_cache_lookups_total",
+    "Result cache lookups, per result",
+    lambda: {
+        ("hit",): (result_cache := get_detection_result_cache()).n_hits - result_cache.n_db_hits,
+        ("db_hit",): result_cache.n_db_hits,
+        ("miss",): result_cache.n_misses,
+    },
+    label_names=["result"],
+    kind="counter",
+)
+METRICS.callback(
+    "db_pool_connections",
+    "Connections of the database pool, per state (`overflow` ones are counted in `checked_out` too)",
+    lambda: {(state,): value for state, value in pool_status().items() if state != "size"},
+    label_names=["state"],
+)
+METRICS.callback(
+    "persistence_buffered_rows",
+    "Rows waiting in the write-behind buffer",
+    lambda: {(): get_detection_persister().status()["buffered_rows"]},
+)
+METRICS.callback(
+    "db_pool_size", "Size of the database pool", lambda: {(): size} if (size := pool_status().get("size")) else {}
+)
+METRICS.callback(
+    "startup_phase_seconds",
+    "Duration of the startup phases",
+    lambda: {(phase,): duration_s for phase, duration_s in get_startup_phases().durations_s.items()},
+    label_names=["phase"],
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Reads the settings and builds the components on startup rather than on import, then gets the models ready in
+    the background, `/health/` reporting `LOADING` until they are
+    """
+    phases = get_startup_phases()
+    with phases.measure("config"):
+        load_configs()
+    with phases.measure("logging"):
+        configure_logging()
+    with phases.measure("db_engine"):
+        init_async_engine()
+    with phases.measure("components"):
+        starter = get_app_starter()
+        reloader, persister = get_model_reloader(), get_detection_persister()
+        partition_maintainer, job_worker = get_partition_maintainer(), get_job_worker()
+    starter.start()
+    reloader.start()
+    persister.start()
+    partition_maintainer.start()
+    job_worker.start()
+    yield
+    await starter.stop()
+    await job_worker.stop()
+    await partition_maintainer.stop()
+    await persister.stop()
+    await reloader.stop()
+    await run_in_threadpool(get_inference_executor().shutdown)
+    await dispose_async_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 class PATHS:
     health_check = "/health/"
+    metrics = "/metrics"
     detect_hate_speech = "/detect_hate_speech/"
+    detect_hate_speech_batch = "/detect_hate_speech/batch"
+    detect_hate_speech_stream = "/detect_hate_speech/stream"
+    detect_hate_speech_reasoning = "/detect_hate_speech/{result_id}/reasoning"
+    jobs = "/jobs/"
+    job = "/jobs/{job_id}"
+    results = "/results/"
+    results_export = "/results/export"
+    results_counts = "/results/counts"
+    result = "/results/{result_id}"
+    result_llm_run = "/results/{result_id}/llm_run"
+    model_reload = "/models/{model_name}/reload"
+
+
+class DetectionMode(str, Enum):
+    full = "full"
+    verdict = "verdict"  # only `is_hate_speech` and `target_of_hate`, the reasoning is generated later
 
 
 class DetectHateSpeechRequest(BaseModel):
     text: str
+    mode: DetectionMode = DetectionMode.full
+    model: str | None = None  # one of the registered models, routed per `[default.llm.routing]` if not given
 
 
 @app.middleware("http")
 async def handling_exception(request: Request, call_next: Callable) -> Response:
+    start = time.perf_counter()
     try:
-        return await call_next(request)
+        response = await call_next(request)
     except Exception as e:
         logger.exception(str(e))
-        return JSONResponse(
+        response = JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"detail": f"{e.__class__.__name__}: {e.args}"}
         )
+    # Route templates, not raw paths, to keep one series per endpoint
+    path = route.path if (route := request.scope.get("route")) is not None else "unmatched"
+    HTTP_REQUESTS.inc(request.method, path, str(response.status_code))
+    HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, path)
+    return response
 
 
 @app.exception_handler(RequestValidationError)
@@ -44,45 +323,346 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": exc.errors()})
 
 
-def get_llm_service() -> LLMService:
-    return LLMService()
+@app.exception_handler(InferenceQueueFullError)
+async def inference_queue_full_exception_handler(request: Request, exc: InferenceQueueFullError) -> Response:
+    record_llm_error(exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
+
+@app.exception_handler(ModelRoutingError)
+async def model_routing_exception_handler(request: Request, exc: ModelRoutingError) -> Response:
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
+
+
+@app.exception_handler(InputTooLongError)
+async def input_too_long_exception_handler(request: Request, exc: InputTooLongError) -> Response:
+    return JSONResponse(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, content={"detail": str(exc)})
+
+
+@app.exception_handler(InferenceTimeoutError)
+async def inference_timeout_exception_handler(request: Request, exc: InferenceTimeoutError) -> Response:
+    record_llm_error(exc)
+    return JSONResponse(status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": str(exc)})
 
 
 @app.get(path=PATHS.health_check)
-async def health_check(
-    llm_service: Annotated[LLMService, Depends(get_llm_service)],
+async def health_check(  # noqa: PLR0913
+    registry: Annotated[ModelRegistry, Depends(get_model_registry)],
+    router: Annotated[ModelRouter, Depends(get_model_router)],
+    reloader: Annotated[ModelReloader, Depends(get_model_reloader)],
+    executor: Annotated[InferenceExecutor, Depends(get_inference_executor)],
+    scheduler: Annotated[DetectionScheduler, Depends(get_detection_scheduler)],
+    guard: Annotated[InputGuard[DetectHateSpeechResult], Depends(get_detection_guard)],
+    result_cache: Annotated[DetectionResultCache, Depends(get_detection_result_cache)],
+    job_worker: Annotated[JobWorker, Depends(get_job_worker)],
+    persister: Annotated[DetectionPersister, Depends(get_detection_persister)],
+    partition_maintainer: Annotated[PartitionMaintainer, Depends(get_partition_maintainer)],
+    starter: Annotated[AppStarter, Depends(get_app_starter)],
     session: Annotated[AsyncSession, Depends(get_async_session)],
 ) -> Response:
-    return JSONResponse(content={"status": "OK"})
+    content = {
+        "startup": starter.status(),
+        "models": registry.status(),
+        "routing": router.status(),
+        "reload": reloader.status(),
+        "executor": executor.status(),
+        "batching": scheduler.status(),
+        "input": guard.status(),
+        "result_cache": result_cache.status(),
+        "jobs": job_worker.status(),
+        "persistence": persister.status(),
+        "db_pool": pool_status(),
+        "partitions": partition_maintainer.status(),
+    }
+    if starter.error is not None:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "FAILED", **content})
+    if not starter.is_ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "LOADING", **content})
+    return JSONResponse(content={"status": "OK", **content})
+
+
+@app.get(path=PATHS.metrics)
+async def metrics() -> Response:
+    return Response(content=METRICS.render(), media_type=METRICS_MEDIA_TYPE)
 
 
 @app.post(path=PATHS.detect_hate_speech)
-async def detect_hate_speech(
-    llm_service: Annotated[LLMService, Depends(get_llm_service)],
+async def detect_hate_speech(  # noqa: PLR0913
+    registry: Annotated[ModelRegistry, Depends(get_model_registry)],
+    router: Annotated[ModelRouter, Depends(get_model_router)],
+    guard: Annotated[InputGuard[DetectHateSpeechResult], Depends(get_detection_guard)],
+    verdict_guard: Annotated[InputGuard[DetectHateSpeechVerdict], Depends(get_verdict_guard)],
+    result_cache: Annotated[DetectionResultCache, Depends(get_detection_result_cache)],
+    explainer: Annotated[DetectionExplainer, Depends(get_detection_explainer)],
+    persister: Annotated[DetectionPersister, Depends(get_detection_persister)],
     session: Annotated[AsyncSession, Depends(get_async_session)],
     req: DetectHateSpeechRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
 ) -> DetectHateSpeechSQLModel:
     text = req.text
+    verdict_only = req.mode == DetectionMode.verdict
+    model_name = router.route(key=text, model_name=req.model)
 
-    llm_run = llm_detect_hate_speech(llm=llm_service, text=text)
-    llm_run_sql = LLMRunSQLModel(**llm_run.model_dump())
-    session.add(llm_run_sql)
-    await session.commit()
+    cache_key = detection_cache_key(
+        text=text,
+        prompt=HATE_SPEECH_VERDICT_PROMPT if verdict_only else HATE_SPEECH_DETECTION_PROMPT,
+        llm_config=registry.get_pool(model_name=model_name).llm_config,
+    )
+    if (cached_res := await result_cache.get(session=session, key=cache_key)) is not None:
+        response.headers[CACHE_HEADER] = "HIT"
+        return cached_res
+    response.headers[CACHE_HEADER] = "MISS"
 
+    llm_run: LLMRunParsedModel | None
+    # Confidently scored texts are answered without waiting for an inference worker
+    llm_run = prefilter_hate_speech(
+        text=text, output_model=DetectHateSpeechVerdict if verdict_only else DetectHateSpeechResult
+    )
+    if llm_run is None:
+        submitted_at = datetime.now(tz=timezone.utc)
+        if verdict_only:
+            llm_run = await verdict_guard.submit(text, model_name=model_name)
+        else:
+            llm_run = await guard.submit(text, model_name=model_name)
+        record_queue_wait(llm_run=llm_run, submitted_at=submitted_at)
+    llm_run_sql = LLMRunSQLModel(**llm_run.model_dump())
     if not llm_run.success or not llm_run.parsed_output:
-        await session.commit()
+        await persister.save([llm_run_sql])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=llm_run.error)
 
-    detect_res = DetectHateSpeechSQLModel(text=text, llm_run_id=llm_run_sql.uuid, **llm_run.parsed_output.model_dump())
-    session.add(detect_res)
+    result_key = None if is_prefiltered(llm_run) else cache_key
+    detect_res = DetectHateSpeechSQLModel(
+        text=text, llm_run_id=llm_run_sql.uuid, cache_key=result_key, **llm_run.parsed_output.model_dump()
+    )
+    persist_start = time.perf_counter()
+    await persister.save([llm_run_sql, detect_res])
+    record_llm_stage(stage="persist", duration_s=time.perf_counter() - persist_start)
+    if result_key is not None:
+        result_cache.put(key=result_key, result=detect_res)
+    if verdict_only and detect_res.is_hate_speech and CONFIGS.verdict.explain_flagged:
+        # The explainer reads the result back, so it must be written first
+        background_tasks.add_task(persister.flush)
+        background_tasks.add_task(explainer.explain_in_background, result_id=detect_res.uuid)
+
+    return detect_res
 
-    await session.commit()
 
+@app.post(path=PATHS.detect_hate_speech_reasoning)
+async def explain_detection(
+    explainer: Annotated[DetectionExplainer, Depends(get_detection_explainer)],
+    result_id: uuid_pkg.UUID,
+) -> DetectHateSpeechSQLModel:
+    """Generate the reasoning of a verdict-only detection result, if not generated yet"""
+    try:
+        detect_res = await explainer.explain(result_id=result_id)
+    except ExplanationError as e:
+        record_llm_error(e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if detect_res is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Result `{result_id}` not found")
     return detect_res
 
 
+@app.post(path=PATHS.detect_hate_speech_stream)
+async def detect_hate_speech_stream(  # noqa: PLR0913
+    registry: Annotated[ModelRegistry, Depends(get_model_registry)],
+    router: Annotated[ModelRouter, Depends(get_model_router)],
+    executor: Annotated[InferenceExecutor, Depends(get_inference_executor)],
+    guard: Annotated[InputGuard[DetectHateSpeechResult], Depends(get_detection_guard)],
+    result_cache: Annotated[DetectionResultCache, Depends(get_detection_result_cache)],
+    persister: Annotated[DetectionPersister, Depends(get_detection_persister)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    req: DetectHateSpeechRequest,
+) -> StreamingResponse:
+    """Server-sent events of the detection: `token` events with the generated text, a `verdict` event as soon as
+    `is_hate_speech` is generated, then a `result` event with the stored result, or an `error` event.
+    """
+    model_name = router.route(key=req.text, model_name=req.model)
+    cache_key = detection_cache_key(
+        text=req.text,
+        prompt=HATE_SPEECH_DETECTION_PROMPT,
+        llm_config=registry.get_pool(model_name=model_name).llm_config,
+    )
+    streamer = DetectionStreamer(executor=executor, result_cache=result_cache, persister=persister)
+    if (cached_res := await result_cache.get(session=session, key=cache_key)) is not None:
+        return StreamingResponse(
+            streamer.cached_events(result=cached_res), media_type=SSE_MEDIA_TYPE, headers={CACHE_HEADER: "HIT"}
+        )
+    if (prefiltered := prefilter_hate_speech(text=req.text, output_model=DetectHateSpeechResult)) is not None:
+        return StreamingResponse(
+            streamer.prefiltered_events(llm_run=prefiltered, text=req.text, cache_key=cache_key),
+            media_type=SSE_MEDIA_TYPE,
+            headers={CACHE_HEADER: "MISS"},
+        )
+    # A single run is streamed, so long texts are truncated rather than chunked
+    guarded = await guard.guard(
+        text=req.text,
+        model_name=model_name,
+        policy=InputPolicy.TRUNCATE if guard.config.policy == InputPolicy.CHUNK else None,
+    )
+    stream = streamer.submit(text=req.text, cache_key=cache_key, model_name=model_name, guarded=guarded)
+    return StreamingResponse(streamer.events(stream=stream), media_type=SSE_MEDIA_TYPE, headers={CACHE_HEADER: "MISS"})
+
+
+def get_batch_detector(
+    registry: Annotated[ModelRegistry, Depends(get_model_registry)],
+    guard: Annotated[InputGuard[DetectHateSpeechResult], Depends(get_detection_guard)],
+    result_cache: Annotated[DetectionResultCache, Depends(get_detection_result_cache)],
+) -> BatchDetector:
+    return BatchDetector(
+        scheduler=PrefilterCascade(scheduler=guard, output_model=DetectHateSpeechResult),
+        result_cache=result_cache,
+        llm_config=registry.get_pool().llm_config,
+        session_factory=async_session_factory,
+        config=CONFIGS.batch,
+    )
+
+
+@app.post(path=PATHS.detect_hate_speech_batch)
+async def detect_hate_speech_batch(
+    batch_detector: Annotated[BatchDetector, Depends(get_batch_detector)],
+    request: Request,
+) -> StreamingResponse:
+    """Detect hate speech in many texts, sent either as a JSON `{"texts": [...]}` body or, with the
+    `application/x-ndjson` content type, as one `{"text": ...}` record per line.
+
+    Results are streamed back as NDJSON `BatchDetectionItem` lines in completion order, not request order.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        # Read before responding: once streaming, Starlette listens for the disconnect of the client on the same
+        # channel as the body, and would take the remaining body messages
+        records = [record async for record in iter_ndjson_texts(request.stream())]
+        texts = iter_texts(records)
+    else:
+        try:
+            batch_req = DetectHateSpeechBatchRequest.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(e.errors()) from e
+        texts = iter_texts(batch_req.texts)
+    return StreamingResponse(batch_detector.stream(texts), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.post(path=PATHS.jobs, status_code=status.HTTP_202_ACCEPTED)
+async def create_detection_job(
+    registry: Annotated[ModelRegistry, Depends(get_model_registry)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    req: CreateDetectionJobRequest,
+) -> DetectionJobProgress:
+    """Queue the detection of every record of an NDJSON file, to be polled with `GET /jobs/{job_id}`"""
+    try:
+        job = await create_job(
+            session=session, source=req.source, llm_config=registry.get_pool().llm_config, config=CONFIGS.jobs
+        )
+    except JobSourceError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    return await get_detection_job(session=session, job_id=job.uuid)
+
+
+@app.get(path=PATHS.job)
+async def get_detection_job(
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    job_id: uuid_pkg.UUID,
+) -> DetectionJobProgress:
+    if (progress := await get_job_progress(session=session, job_id=job_id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job `{job_id}` not found")
+    return progress
+
+
+@app.get(path=PATHS.results)
+async def get_results(
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    filters: Annotated[ResultFilters, Depends()],
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    cursor: str | None = None,
+) -> ResultsPage:
+    """Stored results, newest first, `next_cursor` being the `cursor` of the next page"""
+    if limit is not None and limit > CONFIGS.results.max_page_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"`limit` must be at most {CONFIGS.results.max_page_size}",
+        )
+    try:
+        return await list_results(
+            session=session, filters=filters, limit=limit or CONFIGS.results.page_size, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+
+@app.get(path=PATHS.results_export)
+async def export_results(filters: Annotated[ResultFilters, Depends()]) -> StreamingResponse:
+    """All the stored results matching the filters, newest first, as NDJSON lines"""
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in iter_results(
+            session_factory=async_session_factory, filters=filters, chunk_size=CONFIGS.results.export_chunk_size
+        ):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get(path=PATHS.results_counts)
+async def get_results_counts(
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    filters: Annotated[ResultFilters, Depends()],
+    group_by: CountsGroupBy | None = None,
+) -> ResultCounts:
+    return await count_results(session=session, filters=filters, group_by=group_by)
+
+
+async def _get_result(session: AsyncSession, result_id: uuid_pkg.UUID) -> DetectHateSpeechSQLModel:
+    if (result := await session.get(DetectHateSpeechSQLModel, result_id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Result `{result_id}` not found")
+    return result
+
+
+@app.get(path=PATHS.result)
+async def get_detection_result(
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    result_id: uuid_pkg.UUID,
+) -> DetectHateSpeechSQLModel:
+    return await _get_result(session=session, result_id=result_id)
+
+
+@app.get(path=PATHS.result_llm_run)
+async def get_detection_result_llm_run(
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    result_id: uuid_pkg.UUID,
+) -> StoredLLMRun:
+    result = await _get_result(session=session, result_id=result_id)
+    if (llm_run := await get_result_llm_run(session=session, result=result)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"LLM run of result `{result_id}` not found")
+    return llm_run
+
+
+@app.post(path=PATHS.model_reload)
+async def reload_model(
+    registry: Annotated[ModelRegistry, Depends(get_model_registry)],
+    reloader: Annotated[ModelReloader, Depends(get_model_reloader)],
+    model_name: str,
+) -> dict:
+    """Load a new instance of the model, e.g.: after its GGUF file was replaced, and swap it in once loaded. Requests
+    in flight finish with the replaced instance.
+    """
+    if model_name not in registry.model_names:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Model `{model_name}` not found")
+    return await reloader.reload(model_name=model_name)
+
+
 def main() -> None:
-    uvicorn.run(app, **CONFIGS.uvicorn.model_dump())
+    configure_logging()
+    if CONFIGS.workers.count > 1:
+        PreforkServer(
+            app=app, registry=get_model_registry(), uvicorn_config=CONFIGS.uvicorn, config=CONFIGS.workers
+        ).run()
+    else:
+        uvicorn.run(app, **CONFIGS.uvicorn.model_dump())
 
 
 if __name__ == "__main__":
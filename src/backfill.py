@@ -0,0 +1,106 @@
+"""Compact the LLM runs stored in full (before `compact_llm_runs`), or expand compact runs back (e.g.: to downgrade).
+
+Runs are updated by chunks of `--chunk-size`, each in its own transaction, in `uuid` order, so an interrupted backfill
+resumes where it stopped when run again.
+
+Usage: python -m src.backfill compact|expand [--chunk-size 1000]
+"""
+import argparse
+import asyncio
+import uuid as uuid_pkg
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import ColumnElement, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from src.db import async_session_factory, dispose_async_engine, init_async_engine
+from src.llm.prompts import PROMPT_TEMPLATES
+from src.logging import configure_logging, get_logger
+from src.models import LLMRunSQLModel
+from src.persistence import add_rows, expand_llm_run
+
+LOGGER = get_logger("Backfill")
+
+
+def find_prompt_template(llm_run_sql: LLMRunSQLModel) -> None:
+    """Set the template and inputs of the prompt of `llm_run_sql`, if it was rendered from a known template"""
+    if llm_run_sql.prompt_template_id is not None or llm_run_sql.prompt is None:
+        return
+    for template_id, prompt in PROMPT_TEMPLATES.items():
+        if (prompt_inputs := prompt.parse_inputs(llm_run_sql.prompt)) is not None:
+            llm_run_sql.prompt_template_id = template_id
+            llm_run_sql.prompt_inputs = prompt_inputs
+            return
+
+
+async def _compact_chunk(session: AsyncSession, llm_runs: list[LLMRunSQLModel]) -> None:
+    for llm_run_sql in llm_runs:
+        find_prompt_template(llm_run_sql)
+    await add_rows(session=session, rows=llm_runs, compact=True)
+
+
+async def _expand_chunk(session: AsyncSession, llm_runs: list[LLMRunSQLModel]) -> None:
+    for llm_run_sql in llm_runs:
+        llm_run = await expand_llm_run(session=session, llm_run_sql=llm_run_sql)
+        llm_run_sql.prompt = llm_run.prompt
+        llm_run_sql.llm_model_configs = llm_run.llm_model_configs
+        llm_run_sql.run_configs = llm_run.run_configs
+
+
+async def backfill(
+    session_factory: Callable[[], AsyncSession],
+    where: ColumnElement[bool],
+    update_chunk: Callable[[AsyncSession, list[LLMRunSQLModel]], Awaitable[None]],
+    chunk_size: int,
+) -> int:
+    n_updated = 0
+    last_uuid: uuid_pkg.UUID | None = None
+    while True:
+        async with session_factory() as session:
+            stmt = select(LLMRunSQLModel).where(where).order_by(col(LLMRunSQLModel.uuid)).limit(chunk_size)
+            if last_uuid is not None:
+                stmt = stmt.where(col(LLMRunSQLModel.uuid) > last_uuid)
+            llm_runs = list((await session.execute(stmt)).scalars())
+            if not llm_runs:
+                return n_updated
+            await update_chunk(session, llm_runs)
+            await session.commit()
+        n_updated += len(llm_runs)
+        last_uuid = llm_runs[-1].uuid
+        LOGGER.info("Updated %s LLM runs", n_updated)
+
+
+# Runs to update per command, and how
+_COMMANDS: dict[str, tuple[ColumnElement[bool], Callable[[AsyncSession, list[LLMRunSQLModel]], Awaitable[None]]]] = {
+    "compact": (col(LLMRunSQLModel.llm_model_configs).is_not(None), _compact_chunk),
+    "expand": (
+        or_(col(LLMRunSQLModel.prompt).is_(None), col(LLMRunSQLModel.llm_model_configs).is_(None)),
+        _expand_chunk,
+    ),
+}
+
+
+async def run_backfill(command: str, chunk_size: int) -> int:
+    where, update_chunk = _COMMANDS[command]
+    init_async_engine()
+    try:
+        return await backfill(
+            session_factory=async_session_factory, where=where, update_chunk=update_chunk, chunk_size=chunk_size
+        )
+    finally:
+        await dispose_async_engine()
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=list(_COMMANDS))
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    n_updated = asyncio.run(run_backfill(command=args.command, chunk_size=args.chunk_size))
+    LOGGER.info("Done, %s LLM runs updated", n_updated)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Sequence
+from dataclasses import dataclass
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import BatchConfig, LLMConfig
+from src.llm import LLMRunParsedModel
+from src.llm.batching import TextScheduler
+from src.llm.detect_hate_speech import is_prefiltered
+from src.llm.executor import InferenceQueueFullError
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT
+from src.logging import get_logger
+from src.models import DetectHateSpeechResult, DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.persistence import add_rows
+from src.result_cache import DetectionResultCache, detection_cache_key
+
+LOGGER = get_logger("BatchDetector")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_QUEUE_FULL_BACKOFF_S = 0.1
+
+
+class DetectHateSpeechBatchRequest(BaseModel):
+    texts: list[str]
+
+
+class DetectHateSpeechBatchRecord(BaseModel):
+    """One line of an NDJSON batch upload"""
+
+    text: str
+
+
+class BatchDetectionItem(BaseModel):
+    """One line of the NDJSON batch response, `index` being the position of the text in the request"""
+
+    index: int
+    result: DetectHateSpeechSQLModel | None = None
+    cached: bool = False
+    error: str | None = None
+
+
+@dataclass
+class _Detection:
+    index: int
+    text: str | None = None
+    cache_key: str | None = None
+    cached_result: DetectHateSpeechSQLModel | None = None
+    llm_run: LLMRunParsedModel[DetectHateSpeechResult] | None = None
+    error: str | None = None
+
+
+async def iter_texts(texts: Sequence[str | ValueError]) -> AsyncIterator[str | ValueError]:
+    for text in texts:
+        yield text
+
+
+def parse_ndjson_record(line: bytes) -> str | ValueError:
+    """Text of an NDJSON batch record, or the error if the line is invalid"""
+    try:
+        return DetectHateSpeechBatchRecord.model_validate_json(line).text
+    except ValidationError as e:
+        return ValueError(f"Invalid NDJSON record: {e.errors(include_url=False)}")
+
+
+async def iter_ndjson_texts(chunks: AsyncIterable[bytes]) -> AsyncIterator[str | ValueError]:
+    """Parse an NDJSON byte stream line by line, yielding the error instead of the text for an invalid line"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_record(line)
+    if buffer.strip():
+        yield parse_ndjson_record(buffer)
+
+
+async def submit_with_backoff(
+    scheduler: TextScheduler[LLMRunParsedModel[DetectHateSpeechResult]], text: str
+) -> LLMRunParsedModel[DetectHateSpeechResult]:
+    """Submit a text for detection, waiting for room instead of failing while the executor queue is full"""
+    while True:
+        try:
+            return await scheduler.submit(text)
+        except InferenceQueueFullError as e:
+            await asyncio.sleep(min(_QUEUE_FULL_BACKOFF_S, e.retry_after_s))
+
+
+class BatchDetector:
+    """Detect hate speech in a stream of texts, yielding each result as an NDJSON line as soon as it is ready.
+
+    Cached texts are looked up per chunk of `write_chunk_size` texts, up to `max_in_flight` uncached texts are
+    submitted to the detection scheduler at once, and new results are bulk-inserted per chunk of rows.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        scheduler: TextScheduler[LLMRunParsedModel[DetectHateSpeechResult]],
+        result_cache: DetectionResultCache,
+        llm_config: LLMConfig,
+        session_factory: Callable[[], AsyncSession],
+        config: BatchConfig,
+    ) -> None:
+        self.scheduler = scheduler
+        self.result_cache = result_cache
+        self.llm_config = llm_config
+        self.session_factory = session_factory
+        self.config = config
+
+    async def stream(self, texts: AsyncIterable[str | ValueError]) -> AsyncIterator[bytes]:
+        detections: asyncio.Queue[_Detection | None] = asyncio.Queue()
+        producer = asyncio.create_task(self._produce(texts=texts, out=detections))
+        rows: list[LLMRunSQLModel | DetectHateSpeechSQLModel] = []
+        new_results: list[DetectHateSpeechSQLModel] = []
+        try:
+            while (detection := await detections.get()) is not None:
+                item = self._to_item(detection=detection, rows=rows, new_results=new_results)
+                yield item.model_dump_json().encode("utf-8") + b"\n"
+                if len(rows) >= self.config.write_chunk_size:
+                    await self._write(rows=rows, new_results=new_results)
+            await self._write(rows=rows, new_results=new_results)
+            await producer
+        finally:
+            producer.cancel()
+
+    async def _produce(self, texts: AsyncIterable[str | ValueError], out: asyncio.Queue[_Detection | None]) -> None:
+        in_flight = asyncio.Semaphore(self.config.max_in_flight)
+        tasks: set[asyncio.Task] = set()
+        chunk: list[_Detection] = []
+        n_texts = 0
+        try:
+            async for text in texts:
+                if isinstance(text, ValueError):
+                    chunk.append(_Detection(index=n_texts, error=str(text)))
+                else:
+                    chunk.append(_Detection(index=n_texts, text=text))
+                n_texts += 1
+                if len(chunk) >= self.config.write_chunk_size:
+                    await self._submit_chunk(chunk=chunk, out=out, in_flight=in_flight, tasks=tasks)
+                    chunk = []
+            await self._submit_chunk(chunk=chunk, out=out, in_flight=in_flight, tasks=tasks)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await out.put(None)
+        LOGGER.info("Batch of %d texts done", n_texts)
+
+    async def _submit_chunk(
+        self,
+        chunk: list[_Detection],
+        out: asyncio.Queue[_Detection | None],
+        in_flight: asyncio.Semaphore,
+        tasks: set[asyncio.Task],
+    ) -> None:
+        for detection in chunk:
+            if detection.text is not None:
+                detection.cache_key = detection_cache_key(
+                    text=detection.text, prompt=HATE_SPEECH_DETECTION_PROMPT, llm_config=self.llm_config
+                )
+        keys = [detection.cache_key for detection in chunk if detection.cache_key is not None]
+        async with self.session_factory() as session:
+            cached_results = await self.result_cache.get_many(session=session, keys=keys)
+
+        for detection in chunk:
+            if detection.cache_key is None:
+                await out.put(detection)
+            elif (cached_res := cached_results.get(detection.cache_key)) is not None:
+                detection.cached_result = cached_res
+                await out.put(detection)
+            else:
+                await in_flight.acquire()
+                task = asyncio.create_task(self._detect(detection=detection, out=out))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _task: in_flight.release())
+
+    async def _detect(self, detection: _Detection, out: asyncio.Queue[_Detection | None]) -> None:
+        assert detection.text is not None
+        try:
+            detection.llm_run = await submit_with_backoff(scheduler=self.scheduler, text=detection.text)
+        except Exception as e:
+            LOGGER.exception("Failed to detect hate speech of batch item %d", detection.index)
+            detection.error = f"{e.__class__.__name__}: {e}"
+        await out.put(detection)
+
+    def _to_item(
+        self,
+        detection: _Detection,
+        rows: list[LLMRunSQLModel | DetectHateSpeechSQLModel],
+        new_results: list[DetectHateSpeechSQLModel],
+    ) -> BatchDetectionItem:
+        if detection.cached_result is not None:
+            return BatchDetectionItem(index=detection.index, result=detection.cached_result, cached=True)
+        if (llm_run := detection.llm_run) is None:
+            return BatchDetectionItem(index=detection.index, error=detection.error)
+
+        llm_run_sql = LLMRunSQLModel(**llm_run.model_dump())
+        rows.append(llm_run_sql)
+        if not llm_run.success or not llm_run.parsed_output:
+            return BatchDetectionItem(index=detection.index, error=llm_run.error)
+
+        assert detection.text is not None
+        detect_res = DetectHateSpeechSQLModel(
+            text=detection.text,
+            llm_run_id=llm_run_sql.uuid,
+            cache_key=None if is_prefiltered(llm_run) else detection.cache_key,
+            **llm_run.parsed_output.model_dump(),
+        )
+        rows.append(detect_res)
+        new_results.append(detect_res)
+        return BatchDetectionItem(index=detection.index, result=detect_res)
+
+    async def _write(
+        self, rows: list[LLMRunSQLModel | DetectHateSpeechSQLModel], new_results: list[DetectHateSpeechSQLModel]
+    ) -> None:
+        if not rows:
+            return
+        async with self.session_factory() as session:
+            await add_rows(session=session, rows=rows)
+            await session.commit()
+        for detect_res in new_results:
+            if detect_res.cache_key is not None:
+                self.result_cache.put(key=detect_res.cache_key, result=detect_res)
+        rows.clear()
+        new_results.clear()
@@ -1,7 +1,9 @@
+from enum import Enum
+from functools import cache
 from pathlib import Path
+from typing import Any, cast
 
-from dynaconf import Dynaconf
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 SRC_PATH = Path(__file__).parent.resolve()
 PROJECT_ROOT_PATH = SRC_PATH.parent
@@ -9,11 +11,54 @@ MODEL_DIR_PATH = PROJECT_ROOT_PATH / "models"
 
 APPLICATION_NAME = "hate-speech-detection"
 
-settings = Dynaconf(
-    envvar_prefix="DYNACONF",
-    settings_files=["settings.toml"],
-    environments=True,
-)
+
+class LLMPoolConfig(BaseModel):
+    size: int = Field(default=1, ge=1)
+    preload: bool = True
+
+
+class LLMExecutorConfig(BaseModel):
+    queue_size: int = Field(default=32, ge=1)
+    request_timeout_s: float = Field(default=300, gt=0)
+    retry_after_s: int = Field(default=5, ge=1)
+
+
+class LLMBatchingConfig(BaseModel):
+    enabled: bool = False
+    max_batch_size: int = Field(default=8, ge=1)
+    max_wait_ms: float = Field(default=10, ge=0)
+
+
+class LLMModelConfig(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    model_name: str
+    model_configs: dict = {}
+    run_configs: dict = {}
+    pool: LLMPoolConfig | None = None
+
+
+class LLMRoutingConfig(BaseModel):
+    allow_override: bool = True
+    split: dict[str, float] = {}
+
+
+class LLMReloadConfig(BaseModel):
+    watch: bool = False
+    interval_s: float = Field(default=10, gt=0)
+
+
+class InputPolicy(str, Enum):
+    REJECT = "reject"
+    TRUNCATE = "truncate"
+    CHUNK = "chunk"
+
+
+class LLMInputConfig(BaseModel):
+    policy: InputPolicy = InputPolicy.CHUNK
+    max_tokens: int = Field(default=1024, ge=1)
+    chunk_overlap_tokens: int = Field(default=64, ge=0)
+    max_chunks: int = Field(default=16, ge=1)
 
 
 class LLMConfig(BaseModel):
@@ -22,6 +67,14 @@ class LLMConfig(BaseModel):
     model_name: str
     model_configs: dict
     run_configs: dict
+    prefix_cache: bool = True
+    pool: LLMPoolConfig = LLMPoolConfig()
+    executor: LLMExecutorConfig = LLMExecutorConfig()
+    batching: LLMBatchingConfig = LLMBatchingConfig()
+    models: list[LLMModelConfig] = []
+    routing: LLMRoutingConfig = LLMRoutingConfig()
+    reload: LLMReloadConfig = LLMReloadConfig()
+    input: LLMInputConfig = LLMInputConfig()  # noqa: A003
 
 
 class UvicornConfig(BaseModel):
@@ -29,8 +82,88 @@ class UvicornConfig(BaseModel):
     port: int
 
 
+class WorkersConfig(BaseModel):
+    count: int = Field(default=1, ge=1)
+    split_threads: bool = True
+
+
 class DBConfig(BaseModel):
     async_conn_str: str
+    pool_size: int = Field(default=10, ge=1)
+    max_overflow: int = Field(default=10, ge=0)
+    pool_timeout_s: float = Field(default=30, gt=0)
+    pool_recycle_s: int = 1800
+    pool_pre_ping: bool = True
+    statement_cache_size: int = Field(default=256, ge=0)
+
+
+class ResultCacheConfig(BaseModel):
+    enabled: bool = True
+    max_size: int = Field(default=10_000, ge=0)
+    ttl_s: float = Field(default=3600, gt=0)
+    db_lookup: bool = True
+
+
+class PersistenceConfig(BaseModel):
+    write_behind: bool = False
+    flush_interval_ms: float = Field(default=50, gt=0)
+    max_batch_rows: int = Field(default=500, ge=1)
+    max_buffered_rows: int = Field(default=10_000, ge=1)
+    wait_for_flush: bool = False
+    max_write_attempts: int = Field(default=3, ge=1)
+    synchronous_commit: bool = True
+    compact_llm_runs: bool = False
+
+
+class PartitionsConfig(BaseModel):
+    enabled: bool = True
+    premake_months: int = Field(default=2, ge=0)
+    retention_months: int = Field(default=0, ge=0)
+    interval_s: float = Field(default=3600, gt=0)
+
+
+class ResultsConfig(BaseModel):
+    page_size: int = Field(default=100, ge=1)
+    max_page_size: int = Field(default=1000, ge=1)
+    export_chunk_size: int = Field(default=1000, ge=1)
+
+
+class BatchConfig(BaseModel):
+    max_in_flight: int = Field(default=32, ge=1)
+    write_chunk_size: int = Field(default=256, ge=1)
+
+
+class VerdictConfig(BaseModel):
+    max_tokens: int = Field(default=64, ge=1)
+    explain_flagged: bool = True
+
+
+class PrefilterConfig(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    enabled: bool = False
+    model_file: str = "prefilter.npz"
+    benign_below: float = Field(default=0.05, ge=0, le=1)
+    hateful_above: float = Field(default=0.95, ge=0, le=1)
+
+    @model_validator(mode="after")
+    def check_thresholds(self) -> "PrefilterConfig":
+        if self.benign_below >= self.hateful_above:
+            raise ValueError(f"`benign_below` {self.benign_below} must be below `hateful_above` {self.hateful_above}")
+        return self
+
+
+class JobsConfig(BaseModel):
+    enabled: bool = True
+    input_dir: Path = Path("data/jobs")
+    claim_size: int = Field(default=32, ge=1)
+    poll_interval_s: float = Field(default=2, gt=0)
+    lease_s: float = Field(default=600, gt=0)
+    max_attempts: int = Field(default=3, ge=1)
+
+
+class StartupConfig(BaseModel):
+    warmup: bool = False
 
 
 class RootConfig(BaseModel):
@@ -38,7 +171,40 @@ class RootConfig(BaseModel):
 
     llm: LLMConfig
     uvicorn: UvicornConfig
+    workers: WorkersConfig = WorkersConfig()
+    startup: StartupConfig = StartupConfig()
     db: DBConfig
+    result_cache: ResultCacheConfig = ResultCacheConfig()
+    persistence: PersistenceConfig = PersistenceConfig()
+    partitions: PartitionsConfig = PartitionsConfig()
+    results: ResultsConfig = ResultsConfig()
+    batch: BatchConfig = BatchConfig()
+    jobs: JobsConfig = JobsConfig()
+    verdict: VerdictConfig = VerdictConfig()
+    prefilter: PrefilterConfig = PrefilterConfig()
+
+
+@cache
+def load_configs() -> RootConfig:
+    """Settings of `settings.toml` and of the environment, read and validated once, on first use"""
+    from dynaconf import Dynaconf  # slow to import, and only needed to read the settings
+
+    settings = Dynaconf(
+        envvar_prefix="DYNACONF",
+        settings_files=["settings.toml"],
+        environments=True,
+    )
+    return RootConfig.model_validate({k.lower(): v for k, v in settings.as_dict().items()})
+
+
+class _LazyRootConfig:
+    """`RootConfig` loaded on the first access to one of its attributes rather than on import"""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(load_configs(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(load_configs(), name, value)
 
 
-CONFIGS = RootConfig.model_validate({k.lower(): v for k, v in settings.as_dict().items()})
+CONFIGS = cast(RootConfig, _LazyRootConfig())
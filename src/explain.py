@@ -0,0 +1,79 @@
+import threading
+import uuid as uuid_pkg
+from collections.abc import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel
+
+from src.llm import LLMError, LLMRunParsedModel, LLMService
+from src.llm.detect_hate_speech import llm_explain_hate_speech
+from src.llm.executor import InferenceExecutor
+from src.logging import get_logger
+from src.models import DetectHateSpeechReasoning, DetectHateSpeechSQLModel, DetectHateSpeechVerdict, LLMRunSQLModel
+from src.persistence import add_rows
+from src.result_cache import DetectionResultCache
+
+LOGGER = get_logger("DetectionExplainer")
+
+
+class ExplanationError(LLMError):
+    pass
+
+
+class DetectionExplainer:
+    """Generate the missing reasoning of stored verdict-only detection results"""
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        result_cache: DetectionResultCache,
+        session_factory: Callable[[], AsyncSession],
+    ) -> None:
+        self.executor = executor
+        self.result_cache = result_cache
+        self.session_factory = session_factory
+
+    async def explain(self, result_id: uuid_pkg.UUID) -> DetectHateSpeechSQLModel | None:
+        async with self.session_factory() as session:
+            detect_res = await session.get(DetectHateSpeechSQLModel, result_id)
+            if detect_res is None or detect_res.reasoning is not None:
+                return detect_res
+            verdict_run = await session.get(LLMRunSQLModel, detect_res.llm_run_id)
+        model_name = self._model_name(verdict_run=verdict_run)
+
+        text = detect_res.text
+        verdict = DetectHateSpeechVerdict(
+            is_hate_speech=detect_res.is_hate_speech, target_of_hate=detect_res.target_of_hate
+        )
+
+        def _explain(llm: LLMService, cancel_event: threading.Event) -> LLMRunParsedModel[DetectHateSpeechReasoning]:
+            return llm_explain_hate_speech(llm=llm, text=text, verdict=verdict, cancel_event=cancel_event)
+
+        llm_run = await self.executor.run(fn=_explain, model_name=model_name)
+        async with self.session_factory() as session:
+            rows: list[SQLModel] = [LLMRunSQLModel(**llm_run.model_dump())]
+            if llm_run.success and llm_run.parsed_output:
+                detect_res.reasoning = llm_run.parsed_output.reasoning
+                rows.append(detect_res)
+            await add_rows(session=session, rows=rows)
+            await session.commit()
+        if not llm_run.success or not llm_run.parsed_output:
+            raise ExplanationError(llm_run.error)
+
+        if detect_res.cache_key is not None:
+            self.result_cache.put(key=detect_res.cache_key, result=detect_res)
+        return detect_res
+
+    def _model_name(self, verdict_run: LLMRunSQLModel | None) -> str | None:
+        """Model that gave the verdict, so that the reasoning comes from the same model. The default model is used for
+        verdicts of the pre-filter, or of a model that is no longer registered.
+        """
+        if verdict_run is None or verdict_run.llm_model_name not in self.executor.registry.model_names:
+            return None
+        return verdict_run.llm_model_name
+
+    async def explain_in_background(self, result_id: uuid_pkg.UUID) -> None:
+        try:
+            await self.explain(result_id=result_id)
+        except Exception as e:
+            LOGGER.exception("Failed to explain detection result `%s`: %s", result_id, e)
@@ -0,0 +1,314 @@
+import asyncio
+import gzip
+import uuid as uuid_pkg
+from collections.abc import Callable
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pydantic import AwareDatetime, BaseModel
+from sqlalchemy import and_, func, insert, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+from sqlmodel.sql.expression import Select
+
+from src.batch import parse_ndjson_record, submit_with_backoff
+from src.config import PROJECT_ROOT_PATH, JobsConfig, LLMConfig
+from src.llm import LLMRunParsedModel
+from src.llm.batching import TextScheduler
+from src.llm.detect_hate_speech import is_prefiltered
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT
+from src.logging import get_logger
+from src.models import (
+    DetectHateSpeechResult,
+    DetectHateSpeechSQLModel,
+    DetectionJobItemSQLModel,
+    DetectionJobSQLModel,
+    JobItemStatus,
+    LLMRunSQLModel,
+)
+from src.persistence import add_rows
+from src.result_cache import DetectionResultCache, detection_cache_key
+
+LOGGER = get_logger("Jobs")
+
+_INSERT_CHUNK_SIZE = 1000
+
+
+class JobSourceError(Exception):
+    pass
+
+
+class CreateDetectionJobRequest(BaseModel):
+    source: str  # NDJSON file, optionally gzipped, relative to the jobs input directory
+
+
+class DetectionJobProgress(BaseModel):
+    job_id: uuid_pkg.UUID
+    source: str
+    status: str
+    n_items: int
+    done: int
+    failed: int
+    remaining: int
+    throughput_per_s: float | None = None
+    eta_s: float | None = None
+    created_at: AwareDatetime
+    started_at: AwareDatetime | None = None
+
+
+def resolve_job_source(source: str, input_dir: Path) -> Path:
+    input_dir = (PROJECT_ROOT_PATH / input_dir).resolve()
+    path = (input_dir / source).resolve()
+    if not path.is_relative_to(input_dir):
+        raise JobSourceError(f"Job source `{source}` is outside of the jobs input directory")
+    if not path.is_file():
+        raise JobSourceError(f"Job source `{source}` not found")
+    return path
+
+
+def read_job_items(path: Path, job_id: uuid_pkg.UUID, llm_config: LLMConfig) -> list[dict]:
+    """Rows of the `detection_job_item` table for each record of an NDJSON job source"""
+    now = datetime.now(tz=timezone.utc)
+    rows: list[dict] = []
+    with gzip.open(path, "rb") if path.suffix == ".gz" else path.open("rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = {"uuid": uuid_pkg.uuid4(), "job_id": job_id, "position": len(rows), "attempts": 0}
+            if isinstance(text := parse_ndjson_record(line), ValueError):
+                row.update(status=JobItemStatus.FAILED.value, error=str(text), finished_at=now)
+            else:
+                cache_key = detection_cache_key(text=text, prompt=HATE_SPEECH_DETECTION_PROMPT, llm_config=llm_config)
+                row.update(status=JobItemStatus.PENDING.value, text=text, cache_key=cache_key)
+            rows.append(row)
+    return rows
+
+
+async def create_job(
+    session: AsyncSession, source: str, llm_config: LLMConfig, config: JobsConfig
+) -> DetectionJobSQLModel:
+    path = resolve_job_source(source=source, input_dir=config.input_dir)
+    job_id = uuid_pkg.uuid4()
+    rows = await asyncio.to_thread(read_job_items, path, job_id, llm_config)
+
+    job = DetectionJobSQLModel(uuid=job_id, source=source, n_items=len(rows), created_at=datetime.now(tz=timezone.utc))
+    session.add(job)
+    await session.flush()
+    for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+        await session.execute(insert(DetectionJobItemSQLModel), rows[start : start + _INSERT_CHUNK_SIZE])
+    await session.commit()
+    LOGGER.info("Created job `%s` with %d items from `%s`", job_id, len(rows), source)
+    return job
+
+
+def job_progress(
+    job: DetectionJobSQLModel, counts: dict[str, int], last_finished_at: datetime | None
+) -> DetectionJobProgress:
+    done = counts.get(JobItemStatus.DONE.value, 0)
+    failed = counts.get(JobItemStatus.FAILED.value, 0)
+    remaining = job.n_items - done - failed
+    if remaining == 0:
+        status = JobItemStatus.DONE
+    elif job.started_at is not None:
+        status = JobItemStatus.RUNNING
+    else:
+        status = JobItemStatus.PENDING
+
+    throughput_per_s = eta_s = None
+    if job.started_at is not None and last_finished_at is not None and last_finished_at > job.started_at:
+        throughput_per_s = (done + failed) / (last_finished_at - job.started_at).total_seconds()
+        eta_s = remaining / throughput_per_s if throughput_per_s else None
+    return DetectionJobProgress(
+        job_id=job.uuid,
+        source=job.source,
+        status=status.value,
+        n_items=job.n_items,
+        done=done,
+        failed=failed,
+        remaining=remaining,
+        throughput_per_s=throughput_per_s,
+        eta_s=eta_s,
+        created_at=job.created_at,
+        started_at=job.started_at,
+    )
+
+
+async def get_job_progress(session: AsyncSession, job_id: uuid_pkg.UUID) -> DetectionJobProgress | None:
+    if (job := await session.get(DetectionJobSQLModel, job_id)) is None:
+        return None
+    stmt: Select = (
+        select(
+            DetectionJobItemSQLModel.status,
+            func.count(),
+            func.max(DetectionJobItemSQLModel.finished_at),
+        )
+        .where(DetectionJobItemSQLModel.job_id == job_id)
+        .group_by(DetectionJobItemSQLModel.status)
+    )
+    rows = (await session.execute(stmt)).all()
+    last_finished_ats = [last_finished_at for _, _, last_finished_at in rows if last_finished_at is not None]
+    return job_progress(
+        job=job,
+        counts={status: count for status, count, _ in rows},
+        last_finished_at=max(last_finished_ats, default=None),
+    )
+
+
+class JobWorker:
+    """Detect the items of all the pending jobs, `claim_size` items at a time.
+
+    Items are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so the workers of several app replicas split the work.
+    An item whose text already has a row in `detect_hate_speech_result` is resolved to it without running the LLM,
+    which makes an interrupted job resume where it stopped.
+    """
+
+    def __init__(
+        self,
+        scheduler: TextScheduler[LLMRunParsedModel[DetectHateSpeechResult]],
+        result_cache: DetectionResultCache,
+        session_factory: Callable[[], AsyncSession],
+        config: JobsConfig,
+    ) -> None:
+        self.scheduler = scheduler
+        self.result_cache = result_cache
+        self.session_factory = session_factory
+        self.config = config
+        self._task: asyncio.Task | None = None
+        self.n_done = 0
+        self.n_failed = 0
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def status(self) -> dict:
+        return {"running": self._task is not None, "done": self.n_done, "failed": self.n_failed}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                n_items = await self.run_once()
+            except Exception as e:
+                LOGGER.exception("Job worker iteration failed: %s", e)
+                n_items = 0
+            if n_items == 0:
+                await asyncio.sleep(self.config.poll_interval_s)
+
+    async def run_once(self) -> int:
+        """Claim and detect one chunk of job items, returns the number of claimed items"""
+        async with self.session_factory() as session:
+            items = await self._claim(session=session)
+        if not items:
+            return 0
+
+        keys = [item.cache_key for item in items if item.cache_key is not None]
+        async with self.session_factory() as session:
+            stmt = select(DetectHateSpeechSQLModel).where(col(DetectHateSpeechSQLModel.cache_key).in_(keys))
+            existing_results = {res.cache_key: res for res in (await session.execute(stmt)).scalars()}
+
+        to_detect = [item for item in items if item.text is not None and item.cache_key not in existing_results]
+        llm_runs = await asyncio.gather(
+            *[submit_with_backoff(scheduler=self.scheduler, text=item.text) for item in to_detect],  # type: ignore[arg-type]
+            return_exceptions=True,
+        )
+
+        now = datetime.now(tz=timezone.utc)
+        rows: list[LLMRunSQLModel | DetectHateSpeechSQLModel] = []
+        for item in items:
+            if (existing_res := existing_results.get(item.cache_key)) is not None:
+                item.status, item.result_id, item.finished_at = JobItemStatus.DONE, existing_res.uuid, now
+        for item, llm_run in zip(to_detect, llm_runs, strict=True):
+            if isinstance(llm_run, BaseException):
+                item.error = f"{llm_run.__class__.__name__}: {llm_run}"
+                if item.attempts < self.config.max_attempts:
+                    item.status, item.claimed_at = JobItemStatus.PENDING, None
+                else:
+                    item.status, item.finished_at = JobItemStatus.FAILED, now
+                continue
+
+            llm_run_sql = LLMRunSQLModel(**llm_run.model_dump())
+            rows.append(llm_run_sql)
+            if not llm_run.success or not llm_run.parsed_output:
+                item.status, item.error, item.finished_at = JobItemStatus.FAILED, llm_run.error, now
+                continue
+            detect_res = DetectHateSpeechSQLModel(
+                text=item.text,
+                llm_run_id=llm_run_sql.uuid,
+                cache_key=None if is_prefiltered(llm_run) else item.cache_key,
+                **llm_run.parsed_output.model_dump(),
+            )
+            rows.append(detect_res)
+            item.status, item.error, item.result_id, item.finished_at = JobItemStatus.DONE, None, detect_res.uuid, now
+
+        async with self.session_factory() as session:
+            await add_rows(session=session, rows=rows)
+            session.add_all(items)
+            await session.commit()
+        for row in rows:
+            if isinstance(row, DetectHateSpeechSQLModel) and row.cache_key is not None:
+                self.result_cache.put(key=row.cache_key, result=row)
+
+        self.n_done += sum(item.status == JobItemStatus.DONE for item in items)
+        self.n_failed += sum(item.status == JobItemStatus.FAILED for item in items)
+        return len(items)
+
+    async def _claim(self, session: AsyncSession) -> list[DetectionJobItemSQLModel]:
+        now = datetime.now(tz=timezone.utc)
+        lease_expired = and_(
+            col(DetectionJobItemSQLModel.status) == JobItemStatus.RUNNING.value,
+            col(DetectionJobItemSQLModel.claimed_at) < now - timedelta(seconds=self.config.lease_s),
+        )
+        # Abandoned on every attempt, e.g. by a worker crashing on its text, rather than claimed forever
+        abandoned = await session.execute(
+            update(DetectionJobItemSQLModel)
+            .where(lease_expired, col(DetectionJobItemSQLModel.attempts) >= self.config.max_attempts)
+            .values(
+                status=JobItemStatus.FAILED.value,
+                error=f"Lease expired on each of its {self.config.max_attempts} attempts",
+                finished_at=now,
+            )
+            .returning(col(DetectionJobItemSQLModel.uuid))
+        )
+        self.n_failed += len(abandoned.all())
+        claimable = (
+            select(DetectionJobItemSQLModel.uuid)
+            .where(
+                or_(
+                    col(DetectionJobItemSQLModel.status) == JobItemStatus.PENDING.value,
+                    and_(lease_expired, col(DetectionJobItemSQLModel.attempts) < self.config.max_attempts),
+                )
+            )
+            .order_by(col(DetectionJobItemSQLModel.position))
+            .limit(self.config.claim_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(DetectionJobItemSQLModel)
+            .where(col(DetectionJobItemSQLModel.uuid).in_(claimable.scalar_subquery()))
+            .values(
+                status=JobItemStatus.RUNNING.value,
+                claimed_at=now,
+                attempts=DetectionJobItemSQLModel.attempts + 1,
+            )
+            .returning(DetectionJobItemSQLModel)
+        )
+        items = list((await session.execute(stmt)).scalars())
+        if items:
+            await session.execute(
+                update(DetectionJobSQLModel)
+                .where(
+                    col(DetectionJobSQLModel.uuid).in_({item.job_id for item in items}),
+                    col(DetectionJobSQLModel.started_at).is_(None),
+                )
+                .values(started_at=now)
+            )
+        await session.commit()
+        return items
@@ -1,19 +1,55 @@
+import atexit
+import ctypes
+import hashlib
+import importlib.util
+import json
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
 from datetime import datetime, timezone
-from typing import Any, Generic, TypeVar
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Generic, NamedTuple, TypeVar, cast
 
-from llama_cpp import Llama
-from llama_cpp.llama_grammar import LlamaGrammar, SchemaConverter
-from llama_cpp.llama_types import CreateCompletionResponse
 from pydantic import BaseModel
 
-from src.config import CONFIGS, MODEL_DIR_PATH
+from src.config import CONFIGS, MODEL_DIR_PATH, LLMConfig
 from src.logging import get_logger
+from src.metrics import MODEL_LOADS, record_llm_error, record_llm_run, record_llm_stage
 from src.models import LLMRun
 
 from .prompts import PromptTemplate
+from .tuning import resolve_model_configs
+
+if TYPE_CHECKING:
+    import llama_cpp
+    import numpy as np
+    from llama_cpp import Llama
+    from llama_cpp.llama_grammar import LlamaGrammar
+    from llama_cpp.llama_types import CreateCompletionResponse
 
 LOGGER = get_logger("LLM")
 
+
+def _lazy_import(name: str) -> ModuleType:
+    """Module `name`, executed on the first access to one of its attributes rather than on import"""
+    if (module := sys.modules.get(name)) is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    assert spec is not None and spec.loader is not None
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+if not TYPE_CHECKING:
+    # Loads the llama.cpp shared library, only needed once a model is loaded or a grammar compiled
+    llama_cpp = _lazy_import("llama_cpp")
+    np = _lazy_import("numpy")
+
 PydanticModel = TypeVar("PydanticModel", bound=BaseModel)
 
 
@@ -25,22 +61,78 @@ class LLMRunParsedModel(LLMRun, Generic[PydanticModel]):
     parsed_output: PydanticModel | None = None
 
 
+class _PromptPrefixState(NamedTuple):
+    tokens: list[int]
+    kv_state: bytes
+    eval_s: float
+
+
+class _CompletionTimings(NamedTuple):
+    prompt_eval_s: float
+    generation_s: float
+
+
+class _SequenceCompletion(NamedTuple):
+    text: str
+    n_tokens: int
+    finish_reason: str
+
+
+# Run configs of `create_completion` applied when sampling the sequences of a batch, with their sampling param names
+_BATCH_SAMPLING_CONFIGS = {
+    "temperature": "temp",
+    "top_k": "top_k",
+    "top_p": "top_p",
+    "min_p": "min_p",
+    "typical_p": "typical_p",
+    "tfs_z": "tfs_z",
+    "repeat_penalty": "penalty_repeat",
+    "frequency_penalty": "penalty_freq",
+    "presence_penalty": "penalty_present",
+    "mirostat_mode": "mirostat",
+    "mirostat_tau": "mirostat_tau",
+    "mirostat_eta": "mirostat_eta",
+}
+_BATCH_RUN_CONFIGS = {"max_tokens", *_BATCH_SAMPLING_CONFIGS}
+
+
 class LLMService:
-    def __init__(self, tracking: bool = False) -> None:
-        llm_cfg = CONFIGS.llm
+    def __init__(self, llm_config: LLMConfig | None = None, tracking: bool = False) -> None:
+        llm_cfg = llm_config or CONFIGS.llm
         self.model_name = llm_cfg.model_name
-        self.model_configs = llm_cfg.model_configs
+        self.model_configs = resolve_model_configs(model_name=self.model_name, model_configs=llm_cfg.model_configs)
         try:
-            self.model = Llama(model_path=str(MODEL_DIR_PATH / self.model_name), **self.model_configs)
+            self.model = _load_llama(model_path=str(MODEL_DIR_PATH / self.model_name), **self.model_configs)
         except Exception as e:
             msg = "Failed to initiate model"
-            LOGGER.exception("%s `%s` with configs `%s`: %s", msg, llm_cfg.model_name, llm_cfg.model_configs, e)
+            LOGGER.exception("%s `%s` with configs `%s`: %s", msg, self.model_name, self.model_configs, e)
+            record_llm_error(e)
             raise LLMError(msg) from e
+        MODEL_LOADS.inc(self.model_name)
         self.default_run_configs = llm_cfg.run_configs
+        self.prefix_cache = llm_cfg.prefix_cache
+        self._prefix_states: dict[str, _PromptPrefixState] = {}
 
-    def _llm_completion(self, run_configs: dict) -> CreateCompletionResponse:
+    def count_tokens(self, text: str) -> int:
+        return len(self.model.tokenize(text.encode("utf-8"), special=True))
+
+    def tokenize_text(self, text: str) -> list[int]:
+        """Tokens of an input text, without the BOS token nor special tokens, unlike a full prompt"""
+        return self.model.tokenize(text.encode("utf-8"), add_bos=False, special=False)
+
+    def detokenize(self, tokens: list[int]) -> str:
+        # A span of tokens can start or end in the middle of a multi-byte character
+        return self.model.detokenize(tokens).decode("utf-8", errors="ignore")
+
+    def set_n_threads(self, n_threads: int, n_threads_batch: int) -> None:
+        """Threads of the generation and of the prompt evaluation, without reloading the model"""
+        _set_n_threads(model=self.model, n_threads=n_threads, n_threads_batch=n_threads_batch)
+        self.model_configs = {**self.model_configs, "n_threads": n_threads, "n_threads_batch": n_threads_batch}
+
+    def _llm_completion(self, run_configs: dict) -> "CreateCompletionResponse":
         try:
-            return self.model.create_completion(**run_configs)
+            # Not streamed, so a single response
+            return cast("CreateCompletionResponse", self.model.create_completion(**run_configs))
         except Exception as e:
             msg = "Failed to get llm outputs"
             LOGGER.exception("%s with `%s`: %s", msg, run_configs, e)
@@ -50,52 +142,621 @@ class LLMService:
         self,
         prompt: PromptTemplate,
         prompt_inputs: dict,
+        cancel_event: threading.Event | None = None,
+        on_text: Callable[[str], None] | None = None,
         **kwargs: Any,
     ) -> LLMRun:
+        """Run a completion of `prompt`, streaming the generated text to `on_text` as it is generated if given"""
+        formatted_prompt = prompt.format_inputs(inputs=prompt_inputs)
+        run_configs = {**self.default_run_configs, **kwargs}
         llm_run = LLMRun(
             success=True,
-            prompt=prompt.format_inputs(inputs=prompt_inputs),
+            prompt=formatted_prompt,
+            prompt_template_id=prompt.template_id,
+            prompt_inputs=prompt_inputs,
             llm_model_name=self.model_name,
             llm_model_configs=self.model_configs,
-            run_configs={**self.default_run_configs, **kwargs},
+            run_configs=run_configs,
             start_run=datetime.now(tz=timezone.utc),
         )
         try:
-            llm_out = self.model.create_completion(prompt=llm_run.prompt, **llm_run.run_configs)
-            llm_run.llm_outputs = llm_out
+            if self.prefix_cache:
+                llm_run.run_metadata["prefix_cache"] = self._load_prompt_prefix(
+                    prompt=prompt, formatted_prompt=formatted_prompt
+                )
+            # Room left by the prompt in the context, rather than failing or truncating the prompt
+            llm_run.run_metadata["max_tokens"] = _cap_max_tokens(
+                max_tokens=run_configs.get("max_tokens"),
+                n_ctx=self.model.n_ctx(),
+                n_prompt_tokens=self.count_tokens(formatted_prompt),
+            )
+            completion_kwargs = {
+                **run_configs,
+                "max_tokens": llm_run.run_metadata["max_tokens"],
+                **_cancellation_kwargs(cancel_event=cancel_event),
+            }
+            _reset_timings(model=self.model)
+            if on_text is None:
+                llm_run.llm_outputs = cast(
+                    dict, self.model.create_completion(prompt=formatted_prompt, **completion_kwargs)
+                )
+            else:
+                llm_run.llm_outputs = self._create_completion_stream(
+                    prompt=formatted_prompt, on_text=on_text, **completion_kwargs
+                )
+            _set_completion_stats(llm_run=llm_run, timings=_get_timings(model=self.model))
+            if cancel_event is not None and cancel_event.is_set():
+                llm_run.success = False
+                llm_run.error = "LLM completion cancelled"
         except Exception as e:
             err_msg = f"Failed to get run llm completion: {e}"
             LOGGER.exception(err_msg)
+            record_llm_error(e)
             llm_run.success = False
             llm_run.error = err_msg
         finally:
             llm_run.end_run = datetime.now(tz=timezone.utc)
+        record_llm_run(llm_run=llm_run)
         return llm_run
 
-    def run_completion_parse_model(
-        self, prompt: PromptTemplate, prompt_inputs: dict, output_model: type[PydanticModel], **kwargs: Any
+    def _create_completion_stream(self, prompt: str, on_text: Callable[[str], None], **kwargs: Any) -> dict:
+        """`create_completion(stream=True)`, with the chunks collected into the response of a non-streamed completion"""
+        texts = []
+        n_completion_tokens = 0
+        chunk: dict | None = None
+        finish_reason: str | None = None
+        chunks = cast(Iterator[dict], self.model.create_completion(prompt=prompt, stream=True, **kwargs))
+        for chunk in chunks:
+            choice = chunk["choices"][0]
+            if choice["text"]:
+                texts.append(choice["text"])
+                on_text(choice["text"])
+            if (finish_reason := choice["finish_reason"]) is None:
+                # llama.cpp streams one chunk per generated token, before the final chunk with the finish reason
+                n_completion_tokens += 1
+        if chunk is None:
+            raise LLMError("LLM completion stream ended without any chunk")
+        n_prompt_tokens = len(self.model.tokenize(prompt.encode("utf-8"), special=True))
+        return {
+            "id": chunk["id"],
+            "object": "text_completion",
+            "created": chunk["created"],
+            "model": chunk["model"],
+            "choices": [{"text": "".join(texts), "index": 0, "logprobs": None, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": n_prompt_tokens,
+                "completion_tokens": n_completion_tokens,
+                "total_tokens": n_prompt_tokens + n_completion_tokens,
+            },
+        }
+
+    def _load_prompt_prefix(self, prompt: PromptTemplate, formatted_prompt: str) -> dict:
+        """Make sure the KV cache holds the evaluated static prefix of `prompt` before running `formatted_prompt`.
+
+        The prefix is evaluated and snapshotted once per template. Before a completion, the snapshot is restored if it
+        covers more of the prompt than the KV cache currently does (e.g.: the last completion used another template).
+        llama.cpp then only evaluates the part of the prompt after the cached tokens.
+        """
+        prefix = prompt.static_prefix
+        if not prefix:
+            return {}
+        try:
+            # llama.cpp always re-evaluates the last prompt token to get the logits to sample from
+            prompt_tokens = self.model.tokenize(formatted_prompt.encode("utf-8"), special=True)[:-1]
+            prefix_info = {}
+            if (prefix_state := self._prefix_states.get(prefix)) is None:
+                prefix_state = self._prefix_states[prefix] = self._eval_prompt_prefix(prefix=prefix)
+                prefix_info["prefix_eval_s"] = prefix_state.eval_s
+            elif _common_prefix_len(prefix_state.tokens, prompt_tokens) > _common_prefix_len(
+                self.model._input_ids.tolist(), prompt_tokens
+            ):
+                _set_kv_state(model=self.model, kv_state=prefix_state.kv_state, tokens=prefix_state.tokens)
+                prefix_info["restored"] = True
+            reused_tokens = _common_prefix_len(self.model._input_ids.tolist(), prompt_tokens)
+        except Exception as e:
+            LOGGER.warning("Failed to load prompt prefix state, evaluating the full prompt: %s", e)
+            return {"error": str(e)}
+        saved_s = (
+            0.0 if "prefix_eval_s" in prefix_info else reused_tokens * prefix_state.eval_s / len(prefix_state.tokens)
+        )
+        return {
+            **prefix_info,
+            "prefix_tokens": len(prefix_state.tokens),
+            "reused_prompt_tokens": reused_tokens,
+            "prompt_eval_saved_s": saved_s,
+        }
+
+    def _eval_prompt_prefix(self, prefix: str) -> _PromptPrefixState:
+        tokens = self.model.tokenize(prefix.encode("utf-8"), special=True)
+        self.model.reset()
+        start = time.perf_counter()
+        self.model.eval(tokens)
+        eval_s = time.perf_counter() - start
+        LOGGER.info("Evaluated %d prompt prefix tokens in %.3fs", len(tokens), eval_s)
+        return _PromptPrefixState(tokens=tokens, kv_state=_copy_kv_state(model=self.model), eval_s=eval_s)
+
+    def run_completion_parse_model(  # noqa: PLR0913
+        self,
+        prompt: PromptTemplate,
+        prompt_inputs: dict,
+        output_model: type[PydanticModel],
+        cancel_event: threading.Event | None = None,
+        on_text: Callable[[str], None] | None = None,
+        **kwargs: Any,
     ) -> LLMRunParsedModel:
-        grammar = pydantic_model_to_llama_grammar(model=output_model)
-        llm_run = self.run_completion(prompt=prompt, prompt_inputs=prompt_inputs, grammar=grammar, **kwargs)
-        if not llm_run.success or not llm_run.llm_outputs:
-            return LLMRunParsedModel(**llm_run.model_dump())
+        grammar_start = time.perf_counter()
+        grammar = get_llama_grammar(model=output_model)
+        grammar_s = time.perf_counter() - grammar_start
+        llm_run = self.run_completion(
+            prompt=prompt,
+            prompt_inputs=prompt_inputs,
+            cancel_event=cancel_event,
+            on_text=on_text,
+            grammar=grammar,
+            **kwargs,
+        )
+        llm_run.grammar_s = grammar_s
+        record_llm_stage(stage="grammar", duration_s=grammar_s)
+        return _parse_llm_run(llm_run=llm_run, output_model=output_model)
+
+    def run_completion_parse_model_batch(
+        self,
+        prompt: PromptTemplate,
+        prompt_inputs_batch: list[dict],
+        output_model: type[PydanticModel],
+        cancel_event: threading.Event | None = None,
+        **kwargs: Any,
+    ) -> list[LLMRunParsedModel]:
+        """Run the completions of a batch together, as parallel sequences in the context of this model.
+
+        Every decoding step evaluates the next token of all the unfinished sequences at once, reading the weights of
+        the model once for the batch instead of once per completion, and the prompt tokens shared by the batch (the
+        static part of `prompt`) are evaluated once. The sequences split the context: each gets the shared tokens and
+        an equal part of the rest of `n_ctx`, and a batch whose prompts do not fit in their part is split in halves.
+        With run configs other than `max_tokens` and the sampling ones, the completions run one after the other.
+        """
+        run_configs = {**self.default_run_configs, **kwargs}
+        if len(prompt_inputs_batch) == 1 or not set(run_configs) <= _BATCH_RUN_CONFIGS:
+            return self._run_completion_parse_model_sequence(
+                prompt=prompt,
+                prompt_inputs_batch=prompt_inputs_batch,
+                output_model=output_model,
+                cancel_event=cancel_event,
+                **kwargs,
+            )
+        formatted_prompts = [prompt.format_inputs(inputs=prompt_inputs) for prompt_inputs in prompt_inputs_batch]
+        llm_runs = [
+            LLMRun(
+                success=True,
+                prompt=formatted_prompt,
+                prompt_template_id=prompt.template_id,
+                prompt_inputs=prompt_inputs,
+                llm_model_name=self.model_name,
+                llm_model_configs=self.model_configs,
+                run_configs=run_configs,
+                start_run=datetime.now(tz=timezone.utc),
+            )
+            for formatted_prompt, prompt_inputs in zip(formatted_prompts, prompt_inputs_batch, strict=True)
+        ]
+        prompts_tokens = [
+            self.model.tokenize(formatted_prompt.encode("utf-8"), special=True)
+            for formatted_prompt in formatted_prompts
+        ]
+        n_shared = _n_shared_tokens(prompts_tokens=prompts_tokens)
+        n_ctx_seq = n_shared + (self.model.n_ctx() - n_shared) // len(prompts_tokens)
         try:
-            return LLMRunParsedModel(
-                parsed_output=output_model.model_validate_json(llm_run.llm_outputs["choices"][0]["text"]),
-                **llm_run.model_dump(),
+            max_tokens = [
+                _cap_max_tokens(max_tokens=run_configs.get("max_tokens"), n_ctx=n_ctx_seq, n_prompt_tokens=len(tokens))
+                for tokens in prompts_tokens
+            ]
+        except LLMError:
+            half = len(prompt_inputs_batch) // 2
+            return [
+                llm_run
+                for prompt_inputs_half in [prompt_inputs_batch[:half], prompt_inputs_batch[half:]]
+                for llm_run in self.run_completion_parse_model_batch(
+                    prompt=prompt,
+                    prompt_inputs_batch=prompt_inputs_half,
+                    output_model=output_model,
+                    cancel_event=cancel_event,
+                    **kwargs,
+                )
+            ]
+
+        grammar_start = time.perf_counter()
+        grammars = [_copy_llama_grammar(grammar=_GRAMMAR_CACHE.get_compiled(model=output_model)) for _ in llm_runs]
+        grammar_s = time.perf_counter() - grammar_start
+        record_llm_stage(stage="grammar", duration_s=grammar_s)
+        try:
+            prefix_info = {}
+            if self.prefix_cache:
+                prefix_info = self._load_prompt_prefix(prompt=prompt, formatted_prompt=formatted_prompts[0])
+            completions, timings = _create_completions(
+                model=self.model,
+                prompts_tokens=prompts_tokens,
+                n_shared=n_shared,
+                max_tokens=max_tokens,
+                grammars=grammars,
+                run_configs=run_configs,
+                cancel_event=cancel_event,
             )
         except Exception as e:
-            err_msg = f"Failed to parse LLM output to {output_model.__name__}: {e}"
+            err_msg = f"Failed to get run llm completion: {e}"
             LOGGER.exception(err_msg)
-            return LLMRunParsedModel(**{**llm_run.model_dump(), "success": False, "error": err_msg})
+            record_llm_error(e)
+            for llm_run in llm_runs:
+                llm_run.success = False
+                llm_run.error = err_msg
+        else:
+            for llm_run, tokens, completion, run_max_tokens in zip(
+                llm_runs, prompts_tokens, completions, max_tokens, strict=True
+            ):
+                llm_run.run_metadata.update(
+                    {"prefix_cache": prefix_info, "max_tokens": run_max_tokens, "batch_size": len(llm_runs)}
+                )
+                llm_run.llm_outputs = _completion_response(
+                    model=self.model.model_path,
+                    text=completion.text,
+                    finish_reason=completion.finish_reason,
+                    n_prompt_tokens=len(tokens),
+                    n_completion_tokens=completion.n_tokens,
+                )
+                _set_completion_stats(llm_run=llm_run, timings=timings)
+                if cancel_event is not None and cancel_event.is_set():
+                    llm_run.success = False
+                    llm_run.error = "LLM completion cancelled"
+        end_run = datetime.now(tz=timezone.utc)
+        parsed_runs = []
+        for llm_run in llm_runs:
+            llm_run.end_run = end_run
+            llm_run.grammar_s = grammar_s
+            record_llm_run(llm_run=llm_run)
+            parsed_runs.append(_parse_llm_run(llm_run=llm_run, output_model=output_model))
+        return parsed_runs
+
+    def _run_completion_parse_model_sequence(
+        self,
+        prompt: PromptTemplate,
+        prompt_inputs_batch: list[dict],
+        output_model: type[PydanticModel],
+        cancel_event: threading.Event | None = None,
+        **kwargs: Any,
+    ) -> list[LLMRunParsedModel]:
+        """Run the completions of a batch one after the other, the ones after a cancellation failing without running"""
+        llm_runs: list[LLMRunParsedModel] = []
+        for prompt_inputs in prompt_inputs_batch:
+            if cancel_event is not None and cancel_event.is_set():
+                llm_runs.append(
+                    LLMRunParsedModel(
+                        success=False,
+                        error="LLM completion cancelled",
+                        prompt=prompt.format_inputs(inputs=prompt_inputs),
+                        prompt_template_id=prompt.template_id,
+                        prompt_inputs=prompt_inputs,
+                        llm_model_name=self.model_name,
+                        llm_model_configs=self.model_configs,
+                        run_configs={**self.default_run_configs, **kwargs},
+                    )
+                )
+                continue
+            llm_runs.append(
+                self.run_completion_parse_model(
+                    prompt=prompt,
+                    prompt_inputs=prompt_inputs,
+                    output_model=output_model,
+                    cancel_event=cancel_event,
+                    **kwargs,
+                )
+            )
+        return llm_runs
+
+
+def _parse_llm_run(llm_run: LLMRun, output_model: type[PydanticModel]) -> LLMRunParsedModel:
+    if not llm_run.success or not llm_run.llm_outputs:
+        return LLMRunParsedModel(**llm_run.model_dump())
+    try:
+        parse_start = time.perf_counter()
+        parsed_output = output_model.model_validate_json(llm_run.llm_outputs["choices"][0]["text"])
+        llm_run.parse_s = time.perf_counter() - parse_start
+        record_llm_stage(stage="parse", duration_s=llm_run.parse_s)
+        return LLMRunParsedModel(parsed_output=parsed_output, **llm_run.model_dump())
+    except Exception as e:
+        err_msg = f"Failed to parse LLM output to {output_model.__name__}: {e}"
+        LOGGER.exception(err_msg)
+        record_llm_error(e)
+        return LLMRunParsedModel(**{**llm_run.model_dump(), "success": False, "error": err_msg})
+
 
+def _load_llama(model_path: str, **model_configs: Any) -> "Llama":
+    return llama_cpp.Llama(model_path=model_path, **model_configs)
 
-def pydantic_model_to_llama_grammar(model: type[BaseModel]) -> LlamaGrammar:
+
+def _cap_max_tokens(max_tokens: int | None, n_ctx: int, n_prompt_tokens: int) -> int:
+    """Tokens that can be generated after a prompt of `n_prompt_tokens`, up to `max_tokens` if positive"""
+    if n_prompt_tokens >= n_ctx:
+        raise LLMError(f"Prompt of {n_prompt_tokens} tokens does not fit in the context of {n_ctx} tokens")
+    room = n_ctx - n_prompt_tokens
+    return min(max_tokens, room) if max_tokens and max_tokens > 0 else room
+
+
+def _common_prefix_len(a: list[int], b: list[int]) -> int:
+    n = 0
+    for a_tok, b_tok in zip(a, b, strict=False):
+        if a_tok != b_tok:
+            break
+        n += 1
+    return n
+
+
+def _n_shared_tokens(prompts_tokens: list[list[int]]) -> int:
+    """Leading tokens common to all the prompts, all but the last one of the shortest prompt at most"""
+    n_shared = min(len(tokens) for tokens in prompts_tokens) - 1
+    for tokens in prompts_tokens[1:]:
+        n_shared = min(n_shared, _common_prefix_len(prompts_tokens[0], tokens))
+    return n_shared
+
+
+def _completion_response(
+    model: str, text: str, finish_reason: str | None, n_prompt_tokens: int, n_completion_tokens: int
+) -> dict:
+    """Response of a non-streamed `create_completion`"""
+    return {
+        "id": f"cmpl-{uuid.uuid4()}",
+        "object": "text_completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"text": text, "index": 0, "logprobs": None, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": n_prompt_tokens,
+            "completion_tokens": n_completion_tokens,
+            "total_tokens": n_prompt_tokens + n_completion_tokens,
+        },
+    }
+
+
+def _create_completions(  # noqa: PLR0913
+    model: "Llama",
+    prompts_tokens: list[list[int]],
+    n_shared: int,
+    max_tokens: list[int],
+    grammars: list["LlamaGrammar"],
+    run_configs: dict,
+    cancel_event: threading.Event | None = None,
+) -> tuple[list[_SequenceCompletion], _CompletionTimings]:
+    """Generate the completions of `prompts_tokens` together, each prompt in its own sequence of the KV cache.
+
+    The `n_shared` leading tokens of the prompts are evaluated in sequence 0, after the ones already in the KV cache,
+    then copied to the other sequences. The rest of the prompts is evaluated in batches of `n_batch` tokens, then every
+    decoding step evaluates the last sampled token of all the unfinished sequences as one batch. Each sequence samples
+    with its own grammar and repetition penalty history. The KV cache is left holding the shared tokens.
+    """
+    ctx = model._ctx
+    sampling_params = llama_cpp._internals._LlamaSamplingParams(
+        **{param: run_configs[config] for config, param in _BATCH_SAMPLING_CONFIGS.items() if config in run_configs}
+    )
+    n_prev = sampling_params.penalty_last_n
+    samplers = [
+        llama_cpp._internals._LlamaSamplingContext(
+            params=sampling_params,
+            mirostat_mu=ctypes.c_float(2.0 * sampling_params.mirostat_tau),
+            grammar=grammar,
+            prev=tokens[-n_prev:],
+        )
+        for tokens, grammar in zip(prompts_tokens, grammars, strict=True)
+    ]
+    batch = llama_cpp._internals._LlamaBatch(n_tokens=model.n_batch, embd=0, n_seq_max=1, verbose=model.verbose)
+    completions: list[list[int]] = [[] for _ in prompts_tokens]
+    finish_reasons: list[str | None] = [None for _ in prompts_tokens]
+    n_cached = _common_prefix_len(model._input_ids.tolist(), prompts_tokens[0][:n_shared])
+    ctx.kv_cache_seq_keep(0)
+    ctx.kv_cache_seq_rm(0, n_cached, -1)
+    try:
+        start = time.perf_counter()
+        _decode(
+            model=model,
+            batch=batch,
+            tokens=[
+                (token, pos, 0, False) for pos, token in enumerate(prompts_tokens[0][:n_shared]) if pos >= n_cached
+            ],
+        )
+        for seq_id in range(1, len(prompts_tokens)):
+            ctx.kv_cache_seq_cp(0, seq_id, 0, n_shared)
+        logits = _decode(
+            model=model,
+            batch=batch,
+            tokens=[
+                (token, pos, seq_id, pos == len(tokens) - 1)
+                for seq_id, tokens in enumerate(prompts_tokens)
+                for pos, token in enumerate(tokens)
+                if pos >= n_shared
+            ],
+        )
+        prompt_eval_s = time.perf_counter() - start
+        start = time.perf_counter()
+        while logits and not (cancel_event is not None and cancel_event.is_set()):
+            next_tokens = []
+            for seq_id, seq_logits in logits.items():
+                sampler = samplers[seq_id]
+                token = sampler.sample(ctx_main=ctx, logits_array=seq_logits)
+                sampler.accept(ctx_main=ctx, id=token, apply_grammar=True)
+                sampler.prev = sampler.prev[-n_prev:]
+                if token == model.token_eos():
+                    finish_reasons[seq_id] = "stop"
+                    continue
+                completions[seq_id].append(token)
+                if len(completions[seq_id]) >= max_tokens[seq_id]:
+                    finish_reasons[seq_id] = "length"
+                    continue
+                pos = len(prompts_tokens[seq_id]) + len(completions[seq_id]) - 1
+                next_tokens.append((token, pos, seq_id, True))
+            logits = _decode(model=model, batch=batch, tokens=next_tokens)
+        generation_s = time.perf_counter() - start
+    finally:
+        ctx.kv_cache_seq_rm(-1, n_shared, -1)
+        ctx.kv_cache_seq_keep(0)
+        model.input_ids[:n_shared] = prompts_tokens[0][:n_shared]
+        model.n_tokens = n_shared
+    return (
+        [
+            # Stopped by `cancel_event` otherwise, like by a stopping criteria
+            _SequenceCompletion(
+                text=model.detokenize(tokens).decode("utf-8", errors="ignore"),
+                n_tokens=len(tokens),
+                finish_reason=finish_reason or "stop",
+            )
+            for tokens, finish_reason in zip(completions, finish_reasons, strict=True)
+        ],
+        _CompletionTimings(prompt_eval_s=prompt_eval_s, generation_s=generation_s),
+    )
+
+
+def _decode(
+    model: "Llama", batch: "llama_cpp._internals._LlamaBatch", tokens: list[tuple[int, int, int, bool]]
+) -> dict:
+    """Evaluate `(token, position, sequence id, with logits)`s, `n_batch` at a time. The logits of each sequence"""
+    logits = {}
+    n_vocab = model.n_vocab()
+    for start in range(0, len(tokens), model.n_batch):
+        chunk = tokens[start : start + model.n_batch]
+        batch.batch.n_tokens = len(chunk)
+        for idx, (token, pos, seq_id, with_logits) in enumerate(chunk):
+            batch.batch.token[idx] = token
+            batch.batch.pos[idx] = pos
+            batch.batch.seq_id[idx][0] = seq_id
+            batch.batch.n_seq_id[idx] = 1
+            batch.batch.logits[idx] = with_logits
+        model._ctx.decode(batch)
+        for idx, (_, _, seq_id, with_logits) in enumerate(chunk):
+            if with_logits:
+                logits[seq_id] = np.ctypeslib.as_array(model._ctx.get_logits_ith(idx), shape=(n_vocab,)).copy()
+    return logits
+
+
+def _copy_kv_state(model: "Llama") -> bytes:
+    """Snapshot the llama.cpp context state (KV cache, RNG, last logits).
+
+    Unlike `Llama.save_state`, this skips the Python side copy of the `n_ctx * n_vocab` scores array, which is only
+    needed to sample right after the snapshotted tokens.
+    """
+    state = (ctypes.c_uint8 * llama_cpp.llama_get_state_size(model.ctx))()
+    n_bytes = llama_cpp.llama_copy_state_data(model.ctx, state)
+    return bytes(memoryview(state)[:n_bytes])
+
+
+def _set_kv_state(model: "Llama", kv_state: bytes, tokens: list[int]) -> None:
+    state = (ctypes.c_uint8 * len(kv_state)).from_buffer_copy(kv_state)
+    if llama_cpp.llama_set_state_data(model.ctx, state) != len(kv_state):
+        raise LLMError("Failed to set llama state data")
+    model.input_ids[: len(tokens)] = tokens
+    model.n_tokens = len(tokens)
+
+
+def _set_n_threads(model: "Llama", n_threads: int, n_threads_batch: int) -> None:
+    llama_cpp.llama_set_n_threads(model.ctx, n_threads, n_threads_batch)
+    model.n_threads = model.context_params.n_threads = n_threads
+    model.n_threads_batch = model.context_params.n_threads_batch = n_threads_batch
+
+
+def _reset_timings(model: "Llama") -> None:
+    llama_cpp.llama_reset_timings(model.ctx)
+
+
+def _get_timings(model: "Llama") -> _CompletionTimings:
+    """Prompt eval and generation (decoding and sampling) time since the last `_reset_timings`"""
+    timings = llama_cpp.llama_get_timings(model.ctx)
+    return _CompletionTimings(
+        prompt_eval_s=timings.t_p_eval_ms / 1000, generation_s=(timings.t_eval_ms + timings.t_sample_ms) / 1000
+    )
+
+
+def _set_completion_stats(llm_run: LLMRun, timings: _CompletionTimings) -> None:
+    llm_run.prompt_eval_s = timings.prompt_eval_s
+    llm_run.generation_s = timings.generation_s
+    usage = (llm_run.llm_outputs or {}).get("usage", {})
+    llm_run.prompt_tokens = usage.get("prompt_tokens")
+    llm_run.completion_tokens = usage.get("completion_tokens")
+    if llm_run.completion_tokens is not None and timings.generation_s > 0:
+        llm_run.tokens_per_s = llm_run.completion_tokens / timings.generation_s
+
+
+def _cancellation_kwargs(cancel_event: threading.Event | None) -> dict:
+    """Stop the generation at the next token once `cancel_event` is set"""
+    if cancel_event is None:
+        return {}
+    event = cancel_event  # bound once narrowed, for the closure
+    return {"stopping_criteria": llama_cpp.StoppingCriteriaList([lambda _input_ids, _logits: event.is_set()])}
+
+
+def pydantic_model_to_llama_grammar(model: type[BaseModel]) -> "LlamaGrammar":
     try:
-        converter = SchemaConverter({})
+        converter = llama_cpp.llama_grammar.SchemaConverter({})
         converter.visit(model.model_json_schema(), "")
-        return LlamaGrammar.from_string(grammar=converter.format_grammar(), verbose=False)
+        return llama_cpp.llama_grammar.LlamaGrammar.from_string(grammar=converter.format_grammar(), verbose=False)
     except Exception as e:
         msg = "Failed to generate LlamaGrammar"
         LOGGER.exception("%s from `%s`: %s", msg, model.__name__, e)
         raise LLMError(msg) from e
+
+
+class _LlamaGrammarCache:
+    """Compiled `LlamaGrammar`s keyed by output model and the hash of its JSON schema.
+
+    Sampling mutates the state of a `LlamaGrammar`, so a compiled grammar is never handed out directly: each thread
+    gets its own copy, initialised from the shared parsed rules, which `Llama` resets at the start of every completion.
+    """
+
+    def __init__(self) -> None:
+        self._compiled: dict[tuple[type[BaseModel], str], "LlamaGrammar"] = {}
+        self._schema_hashes: dict[type[BaseModel], str] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _key(self, model: type[BaseModel]) -> tuple[type[BaseModel], str]:
+        if (schema_hash := self._schema_hashes.get(model)) is None:
+            schema = json.dumps(model.model_json_schema(), sort_keys=True)
+            schema_hash = self._schema_hashes[model] = hashlib.sha256(schema.encode()).hexdigest()
+        return model, schema_hash
+
+    def get_compiled(self, model: type[BaseModel]) -> "LlamaGrammar":
+        key = self._key(model=model)
+        with self._lock:
+            if (grammar := self._compiled.get(key)) is None:
+                grammar = self._compiled[key] = pydantic_model_to_llama_grammar(model=model)
+        return grammar
+
+    def get(self, model: type[BaseModel]) -> "LlamaGrammar":
+        thread_grammars: dict = self._local.__dict__.setdefault("grammars", {})
+        key = self._key(model=model)
+        if (grammar := thread_grammars.get(key)) is None:
+            grammar = thread_grammars[key] = _copy_llama_grammar(grammar=self.get_compiled(model=model))
+        return grammar
+
+    def clear(self) -> None:
+        with self._lock:
+            self._compiled.clear()
+        self._local.__dict__.pop("grammars", None)
+
+
+def _copy_llama_grammar(grammar: "LlamaGrammar") -> "LlamaGrammar":
+    grammar_cls = llama_cpp.llama_grammar.LlamaGrammar
+    grammar_copy = grammar_cls.__new__(grammar_cls)
+    grammar_copy._grammar_rules = grammar._grammar_rules
+    grammar_copy._n_rules = grammar._n_rules
+    grammar_copy._start_rule_index = grammar._start_rule_index
+    grammar_copy.init()
+    return grammar_copy
+
+
+_GRAMMAR_CACHE = _LlamaGrammarCache()
+# Frees the grammars before the lazily imported llama.cpp modules are torn down, which `LlamaGrammar.__del__` needs
+atexit.register(_GRAMMAR_CACHE.clear)
+
+
+def get_llama_grammar(model: type[BaseModel]) -> "LlamaGrammar":
+    """Cached `pydantic_model_to_llama_grammar`, safe to use from the calling thread"""
+    return _GRAMMAR_CACHE.get(model=model)
+
+
+def precompile_llama_grammars(models: list[type[BaseModel]]) -> None:
+    for model in models:
+        _GRAMMAR_CACHE.get_compiled(model=model)
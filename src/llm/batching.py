@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from functools import partial
+from typing import Generic, Protocol, TypeVar
+
+from src.config import LLMBatchingConfig
+
+from . import LLMError, LLMService
+from .executor import InferenceExecutor
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+Result_co = TypeVar("Result_co", covariant=True)
+
+
+class BatchInferenceFn(Protocol[Item, Result]):
+    def __call__(self, llm: LLMService, items: list[Item], cancel_event: threading.Event, /) -> list[Result]:
+        ...
+
+
+class TextScheduler(Protocol[Result_co]):
+    """Detection of texts, e.g.: a `BatchScheduler` of texts or an `InputGuard` in front of one"""
+
+    async def submit(self, item: str, model_name: str | None = None) -> Result_co:
+        ...
+
+
+class BatchScheduler(Generic[Item, Result]):
+    """Micro-batches concurrent inference requests in front of an `InferenceExecutor`.
+
+    Items submitted within `max_wait_ms` of the first pending item, up to `max_batch_size`, are dispatched together, and
+    each caller gets back the result at its item's position. A batch is split in contiguous chunks, one per instance of
+    the model's pool, each an executor job running `batch_fn` on its own worker, which decodes the completions of its
+    chunk together (see `LLMService.run_completion_parse_model_batch`), so that no instance is left idle. With batching
+    disabled every item is dispatched on its own. Items of different models are batched separately.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        batch_fn: BatchInferenceFn[Item, Result],
+        config: LLMBatchingConfig,
+    ) -> None:
+        self.executor = executor
+        self.batch_fn = batch_fn
+        self.config = config
+        self.max_batch_size = config.max_batch_size if config.enabled else 1
+        self._pending: dict[str | None, list[tuple[Item, asyncio.Future[Result]]]] = {}
+        self._flush_handles: dict[str | None, asyncio.TimerHandle] = {}
+        self._dispatches: set[asyncio.Task] = set()
+        self.n_batches = 0
+        self.n_batched_items = 0
+
+    async def submit(self, item: Item, model_name: str | None = None) -> Result:
+        """Result of `item` with `model_name`, the default model of the executor if not given"""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Result] = loop.create_future()
+        pending = self._pending.setdefault(model_name, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(model_name)
+        elif model_name not in self._flush_handles:
+            self._flush_handles[model_name] = loop.call_later(self.config.max_wait_ms / 1000, self._flush, model_name)
+        return await future
+
+    def _flush(self, model_name: str | None = None) -> None:
+        if (flush_handle := self._flush_handles.pop(model_name, None)) is not None:
+            flush_handle.cancel()
+        batch = self._pending.pop(model_name, [])
+        if not batch:
+            return
+        self.n_batches += 1
+        self.n_batched_items += len(batch)
+        for chunk in self._split(batch=batch, model_name=model_name):
+            dispatch = asyncio.create_task(self._dispatch(batch=chunk, model_name=model_name))
+            self._dispatches.add(dispatch)
+            dispatch.add_done_callback(self._dispatches.discard)
+            for _, future in chunk:
+                future.add_done_callback(partial(self._cancel_abandoned_dispatch, batch=chunk, dispatch=dispatch))
+
+    def _split(
+        self, batch: list[tuple[Item, asyncio.Future[Result]]], model_name: str | None
+    ) -> list[list[tuple[Item, asyncio.Future[Result]]]]:
+        """Contiguous chunks of `batch`, as many as the instances of the pool of the model"""
+        try:
+            n_instances = self.executor.registry.get_pool(model_name=model_name).size
+        except LLMError:  # unknown model, reported by the executor when dispatching
+            n_instances = 1
+        chunk_size = -(-len(batch) // min(n_instances, len(batch)))
+        return [batch[start : start + chunk_size] for start in range(0, len(batch), chunk_size)]
+
+    @staticmethod
+    def _cancel_abandoned_dispatch(
+        _future: asyncio.Future, batch: list[tuple[Item, asyncio.Future[Result]]], dispatch: asyncio.Task
+    ) -> None:
+        """Cancel the batch, stopping its inference, once every caller of the batch has been cancelled"""
+        if all(future.cancelled() for _, future in batch):
+            dispatch.cancel()
+
+    async def _dispatch(self, batch: list[tuple[Item, asyncio.Future[Result]]], model_name: str | None) -> None:
+        items = [item for item, _ in batch]
+
+        def _run_batch(llm: LLMService, cancel_event: threading.Event) -> list[Result]:
+            return self.batch_fn(llm, items, cancel_event)
+
+        try:
+            results = await self.executor.run(_run_batch, model_name=model_name)
+            if len(results) != len(batch):
+                raise LLMError(f"Expected {len(batch)} batch results. Got {len(results)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result(result)
+
+    def status(self) -> dict:
+        return {
+            "pending": sum(len(pending) for pending in self._pending.values()),
+            "batches": self.n_batches,
+            "mean_batch_size": self.n_batched_items / self.n_batches if self.n_batches else 0,
+        }
@@ -0,0 +1,100 @@
+"""Calibration of the `"auto"` model configs of `src.llm.tuning` on this host: the calibration texts are detected with
+each candidate `n_threads`, `n_threads_batch` and `n_batch`, and the fastest ones are saved for the default model and
+the number of available CPUs, to be used by the hosts with as many CPUs.
+
+Usage: python -m src.llm.calibrate [--n-runs 3] [--out models/calibration.json]
+"""
+import argparse
+import statistics
+from pathlib import Path
+
+from src.config import CONFIGS, LLMConfig
+from src.logging import configure_logging, get_logger
+
+from . import LLMService
+from .detect_hate_speech import llm_detect_hate_speech
+from .tuning import CALIBRATION_FILE_PATH, DEFAULT_N_BATCH, available_cpus, write_calibration
+
+LOGGER = get_logger("LLMCalibration")
+
+# Short and long texts, so that both the prompt evaluation and the generation weigh in
+CALIBRATION_TEXTS = [
+    "Have a nice day!",
+    "We have enough problems in the world. Stop hating on each other",
+    "The new library opens next week downtown. It has a reading room for kids, a maker space with 3D printers, and a "
+    "cafe run by volunteers from the neighborhood association. Entry is free, and so are the workshops on weekends.",
+]
+
+
+def _candidates(n_cpus: int) -> list[int]:
+    return sorted({max(n_cpus * fraction // 4, 1) for fraction in range(1, 5)})
+
+
+def _time_detections(llm: LLMService, n_runs: int) -> tuple[float, float]:
+    """Median prompt evaluation and generation seconds of the calibration texts"""
+    prompt_eval_s, generation_s = [], []
+    for _ in range(n_runs):
+        llm_runs = [llm_detect_hate_speech(llm=llm, text=text) for text in CALIBRATION_TEXTS]
+        prompt_eval_s.append(sum(llm_run.prompt_eval_s or 0 for llm_run in llm_runs))
+        generation_s.append(sum(llm_run.generation_s or 0 for llm_run in llm_runs))
+    return statistics.median(prompt_eval_s), statistics.median(generation_s)
+
+
+def calibrate(llm_config: LLMConfig, n_runs: int) -> dict:
+    """Fastest `n_threads` (generation), `n_threads_batch` (prompt evaluation) and `n_batch` (both) on this host.
+
+    The threads are changed without reloading the model, only `n_batch` needs a new instance. The prompt prefix cache
+    is disabled so that every prompt is evaluated in full.
+    """
+    n_cpus = available_cpus()
+    n_ctx = llm_config.model_configs.get("n_ctx") or DEFAULT_N_BATCH
+    timings: dict[str, dict] = {}
+    best: dict[str, tuple[float, int]] = {}
+    for n_batch in sorted({min(n_batch, n_ctx) for n_batch in (128, 256, DEFAULT_N_BATCH)}):
+        llm = LLMService(
+            llm_config=llm_config.model_copy(
+                update={"model_configs": {**llm_config.model_configs, "n_batch": n_batch}, "prefix_cache": False}
+            )
+        )
+        for n_threads in _candidates(n_cpus):
+            llm.set_n_threads(n_threads=n_threads, n_threads_batch=n_threads)
+            prompt_eval_s, generation_s = _time_detections(llm=llm, n_runs=n_runs)
+            timings[f"n_batch={n_batch},n_threads={n_threads}"] = {
+                "prompt_eval_s": prompt_eval_s,
+                "generation_s": generation_s,
+            }
+            LOGGER.info(
+                "n_batch=%d, n_threads=%d: %.3fs prompt eval, %.3fs generation",
+                n_batch,
+                n_threads,
+                prompt_eval_s,
+                generation_s,
+            )
+            for key, duration_s in [("n_threads", generation_s), ("n_threads_batch", prompt_eval_s)]:
+                if key not in best or duration_s < best[key][0]:
+                    best[key] = (duration_s, n_threads)
+            if "n_batch" not in best or prompt_eval_s + generation_s < best["n_batch"][0]:
+                best["n_batch"] = (prompt_eval_s + generation_s, n_batch)
+        del llm
+    return {
+        "n_cpus": n_cpus,
+        "model_configs": {key: value for key, (_, value) in best.items()},
+        "timings": timings,
+    }
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-runs", type=int, default=3, help="runs of the calibration texts per setting")
+    parser.add_argument("--out", type=Path, default=CALIBRATION_FILE_PATH)
+    args = parser.parse_args()
+    res = calibrate(llm_config=CONFIGS.llm, n_runs=args.n_runs)
+    write_calibration(
+        model_name=CONFIGS.llm.model_name, n_cpus=res["n_cpus"], model_configs=res["model_configs"], path=args.out
+    )
+    LOGGER.info("Calibration of `%s` on %d CPUs: %s", CONFIGS.llm.model_name, res["n_cpus"], res)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,155 @@
+import threading
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Generic, TypeVar
+
+from src.config import CONFIGS, PrefilterConfig
 from src.llm import LLMRunParsedModel, LLMService
-from src.models import DetectHateSpeechResult
+from src.models import DetectHateSpeechReasoning, DetectHateSpeechResult, DetectHateSpeechVerdict, LLMRun
+
+from .batching import TextScheduler
+from .prefilter import PREFILTER_MODEL_NAME, get_prefilter
+from .prompts import (
+    HATE_SPEECH_DETECTION_PROMPT,
+    HATE_SPEECH_REASONING_PROMPT,
+    HATE_SPEECH_VERDICT_PROMPT,
+    INPUT_TEXT_KEY,
+    INPUT_VERDICT_KEY,
+)
+
+DetectionModel = TypeVar("DetectionModel", DetectHateSpeechResult, DetectHateSpeechVerdict)
+
+
+def prefilter_decision(score: float, config: PrefilterConfig) -> bool | None:
+    """Verdict of a confident pre-filter score, `None` if the text must be escalated to the LLM"""
+    if score < config.benign_below:
+        return False
+    if score > config.hateful_above:
+        return True
+    return None
+
+
+def prefilter_hate_speech(
+    text: str, output_model: type[DetectionModel], config: PrefilterConfig | None = None
+) -> LLMRunParsedModel[DetectionModel] | None:
+    """Detection by the pre-filter classifier, `None` if it is disabled or not confident enough to skip the LLM"""
+    prefilter_cfg = config or CONFIGS.prefilter
+    if (prefilter := get_prefilter(config=prefilter_cfg)) is None:
+        return None
+    start_run = datetime.now(tz=timezone.utc)
+    score = prefilter.predict_proba(text=text)
+    if (is_hate_speech := prefilter_decision(score=score, config=prefilter_cfg)) is None:
+        return None
+    result = DetectHateSpeechResult(
+        is_hate_speech=is_hate_speech,
+        target_of_hate=[],
+        reasoning=f"Hate speech probability {score:.3f} of the pre-filter classifier, not escalated to the LLM",
+    )
+    return LLMRunParsedModel[output_model](  # type: ignore[valid-type]
+        prompt=text,
+        llm_model_name=PREFILTER_MODEL_NAME,
+        success=True,
+        llm_model_configs={"model_file": prefilter_cfg.model_file},
+        run_configs={"benign_below": prefilter_cfg.benign_below, "hateful_above": prefilter_cfg.hateful_above},
+        llm_outputs={"score": score},
+        start_run=start_run,
+        end_run=datetime.now(tz=timezone.utc),
+        parsed_output=output_model.model_validate(result.model_dump()),
+    )
+
+
+def is_prefiltered(llm_run: LLMRun) -> bool:
+    """Whether `llm_run` was answered by the pre-filter. Its results are stored without a cache key: a cache key names
+    the prompt and model config of an LLM, which would serve the guess of the pre-filter as their verdict, even after
+    the pre-filter is disabled or its thresholds changed.
+    """
+    return llm_run.llm_model_name == PREFILTER_MODEL_NAME
+
 
-from .prompts import HATE_SPEECH_DETECTION_PROMPT, INPUT_TEXT_KEY
+class PrefilterCascade(Generic[DetectionModel]):
+    """Answers the texts the pre-filter scores confidently in the calling coroutine, submitting only the uncertain ones
+    to `scheduler`, so that they neither wait in the inference queue nor take a worker
+    """
 
+    def __init__(
+        self,
+        scheduler: TextScheduler[LLMRunParsedModel[DetectionModel]],
+        output_model: type[DetectionModel],
+        config: PrefilterConfig | None = None,
+    ) -> None:
+        self.scheduler: TextScheduler[LLMRunParsedModel[DetectionModel]] = scheduler
+        self.output_model: type[DetectionModel] = output_model
+        self.config = config
 
-def llm_detect_hate_speech(llm: LLMService, text: str) -> LLMRunParsedModel[DetectHateSpeechResult]:
+    async def submit(self, item: str, model_name: str | None = None) -> LLMRunParsedModel[DetectionModel]:
+        llm_run = prefilter_hate_speech(text=item, output_model=self.output_model, config=self.config)
+        if llm_run is not None:
+            return llm_run
+        return await self.scheduler.submit(item, model_name=model_name)
+
+
+def llm_detect_hate_speech(
+    llm: LLMService,
+    text: str,
+    cancel_event: threading.Event | None = None,
+    on_text: Callable[[str], None] | None = None,
+) -> LLMRunParsedModel[DetectHateSpeechResult]:
     return llm.run_completion_parse_model(
         prompt=HATE_SPEECH_DETECTION_PROMPT,
         prompt_inputs={INPUT_TEXT_KEY: text},
         output_model=DetectHateSpeechResult,
+        cancel_event=cancel_event,
+        on_text=on_text,
+    )
+
+
+def llm_detect_hate_speech_batch(
+    llm: LLMService, texts: list[str], cancel_event: threading.Event | None = None
+) -> list[LLMRunParsedModel[DetectHateSpeechResult]]:
+    return llm.run_completion_parse_model_batch(
+        prompt=HATE_SPEECH_DETECTION_PROMPT,
+        prompt_inputs_batch=[{INPUT_TEXT_KEY: text} for text in texts],
+        output_model=DetectHateSpeechResult,
+        cancel_event=cancel_event,
+    )
+
+
+def llm_detect_hate_speech_verdict(
+    llm: LLMService, text: str, cancel_event: threading.Event | None = None
+) -> LLMRunParsedModel[DetectHateSpeechVerdict]:
+    """Generate only the verdict fields, without the reasoning taking most of the tokens"""
+    return llm.run_completion_parse_model(
+        prompt=HATE_SPEECH_VERDICT_PROMPT,
+        prompt_inputs={INPUT_TEXT_KEY: text},
+        output_model=DetectHateSpeechVerdict,
+        cancel_event=cancel_event,
+        max_tokens=CONFIGS.verdict.max_tokens,
+    )
+
+
+def llm_detect_hate_speech_verdict_batch(
+    llm: LLMService, texts: list[str], cancel_event: threading.Event | None = None
+) -> list[LLMRunParsedModel[DetectHateSpeechVerdict]]:
+    return llm.run_completion_parse_model_batch(
+        prompt=HATE_SPEECH_VERDICT_PROMPT,
+        prompt_inputs_batch=[{INPUT_TEXT_KEY: text} for text in texts],
+        output_model=DetectHateSpeechVerdict,
+        cancel_event=cancel_event,
+        max_tokens=CONFIGS.verdict.max_tokens,
+    )
+
+
+def llm_explain_hate_speech(
+    llm: LLMService, text: str, verdict: DetectHateSpeechVerdict, cancel_event: threading.Event | None = None
+) -> LLMRunParsedModel[DetectHateSpeechReasoning]:
+    """Generate the reasoning of an already detected verdict"""
+    if verdict.is_hate_speech:
+        verdict_text = f"a hate speech targeting {', '.join(verdict.target_of_hate) or 'an unidentified target'}"
+    else:
+        verdict_text = "not a hate speech"
+    return llm.run_completion_parse_model(
+        prompt=HATE_SPEECH_REASONING_PROMPT,
+        prompt_inputs={INPUT_TEXT_KEY: text, INPUT_VERDICT_KEY: verdict_text},
+        output_model=DetectHateSpeechReasoning,
+        cancel_event=cancel_event,
     )
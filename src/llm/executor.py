@@ -0,0 +1,201 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import ExitStack
+from typing import Any, Protocol, TypeVar
+
+from src.config import LLMExecutorConfig
+from src.logging import get_logger
+
+from . import LLMError, LLMService
+from .registry import LLMServicePool, ModelRegistry
+
+LOGGER = get_logger("LLMExecutor")
+
+T = TypeVar("T")
+T_co = TypeVar("T_co", covariant=True)
+
+
+class InferenceFn(Protocol[T_co]):
+    def __call__(self, llm: LLMService, cancel_event: threading.Event) -> T_co:
+        ...
+
+
+class InferenceQueueFullError(LLMError):
+    def __init__(self, msg: str, retry_after_s: int) -> None:
+        super().__init__(msg)
+        self.retry_after_s = retry_after_s
+
+
+class InferenceTimeoutError(LLMError):
+    pass
+
+
+class InferenceJob:
+    def __init__(self, fn: InferenceFn) -> None:
+        self.fn = fn
+        self.future: Future = Future()
+        self.cancel_event = threading.Event()
+
+
+class _ModelWorkers:
+    """Worker threads of the executor serving one pool, with their own queue of jobs"""
+
+    def __init__(self, pool: LLMServicePool, queue_size: int) -> None:
+        self.pool = pool
+        self.queue: queue.Queue[InferenceJob | None] = queue.Queue(maxsize=queue_size)
+        self.threads: list[threading.Thread] = []
+
+
+class InferenceExecutor:
+    """Runs inference off the event loop on dedicated worker threads.
+
+    Each registered model has its own workers, started with the executor for preloaded models or on their first job
+    otherwise. Each worker owns one `LLMService` of the model pool for its lifetime, so there is one worker per pool
+    instance. Jobs wait in a bounded queue per model; submitting to a full queue fails fast with
+    `InferenceQueueFullError` instead of piling up. A job that times out or whose caller is cancelled is skipped if not
+    started yet, or stopped at the next generated token otherwise.
+    """
+
+    def __init__(self, registry: ModelRegistry, config: LLMExecutorConfig) -> None:
+        self.registry = registry
+        self.config = config
+        self._models: dict[str, _ModelWorkers] = {}
+        self._lock = threading.Lock()
+        self._n_in_flight = 0
+        self._is_shutdown = False
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(workers.queue.qsize() for workers in list(self._models.values()))
+
+    @property
+    def n_in_flight(self) -> int:
+        return self._n_in_flight
+
+    def start(self) -> None:
+        with self._lock:
+            if self._is_shutdown:
+                return
+            for model_name in self.registry.model_names:
+                pool = self.registry.get_pool(model_name=model_name)
+                if pool.llm_config.pool.preload and model_name not in self._models:
+                    self._start_workers(model_name=model_name)
+
+    def _start_workers(self, model_name: str) -> _ModelWorkers:
+        pool = self.registry.get_pool(model_name=model_name)
+        workers = _ModelWorkers(pool=pool, queue_size=self.config.queue_size)
+        for idx in range(pool.size):
+            thread = threading.Thread(
+                target=self._work, args=(workers,), name=f"inference-{model_name}-{idx}", daemon=True
+            )
+            thread.start()
+            workers.threads.append(thread)
+        self._models[model_name] = workers
+        return workers
+
+    @staticmethod
+    def _stop_workers(workers: _ModelWorkers) -> None:
+        """Let the workers finish the jobs queued so far, and wait for them to exit"""
+        for _ in workers.threads:
+            workers.queue.put(None)
+        for thread in workers.threads:
+            thread.join()
+
+    def shutdown(self) -> None:
+        """Stop accepting jobs, let the workers finish the queued ones, and wait for them to exit"""
+        with self._lock:
+            self._is_shutdown = True
+            models, self._models = self._models, {}
+        for workers in models.values():
+            self._stop_workers(workers)
+
+    def swap_workers(self, model_name: str) -> None:
+        """Serve `model_name` from its current registry pool, e.g.: after `ModelRegistry.reload`.
+
+        New jobs go to new workers right away, while the replaced workers finish the jobs they were given, then release
+        their instances of the replaced pool. Blocks until they are done.
+        """
+        with self._lock:
+            if self._is_shutdown:
+                return
+            old_workers = self._models.pop(model_name, None)
+            if old_workers is not None:
+                self._start_workers(model_name=model_name)
+        if old_workers is not None:
+            self._stop_workers(old_workers)
+
+    async def run(self, fn: InferenceFn[T], timeout: float | None = None, model_name: str | None = None) -> T:
+        """Run `fn` with a worker's `LLMService` of `model_name`, the default model if not given, and wait for the
+        result without blocking the event loop
+        """
+        job = self.submit(fn=fn, model_name=model_name)
+        return await self.wait(job=job, timeout=timeout)  # type: ignore[no-any-return]
+
+    def submit(self, fn: InferenceFn, model_name: str | None = None) -> InferenceJob:
+        """Queue `fn` without waiting for it, e.g. to fail fast before a streaming response starts"""
+        model_name = model_name or self.registry.default_model_name
+        job = InferenceJob(fn=fn)
+        # Queued under the lock, so that a job never lands behind the stop sentinels of workers being replaced by
+        # `swap_workers` or shut down, where no worker would ever pick it up
+        with self._lock:
+            if self._is_shutdown:
+                raise LLMError("Inference executor is shut down")
+            if (workers := self._models.get(model_name)) is None:
+                workers = self._start_workers(model_name=model_name)  # raises `LLMError` for unknown models
+            try:
+                workers.queue.put_nowait(job)
+            except queue.Full as e:
+                raise InferenceQueueFullError(
+                    f"Inference queue is full ({self.config.queue_size} waiting)",
+                    retry_after_s=self.config.retry_after_s,
+                ) from e
+        return job
+
+    async def wait(self, job: InferenceJob, timeout: float | None = None) -> Any:
+        timeout = self.config.request_timeout_s if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job.future), timeout=timeout)
+        except TimeoutError as e:
+            raise InferenceTimeoutError(f"Inference did not finish within {timeout}s") from e
+        finally:
+            # No-op for finished jobs. Otherwise, stop a running generation that nobody waits for anymore.
+            job.cancel_event.set()
+
+    def _work(self, workers: _ModelWorkers) -> None:
+        pool = workers.pool
+        with ExitStack() as stack:
+            llm_service: LLMService | None = None
+            load_error: Exception | None = None
+            try:
+                llm_service = stack.enter_context(pool.acquire())
+            except Exception as e:
+                LOGGER.exception("Inference worker failed to get a `%s` instance: %s", pool.model_name, e)
+                load_error = e
+
+            while (job := workers.queue.get()) is not None:
+                if job.cancel_event.is_set() or not job.future.set_running_or_notify_cancel():
+                    continue
+                if llm_service is None:
+                    job.future.set_exception(LLMError(f"Model `{pool.model_name}` is unavailable: {load_error}"))
+                    continue
+                self._run_job(llm_service=llm_service, job=job)
+
+    def _run_job(self, llm_service: LLMService, job: InferenceJob) -> None:
+        with self._lock:
+            self._n_in_flight += 1
+        try:
+            job.future.set_result(job.fn(llm=llm_service, cancel_event=job.cancel_event))
+        except Exception as e:
+            job.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._n_in_flight -= 1
+
+    def status(self) -> dict:
+        return {
+            "workers": {model_name: len(workers.threads) for model_name, workers in list(self._models.items())},
+            "queue_depth": self.queue_depth,
+            "in_flight": self.n_in_flight,
+        }
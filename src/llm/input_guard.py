@@ -0,0 +1,170 @@
+"""Token-aware limit of the texts to detect, which would otherwise fill the context of the model and hold a worker for
+long, or fail once their prompt does not fit in it.
+"""
+import asyncio
+from typing import Generic, NamedTuple
+
+from src.config import InputPolicy, LLMInputConfig
+from src.logging import get_logger
+from src.models import DetectHateSpeechResult
+
+from . import LLMError, LLMRunParsedModel, LLMService
+from .batching import TextScheduler
+from .detect_hate_speech import DetectionModel
+from .registry import ModelRegistry
+
+LOGGER = get_logger("InputGuard")
+
+# Stage durations and token counts of the runs, summed over the chunks
+_STAGE_FIELDS = ["grammar_s", "prompt_eval_s", "generation_s", "parse_s", "prompt_tokens", "completion_tokens"]
+
+
+class InputTooLongError(LLMError):
+    pass
+
+
+class GuardedText(NamedTuple):
+    texts: list[str]  # the text itself, truncated, or its chunks
+    metadata: dict  # how the text was guarded, `{}` if it is within the limit
+
+
+def chunk_spans(n_tokens: int, max_tokens: int, overlap: int) -> list[tuple[int, int]]:
+    """`[start, end)` spans of at most `max_tokens` tokens covering `n_tokens`, consecutive ones sharing `overlap`"""
+    step = max(max_tokens - overlap, 1)
+    return [(start, min(start + max_tokens, n_tokens)) for start in range(0, max(n_tokens - overlap, 1), step)]
+
+
+def guard_text(llm: LLMService, text: str, config: LLMInputConfig, policy: InputPolicy | None = None) -> GuardedText:
+    """Texts of at most `max_tokens` tokens to detect in place of `text` per `policy`, the configured one by default"""
+    policy = policy or config.policy
+    tokens = llm.tokenize_text(text)
+    if len(tokens) <= config.max_tokens:
+        return GuardedText(texts=[text], metadata={})
+    if policy == InputPolicy.REJECT:
+        raise InputTooLongError(f"Text of {len(tokens)} tokens exceeds the maximum of {config.max_tokens} tokens")
+    if policy == InputPolicy.TRUNCATE:
+        spans = [(0, config.max_tokens)]
+    else:
+        spans = chunk_spans(n_tokens=len(tokens), max_tokens=config.max_tokens, overlap=config.chunk_overlap_tokens)
+        if len(spans) > config.max_chunks:
+            raise InputTooLongError(
+                f"Text of {len(tokens)} tokens exceeds the maximum of {config.max_chunks} chunks of "
+                f"{config.max_tokens} tokens"
+            )
+    return GuardedText(
+        texts=[llm.detokenize(tokens[start:end]) for start, end in spans],
+        metadata={"policy": policy.value, "n_tokens": len(tokens), "token_spans": spans},
+    )
+
+
+def combine_detections(detections: list[DetectionModel]) -> DetectionModel:
+    """Hate speech if any chunk is, targeting the targets of the hateful chunks, with their reasoning"""
+    flagged = [(i, detection) for i, detection in enumerate(detections, start=1) if detection.is_hate_speech]
+    fields: dict = {
+        "is_hate_speech": bool(flagged),
+        "target_of_hate": list(
+            dict.fromkeys(target for _, detection in flagged for target in detection.target_of_hate)
+        ),
+    }
+    explained = flagged or list(enumerate(detections, start=1))
+    if reasonings := [
+        f"Chunk {i}/{len(detections)}: {detection.reasoning}"
+        for i, detection in explained
+        if isinstance(detection, DetectHateSpeechResult)
+    ]:
+        fields["reasoning"] = "\n\n".join(reasonings)
+    return type(detections[0]).model_validate(fields)
+
+
+def combine_chunk_runs(text: str, runs: list[LLMRunParsedModel[DetectionModel]]) -> LLMRunParsedModel[DetectionModel]:
+    """One run of `text` out of the runs of its chunks, which outputs and metadata it keeps in chunk order"""
+    first = runs[0]
+    combined = type(first)(
+        prompt=text,
+        llm_model_name=first.llm_model_name,
+        success=all(run.success and run.parsed_output is not None for run in runs),
+        llm_model_configs=first.llm_model_configs,
+        run_configs=first.run_configs,
+        llm_outputs={"chunks": [run.llm_outputs for run in runs]},
+        error="; ".join(run.error for run in runs if run.error) or None,
+        start_run=min((run.start_run for run in runs if run.start_run), default=None),
+        end_run=max((run.end_run for run in runs if run.end_run), default=None),
+        run_metadata={"chunks": [run.run_metadata for run in runs]},
+        **{
+            field: sum(values) if (values := [v for run in runs if (v := getattr(run, field)) is not None]) else None
+            for field in _STAGE_FIELDS
+        },
+    )
+    if combined.completion_tokens is not None and combined.generation_s:
+        combined.tokens_per_s = combined.completion_tokens / combined.generation_s
+    if combined.success:
+        combined.parsed_output = combine_detections([run.parsed_output for run in runs if run.parsed_output])
+    return combined
+
+
+class InputGuard(Generic[DetectionModel]):
+    """Keeps the texts submitted to `scheduler` within `max_tokens` tokens of the tokenizer of their model.
+
+    A longer text is rejected with `InputTooLongError`, truncated, or split in overlapping chunks submitted together,
+    which are then batched or run by several workers at once, and whose runs are combined in one.
+    """
+
+    def __init__(
+        self,
+        scheduler: TextScheduler[LLMRunParsedModel[DetectionModel]],
+        registry: ModelRegistry,
+        config: LLMInputConfig,
+    ) -> None:
+        self.scheduler: TextScheduler[LLMRunParsedModel[DetectionModel]] = scheduler
+        self.registry = registry
+        self.config = config
+        self.n_truncated = 0
+        self.n_chunked = 0
+        self.n_rejected = 0
+
+    async def guard(self, text: str, model_name: str | None = None, policy: InputPolicy | None = None) -> GuardedText:
+        # A token spans at least one byte, bar the leading space SentencePiece tokenizers add, so short texts are not
+        # tokenized
+        if len(text.encode("utf-8")) < self.config.max_tokens:
+            return GuardedText(texts=[text], metadata={})
+        pool = self.registry.get_pool(model_name=model_name)
+        try:
+            guarded = await asyncio.to_thread(
+                lambda: guard_text(llm=pool.tokenizer(), text=text, config=self.config, policy=policy)
+            )
+        except InputTooLongError:
+            self.n_rejected += 1
+            raise
+        if guarded.metadata:
+            if len(guarded.texts) > 1:
+                self.n_chunked += 1
+            else:
+                self.n_truncated += 1
+            LOGGER.debug("Guarded text of %d tokens: %s", guarded.metadata["n_tokens"], guarded.metadata["policy"])
+        return guarded
+
+    async def submit(self, item: str, model_name: str | None = None) -> LLMRunParsedModel[DetectionModel]:
+        guarded = await self.guard(text=item, model_name=model_name)
+        chunk_runs = [
+            asyncio.ensure_future(self.scheduler.submit(text, model_name=model_name)) for text in guarded.texts
+        ]
+        try:
+            runs: list[LLMRunParsedModel[DetectionModel]] = await asyncio.gather(*chunk_runs)
+        except BaseException:
+            # Stops the inference of the other chunks, whose results are of no use anymore
+            for chunk_run in chunk_runs:
+                chunk_run.cancel()
+            raise
+        llm_run = runs[0] if len(runs) == 1 else combine_chunk_runs(text=item, runs=runs)
+        if guarded.metadata:
+            llm_run.run_metadata["input"] = guarded.metadata
+        return llm_run
+
+    def status(self) -> dict:
+        return {
+            "policy": self.config.policy.value,
+            "max_tokens": self.config.max_tokens,
+            "truncated": self.n_truncated,
+            "chunked": self.n_chunked,
+            "rejected": self.n_rejected,
+        }
@@ -0,0 +1,133 @@
+import re
+import threading
+import zlib
+from itertools import pairwise
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from src.config import MODEL_DIR_PATH, PrefilterConfig
+from src.logging import get_logger
+
+from . import _lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    # Only needed once the pre-filter is loaded or trained, rather than on every import of the app
+    np = _lazy_import("numpy")
+
+LOGGER = get_logger("Prefilter")
+
+PREFILTER_MODEL_NAME = "hashed-ngram-prefilter"
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_CHAR_NGRAM_SIZES = (3, 4, 5)
+
+
+def _ngrams(text: str) -> set[str]:
+    words = _TOKEN_PATTERN.findall(text.lower())
+    ngrams = {f"w:{word}" for word in words}
+    ngrams.update(f"b:{first} {second}" for first, second in pairwise(words))
+    for word in words:
+        padded = f" {word} "
+        ngrams.update(
+            f"c:{padded[start : start + size]}" for size in _CHAR_NGRAM_SIZES for start in range(len(padded) - size + 1)
+        )
+    return ngrams
+
+
+class HashedNgramClassifier:
+    """Logistic regression over hashed word, word bigram, and character n-grams.
+
+    Scoring a text takes a fraction of a millisecond, so it can run in front of every LLM completion.
+    """
+
+    def __init__(self, weights: "np.ndarray", bias: float) -> None:
+        self.weights = weights
+        self.bias = bias
+        self.n_features = len(weights)
+
+    def featurize(self, text: str) -> "np.ndarray":
+        hashes = np.fromiter((zlib.crc32(ngram.encode("utf-8")) for ngram in _ngrams(text)), dtype=np.uint32)
+        features: "np.ndarray" = np.unique(hashes % np.uint32(self.n_features)).astype(np.intp)
+        return features
+
+    def predict_proba(self, text: str) -> float:
+        """Probability of `text` being hate speech"""
+        features = self.featurize(text)
+        score = self.bias
+        if len(features):
+            score += float(self.weights[features].sum()) / np.sqrt(len(features))
+        return float(1 / (1 + np.exp(-score)))
+
+    @classmethod
+    def fit(  # noqa: PLR0913
+        cls,
+        texts: list[str],
+        labels: list[bool],
+        n_features: int = 2**18,
+        n_epochs: int = 200,
+        learning_rate: float = 0.05,
+        l2: float = 1e-5,
+    ) -> "HashedNgramClassifier":
+        """Full batch Adam on the L2 regularized log loss, over binary features normalized per text"""
+        model = cls(weights=np.zeros(n_features, dtype=np.float64), bias=0.0)
+        doc_features = [model.featurize(text) for text in texts]
+        lengths = np.array([len(features) for features in doc_features])
+        indices = np.concatenate(doc_features)
+        values = np.repeat(1 / np.sqrt(np.maximum(lengths, 1)), lengths)
+        doc_ids = np.repeat(np.arange(len(texts)), lengths)
+        y = np.array(labels, dtype=np.float64)
+
+        params = np.zeros(n_features + 1)  # weights then bias
+        m, v = np.zeros_like(params), np.zeros_like(params)
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, n_epochs + 1):
+            scores = np.bincount(doc_ids, weights=params[indices] * values, minlength=len(texts)) + params[-1]
+            errors = 1 / (1 + np.exp(-scores)) - y
+            grad = np.empty_like(params)
+            grad[:-1] = np.bincount(indices, weights=errors[doc_ids] * values, minlength=n_features) / len(texts)
+            grad[:-1] += l2 * params[:-1]
+            grad[-1] = errors.mean()
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad**2
+            params -= learning_rate * (m / (1 - beta1**step)) / (np.sqrt(v / (1 - beta2**step)) + eps)
+
+        return cls(weights=params[:-1].astype(np.float32), bias=float(params[-1]))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            np.savez_compressed(f, weights=self.weights, bias=np.array(self.bias))
+
+    @classmethod
+    def load(cls, path: Path) -> "HashedNgramClassifier":
+        with np.load(path) as data:
+            return cls(weights=data["weights"], bias=float(data["bias"]))
+
+
+class _PrefilterLoader:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loaded: dict[Path, HashedNgramClassifier | None] = {}
+
+    def get(self, config: PrefilterConfig) -> HashedNgramClassifier | None:
+        if not config.enabled:
+            return None
+        path = MODEL_DIR_PATH / config.model_file
+        with self._lock:
+            if path not in self._loaded:
+                try:
+                    self._loaded[path] = HashedNgramClassifier.load(path=path)
+                except Exception as e:
+                    LOGGER.warning("Failed to load the pre-filter model, escalating every text to the LLM: %s", e)
+                    self._loaded[path] = None
+            return self._loaded[path]
+
+
+_PREFILTER_LOADER = _PrefilterLoader()
+
+
+def get_prefilter(config: PrefilterConfig) -> HashedNgramClassifier | None:
+    """Loaded once per model file, `None` if disabled or unavailable"""
+    return _PREFILTER_LOADER.get(config=config)
@@ -1,18 +1,30 @@
+import hashlib
+import re
+from functools import cached_property
+from string import Formatter
 from typing import Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from src.logging import get_logger
 
 LOGGER = get_logger(__name__)
 
 INPUT_TEXT_KEY = "text"
+INPUT_VERDICT_KEY = "verdict"
 
 
 class PromptTemplate(BaseModel):
+    model_config = ConfigDict(frozen=True, ignored_types=(cached_property,))
+
     template: str
     input_keys: list[str]
 
+    @cached_property
+    def template_id(self) -> str:
+        """Hash of the template text, a changed template gets a new id"""
+        return hashlib.sha256(self.template.encode()).hexdigest()[:16]
+
     def format_inputs(self, inputs: dict[str, Any]) -> str:
         input_keys = set(inputs.keys())
         prompt_input_keys = set(self.input_keys)
@@ -24,6 +36,28 @@ class PromptTemplate(BaseModel):
             LOGGER.exception("Failed to format prompt `%s` with `%s`: %s", self.template, inputs, e)
             raise
 
+    @property
+    def static_prefix(self) -> str:
+        """Formatted text of the template up to its first input, shared by all prompts of the template"""
+        prefix = []
+        for literal_text, field_name, _, _ in Formatter().parse(self.template):
+            prefix.append(literal_text)
+            if field_name is not None:
+                break
+        return "".join(prefix)
+
+    def parse_inputs(self, prompt: str) -> dict[str, str] | None:
+        """Inputs formatting this template to `prompt`, `None` if it is not a prompt of this template"""
+        pattern = []
+        for literal_text, field_name, _, _ in Formatter().parse(self.template):
+            pattern.append(re.escape(literal_text))
+            if field_name is not None:
+                pattern.append(f"(?P<{field_name}>.*?)")
+        if (match := re.fullmatch("".join(pattern), prompt, flags=re.DOTALL)) is None:
+            return None
+        inputs = match.groupdict()
+        return inputs if self.format_inputs(inputs) == prompt else None
+
 
 HATE_SPEECH_DETECTION_PROMPT = PromptTemplate(
     template=f"""Determine if the following text is a hate speech.
@@ -36,3 +70,32 @@ The text is enclosed in backticks:
 """,
     input_keys=[INPUT_TEXT_KEY],
 )
+
+HATE_SPEECH_VERDICT_PROMPT = PromptTemplate(
+    template=f"""Determine if the following text is a hate speech.
+Identify the target of hate if the text is a hate speech.
+
+The text is enclosed in backticks:
+```
+{{{INPUT_TEXT_KEY}}}
+```
+""",
+    input_keys=[INPUT_TEXT_KEY],
+)
+
+HATE_SPEECH_REASONING_PROMPT = PromptTemplate(
+    template=f"""Explain in step by step the reasoning of whether the following text is a hate speech.
+
+The text is enclosed in backticks:
+```
+{{{INPUT_TEXT_KEY}}}
+```
+The text was identified as {{{INPUT_VERDICT_KEY}}}.
+""",
+    input_keys=[INPUT_TEXT_KEY, INPUT_VERDICT_KEY],
+)
+
+PROMPT_TEMPLATES = {
+    prompt.template_id: prompt
+    for prompt in [HATE_SPEECH_DETECTION_PROMPT, HATE_SPEECH_VERDICT_PROMPT, HATE_SPEECH_REASONING_PROMPT]
+}
@@ -0,0 +1,211 @@
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from src.config import LLMConfig
+from src.logging import get_logger
+
+from . import LLMError, LLMService
+from .tuning import resolve_model_configs
+
+LOGGER = get_logger("LLMRegistry")
+
+
+class LLMPoolExhaustedError(LLMError):
+    pass
+
+
+# Context of a vocabulary-only instance, which has no weights to run but still gets a context
+_VOCAB_ONLY_N_CTX = 8
+
+
+class LLMServicePool:
+    """Bounded pool of loaded `LLMService` instances of a single model.
+
+    Instances are created once, either all upfront with `load` or lazily on `acquire` until the pool size is reached,
+    and are handed out to one caller at a time.
+    """
+
+    def __init__(self, llm_config: LLMConfig, factory: Callable[[LLMConfig], LLMService] = LLMService) -> None:
+        self.llm_config = llm_config
+        self.size = llm_config.pool.size
+        self._factory = factory
+        self._idle: queue.LifoQueue[LLMService] = queue.LifoQueue(maxsize=self.size)
+        self._n_created = 0
+        self._lock = threading.Lock()
+        self._tokenizer: LLMService | None = None
+        self._tokenizer_lock = threading.Lock()
+        self.load_times_s: list[float] = []
+
+    @property
+    def model_name(self) -> str:
+        return self.llm_config.model_name
+
+    @property
+    def n_loaded(self) -> int:
+        return self._n_created
+
+    @property
+    def is_ready(self) -> bool:
+        return self._n_created == self.size
+
+    def _create(self) -> LLMService | None:
+        with self._lock:
+            if self._n_created >= self.size:
+                return None
+            start = time.perf_counter()
+            service = self._factory(self.llm_config)
+            self.load_times_s.append(time.perf_counter() - start)
+            self._n_created += 1
+            self._tokenizer = self._tokenizer or service
+        LOGGER.info(
+            "Loaded `%s` instance %d/%d in %.2fs", self.model_name, self._n_created, self.size, self.load_times_s[-1]
+        )
+        return service
+
+    def load(self) -> None:
+        """Create all instances of the pool that are not created yet"""
+        while (service := self._create()) is not None:
+            self._idle.put_nowait(service)
+
+    def _checkout(self, timeout: float | None) -> LLMService:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if (service := self._create()) is not None:
+            return service
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty as e:
+            raise LLMPoolExhaustedError(f"No `{self.model_name}` instance available after {timeout}s") from e
+
+    @contextmanager
+    def acquire(self, timeout: float | None = None) -> Iterator[LLMService]:
+        """Borrow an instance, waiting up to `timeout` seconds if all instances are in use"""
+        service = self._checkout(timeout=timeout)
+        try:
+            yield service
+        finally:
+            self._idle.put_nowait(service)
+
+    def tokenizer(self) -> LLMService:
+        """An instance to tokenize with. Tokenizing only reads the vocabulary of the model, so a loaded instance is used
+        even while a worker has it checked out. Before any is loaded, only the vocabulary is, rather than checking out
+        an instance, which would wait for the workers holding them all.
+        """
+        with self._tokenizer_lock:
+            if self._tokenizer is None:
+                self._tokenizer = self._factory(self._vocab_only_config())
+        return self._tokenizer
+
+    def _vocab_only_config(self) -> LLMConfig:
+        model_configs = {
+            **self.llm_config.model_configs,
+            "vocab_only": True,
+            "n_ctx": _VOCAB_ONLY_N_CTX,
+            "n_batch": _VOCAB_ONLY_N_CTX,
+        }
+        return self.llm_config.model_copy(update={"model_configs": model_configs})
+
+    def split_n_threads(self, n_workers: int) -> None:
+        """Give the instances, loaded or not, `1 / n_workers` of their configured threads, e.g.: in each of `n_workers`
+        processes sharing the CPUs
+        """
+        model_configs = resolve_model_configs(model_name=self.model_name, model_configs=self.llm_config.model_configs)
+        cpu_count = os.cpu_count() or 1
+        # Defaults of llama.cpp
+        n_threads = max((model_configs.get("n_threads") or max(cpu_count // 2, 1)) // n_workers, 1)
+        n_threads_batch = max((model_configs.get("n_threads_batch") or cpu_count) // n_workers, 1)
+        self.llm_config = self.llm_config.model_copy(
+            update={"model_configs": {**model_configs, "n_threads": n_threads, "n_threads_batch": n_threads_batch}}
+        )
+        for service in list(self._idle.queue):
+            service.set_n_threads(n_threads=n_threads, n_threads_batch=n_threads_batch)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "size": self.size,
+            "loaded": self.n_loaded,
+            "idle": self._idle.qsize(),
+        }
+
+
+def model_llm_configs(llm_config: LLMConfig) -> list[LLMConfig]:
+    """Configs of the default model of `llm_config`, then of its additional `models` merged over the default ones"""
+    return [llm_config] + [
+        llm_config.model_copy(
+            update={
+                "model_name": model.model_name,
+                "model_configs": {**llm_config.model_configs, **model.model_configs},
+                "run_configs": {**llm_config.run_configs, **model.run_configs},
+                "pool": model.pool or llm_config.pool,
+            }
+        )
+        for model in llm_config.models
+    ]
+
+
+class ModelRegistry:
+    """Process-wide registry of the configured models, each served from its own `LLMServicePool`.
+
+    The first model is the default one. A model is reloaded by swapping in a new pool, the callers of the replaced pool
+    keeping their instances until they release them.
+    """
+
+    def __init__(self, llm_configs: list[LLMConfig], factory: Callable[[LLMConfig], LLMService] = LLMService) -> None:
+        if not llm_configs:
+            raise ValueError("Registry requires at least one model config")
+        self._factory = factory
+        self._pools = {cfg.model_name: LLMServicePool(llm_config=cfg, factory=factory) for cfg in llm_configs}
+        self.default_model_name = llm_configs[0].model_name
+
+    @property
+    def model_names(self) -> list[str]:
+        return list(self._pools)
+
+    def get_pool(self, model_name: str | None = None) -> LLMServicePool:
+        model_name = model_name or self.default_model_name
+        try:
+            return self._pools[model_name]
+        except KeyError as e:
+            raise LLMError(f"Model `{model_name}` is not registered") from e
+
+    def preload(self) -> None:
+        """Load the pools configured with `preload`"""
+        for pool in self._pools.values():
+            if pool.llm_config.pool.preload:
+                pool.load()
+
+    def reload(self, model_name: str) -> LLMServicePool:
+        """Replace the pool of `model_name` by a new one, loaded first unless the replaced one was never used, and
+        return the replaced pool. Blocks while loading, with both pools in memory.
+        """
+        old_pool = self.get_pool(model_name=model_name)
+        new_pool = LLMServicePool(llm_config=old_pool.llm_config, factory=self._factory)
+        if old_pool.n_loaded or old_pool.llm_config.pool.preload:
+            new_pool.load()
+        self._pools[model_name] = new_pool
+        LOGGER.info("Reloaded `%s`", model_name)
+        return old_pool
+
+    def split_n_threads(self, n_workers: int) -> None:
+        for pool in self._pools.values():
+            pool.split_n_threads(n_workers=n_workers)
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether every preloaded pool is fully loaded. Lazily loaded pools don't block readiness."""
+        return all(pool.is_ready for pool in self._pools.values() if pool.llm_config.pool.preload)
+
+    @contextmanager
+    def acquire(self, model_name: str | None = None, timeout: float | None = None) -> Iterator[LLMService]:
+        with self.get_pool(model_name=model_name).acquire(timeout=timeout) as service:
+            yield service
+
+    def status(self) -> dict:
+        return {name: pool.status() for name, pool in self._pools.items()}
@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from src.config import MODEL_DIR_PATH, LLMReloadConfig
+from src.logging import get_logger
+
+from .executor import InferenceExecutor
+from .registry import ModelRegistry
+
+LOGGER = get_logger("LLMReload")
+
+
+class ModelReloader:
+    """Reloads models without dropping requests: a new pool is loaded next to the running one, new jobs go to it, and
+    the replaced workers finish the jobs they were given before releasing the replaced instances.
+
+    With `watch`, a model is reloaded when its GGUF file changes, until the reload succeeds.
+    """
+
+    def __init__(self, registry: ModelRegistry, executor: InferenceExecutor, config: LLMReloadConfig) -> None:
+        self.registry = registry
+        self.executor = executor
+        self.config = config
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._mtimes: dict[str, float | None] = {}
+        self.n_reloads = 0
+        self.last_reload_at: datetime | None = None
+
+    def start(self) -> None:
+        if self.config.watch and self._task is None:
+            self._mtimes = self._model_mtimes()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def status(self) -> dict:
+        return {
+            "watching": self._task is not None,
+            "reloads": self.n_reloads,
+            "last_reload_at": self.last_reload_at.isoformat() if self.last_reload_at else None,
+        }
+
+    async def reload(self, model_name: str) -> dict:
+        """Reload `model_name`, one model at a time, and return the status of its new pool"""
+        async with self._lock:
+            await asyncio.to_thread(self.registry.reload, model_name)
+            await asyncio.to_thread(self.executor.swap_workers, model_name)
+        self.n_reloads += 1
+        self.last_reload_at = datetime.now(tz=timezone.utc)
+        return self.registry.get_pool(model_name=model_name).status()
+
+    def _model_mtimes(self) -> dict[str, float | None]:
+        return {
+            model_name: path.stat().st_mtime if (path := MODEL_DIR_PATH / model_name).exists() else None
+            for model_name in self.registry.model_names
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.interval_s)
+            for model_name, mtime in (await asyncio.to_thread(self._model_mtimes)).items():
+                if mtime is None or mtime == self._mtimes.get(model_name):
+                    continue
+                try:
+                    await self.reload(model_name)
+                except Exception as e:
+                    # Still served by the replaced pool, retried at the next check
+                    LOGGER.exception("Failed to reload `%s`: %s", model_name, e)
+                    continue
+                self._mtimes[model_name] = mtime
@@ -0,0 +1,52 @@
+import hashlib
+
+from src.config import LLMRoutingConfig
+
+from . import LLMError
+from .registry import ModelRegistry
+
+
+class ModelRoutingError(LLMError):
+    pass
+
+
+class ModelRouter:
+    """Picks the model of each request: the requested one if overrides are allowed, else one of the `split` models for
+    its percent of the texts, else the default model.
+
+    The split is sticky: a text always goes to the same model, so repeated texts keep hitting the result cache and
+    A/B comparisons see each text with a single model.
+    """
+
+    def __init__(self, registry: ModelRegistry, config: LLMRoutingConfig) -> None:
+        for model_name in config.split:
+            registry.get_pool(model_name=model_name)
+        if any(percent < 0 for percent in config.split.values()) or sum(config.split.values()) > 100:  # noqa: PLR2004
+            raise ValueError(f"Routing split percents must be positive and sum up to 100 at most. Got {config.split}")
+        self.registry = registry
+        self.config = config
+        self.n_routed: dict[str, int] = {}
+
+    def route(self, key: str, model_name: str | None = None) -> str:
+        """Model of the request of `key` (e.g.: its text), `model_name` if requested"""
+        if model_name is None:
+            model_name = self._split(key=key)
+        elif not self.config.allow_override:
+            raise ModelRoutingError("Choosing the model is not allowed")
+        elif model_name not in self.registry.model_names:
+            raise ModelRoutingError(
+                f"Model `{model_name}` is not registered. Choose one of {self.registry.model_names}"
+            )
+        self.n_routed[model_name] = self.n_routed.get(model_name, 0) + 1
+        return model_name
+
+    def _split(self, key: str) -> str:
+        percentile = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big") % 10_000 / 100
+        for model_name, percent in self.config.split.items():
+            if percentile < percent:
+                return model_name
+            percentile -= percent
+        return self.registry.default_model_name
+
+    def status(self) -> dict:
+        return {"default": self.registry.default_model_name, "split": self.config.split, "routed": dict(self.n_routed)}
@@ -0,0 +1,87 @@
+"""Sizing of the llama.cpp threads and batch from the CPUs available to the process.
+
+`"auto"` values of `n_threads`, `n_threads_batch` and `n_batch` in `[default.llm.model_configs]` are resolved when a
+model is loaded: from the calibration of the model on hosts with as many CPUs (see `src.llm.calibrate`) if any, from
+the CPUs otherwise.
+"""
+import json
+import math
+import os
+from pathlib import Path
+
+from src.config import MODEL_DIR_PATH
+
+AUTO = "auto"
+TUNED_MODEL_CONFIGS = ("n_threads", "n_threads_batch", "n_batch")
+CALIBRATION_FILE_PATH = MODEL_DIR_PATH / "calibration.json"
+
+_CGROUP_V2_CPU_MAX_PATH = Path("/sys/fs/cgroup/cpu.max")
+_CGROUP_V1_CPU_PATH = Path("/sys/fs/cgroup/cpu")
+_SMT_ACTIVE_PATH = Path("/sys/devices/system/cpu/smt/active")
+DEFAULT_N_BATCH = 512
+
+
+def _cgroup_cpu_quota() -> float | None:
+    """CPUs of the cgroup quota of the process, `None` without quota"""
+    try:
+        if _CGROUP_V2_CPU_MAX_PATH.exists():
+            quota, period = _CGROUP_V2_CPU_MAX_PATH.read_text().split()
+        else:
+            quota = (_CGROUP_V1_CPU_PATH / "cpu.cfs_quota_us").read_text().strip()
+            period = (_CGROUP_V1_CPU_PATH / "cpu.cfs_period_us").read_text().strip()
+    except (OSError, ValueError):
+        return None
+    if quota in ("max", "-1"):
+        return None
+    return int(quota) / int(period)
+
+
+def available_cpus() -> int:
+    """CPUs the process may run on, within its cgroup quota"""
+    n_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    if (quota := _cgroup_cpu_quota()) is not None:
+        n_cpus = min(n_cpus, math.ceil(quota))
+    return max(n_cpus, 1)
+
+
+def _is_smt_active() -> bool:
+    try:
+        return _SMT_ACTIVE_PATH.read_text().strip() == "1"
+    except OSError:
+        return False
+
+
+def heuristic_model_configs(n_cpus: int, n_ctx: int) -> dict:
+    """The generation is bound by the memory bandwidth, so it gets one thread per physical core, while the prompt
+    evaluation is bound by the compute, so it gets every CPU
+    """
+    return {
+        "n_threads": max(n_cpus // 2 if _is_smt_active() else n_cpus, 1),
+        "n_threads_batch": n_cpus,
+        "n_batch": min(DEFAULT_N_BATCH, n_ctx),
+    }
+
+
+def read_calibration(model_name: str, n_cpus: int, path: Path = CALIBRATION_FILE_PATH) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text()).get(model_name, {}).get(str(n_cpus), {})  # type: ignore[no-any-return]
+
+
+def resolve_model_configs(model_name: str, model_configs: dict) -> dict:
+    """`model_configs` with their `"auto"` values resolved"""
+    auto_keys = [key for key in TUNED_MODEL_CONFIGS if model_configs.get(key) == AUTO]
+    if not auto_keys:
+        return model_configs
+    n_cpus = available_cpus()
+    tuned = {
+        **heuristic_model_configs(n_cpus=n_cpus, n_ctx=model_configs.get("n_ctx") or DEFAULT_N_BATCH),
+        **read_calibration(model_name=model_name, n_cpus=n_cpus),
+    }
+    return {**model_configs, **{key: tuned[key] for key in auto_keys}}
+
+
+def write_calibration(model_name: str, n_cpus: int, model_configs: dict, path: Path = CALIBRATION_FILE_PATH) -> None:
+    calibrations = json.loads(path.read_text()) if path.exists() else {}
+    calibrations.setdefault(model_name, {})[str(n_cpus)] = model_configs
+    path.write_text(json.dumps(calibrations, indent=2) + "\n")
@@ -0,0 +1,238 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Recording is a dict lookup and an addition under a lock. Values that already live somewhere (queue depth, pool and
+cache stats) are not recorded at all: they are registered as callbacks, read only when `/metrics` is scraped.
+"""
+import bisect
+import math
+import threading
+from collections.abc import Callable, Sequence
+from datetime import datetime
+
+from src.logging import get_logger
+from src.models import LLMRun
+
+LOGGER = get_logger("Metrics")
+
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4"  # the charset is added by the response
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelValues = tuple[str, ...]
+
+# Stages observed when the LLM run ends, the queue wait and persistence are observed by their callers
+_LLM_RUN_STAGES = ("prompt_eval", "generation")
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name=name, documentation=documentation, label_names=label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, value: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS_S,
+    ) -> None:
+        super().__init__(name=name, documentation=documentation, label_names=label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket (non cumulative, the last one is +Inf), then sum
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if (series := self._values.get(label_values)) is None:
+                series = self._values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][idx] += 1
+            series[1][0] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._values.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for upper_bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, extra=f'le="{_format_value(upper_bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose values are read from `fn`, `{label values: value}`, when rendered"""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        documentation: str,
+        fn: Callable[[], dict[LabelValues, float]],
+        label_names: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name=name, documentation=documentation, label_names=label_names)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        try:
+            values = self.fn()
+        except Exception as e:
+            LOGGER.warning("Failed to read metric `%s`: %s", self.name, e)
+            return []
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        """Add `metric`, replacing the one with the same name if any (e.g.: callbacks of a new app instance)"""
+        self._metrics[metric.name] = metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name=name, documentation=documentation, label_names=label_names)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS_S,
+    ) -> Histogram:
+        metric = Histogram(name=name, documentation=documentation, label_names=label_names, buckets=buckets)
+        self.register(metric)
+        return metric
+
+    def callback(  # noqa: PLR0913
+        self,
+        name: str,
+        documentation: str,
+        fn: Callable[[], dict[LabelValues, float]],
+        label_names: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> CallbackMetric:
+        metric = CallbackMetric(name=name, documentation=documentation, fn=fn, label_names=label_names, kind=kind)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+HTTP_REQUESTS = METRICS.counter("http_requests_total", "HTTP requests", ["method", "path", "status"])
+HTTP_REQUEST_DURATION = METRICS.histogram(
+    "http_request_duration_seconds", "Time until the response (headers for streamed ones) of HTTP requests", ["path"]
+)
+LLM_STAGE_DURATION = METRICS.histogram("llm_stage_duration_seconds", "Duration of the stages of LLM runs", ["stage"])
+LLM_RUNS = METRICS.counter("llm_runs_total", "LLM runs", ["model", "status"])
+LLM_TOKENS = METRICS.counter("llm_tokens_total", "Prompt and completion tokens of LLM runs", ["model", "kind"])
+LLM_GENERATION_SECONDS = METRICS.counter(
+    "llm_generation_seconds_total", "Time spent generating the completion tokens, for the tokens/s rate", ["model"]
+)
+LLM_ERRORS = METRICS.counter("llm_errors_total", "LLM errors, raised or ending an LLM run", ["type"])
+MODEL_LOADS = METRICS.counter("llm_model_loads_total", "Loaded model instances", ["model"])
+
+
+def record_llm_run(llm_run: LLMRun) -> None:
+    """Count an ended LLM run and observe the durations of its stages set so far"""
+    LLM_RUNS.inc(llm_run.llm_model_name, "success" if llm_run.success else "failure")
+    for stage in _LLM_RUN_STAGES:
+        if (duration_s := getattr(llm_run, f"{stage}_s")) is not None:
+            LLM_STAGE_DURATION.observe(duration_s, stage)
+    if llm_run.prompt_tokens is not None:
+        LLM_TOKENS.inc(llm_run.llm_model_name, "prompt", value=llm_run.prompt_tokens)
+    if llm_run.completion_tokens is not None:
+        LLM_TOKENS.inc(llm_run.llm_model_name, "completion", value=llm_run.completion_tokens)
+    if llm_run.generation_s is not None:
+        LLM_GENERATION_SECONDS.inc(llm_run.llm_model_name, value=llm_run.generation_s)
+
+
+def record_llm_stage(stage: str, duration_s: float) -> None:
+    LLM_STAGE_DURATION.observe(duration_s, stage)
+
+
+def record_queue_wait(llm_run: LLMRun, submitted_at: datetime) -> None:
+    """Set and observe the wait of `llm_run` for a worker since it was submitted at `submitted_at`"""
+    if llm_run.start_run is not None:
+        # The grammar is fetched before the run starts
+        llm_run.queue_wait_s = max((llm_run.start_run - submitted_at).total_seconds() - (llm_run.grammar_s or 0), 0)
+        record_llm_stage(stage="queue_wait", duration_s=llm_run.queue_wait_s)
+
+
+def record_llm_error(error: Exception) -> None:
+    LLM_ERRORS.inc(type(error).__name__)
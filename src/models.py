@@ -1,8 +1,11 @@
 import uuid as uuid_pkg
+from datetime import datetime, timezone
+from enum import Enum
 
 from pydantic import AwareDatetime, BaseModel
-from sqlalchemy import text
-from sqlmodel import ARRAY, JSON, Column, DateTime, Field, SQLModel, String
+from sqlalchemy import Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import ARRAY, Column, DateTime, Field, SQLModel, String
 
 
 class BaseSQLModel(SQLModel):
@@ -19,40 +22,148 @@ class UUIDModelMixin(BaseSQLModel):
     )
 
 
+class TimePartitionedModelMixin(BaseSQLModel):
+    """Rows of a table range-partitioned by `created_at` (see `src.partitions`), which is thus in its primary key.
+    `uuid` alone identifies the rows for the ORM, e.g.: in `session.get`."""
+
+    __mapper_args__ = {"primary_key": ["uuid"]}  # noqa: RUF012
+
+    uuid: uuid_pkg.UUID = Field(
+        default_factory=uuid_pkg.uuid4,
+        primary_key=True,
+        nullable=False,
+        sa_column_kwargs={"server_default": text("gen_random_uuid()")},
+    )
+    created_at: AwareDatetime = Field(  # type: ignore[call-overload]  # `sa_type` is an instance for the time zone
+        default_factory=lambda: datetime.now(tz=timezone.utc),
+        primary_key=True,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": text("now()")},
+    )
+
+
 class LLMRun(BaseModel):
-    prompt: str
+    # Only missing from the compact runs stored by `LLMRunSQLModel`
+    prompt: str | None
+    prompt_template_id: str | None = None
+    prompt_inputs: dict | None = None
     llm_model_name: str
     success: bool
-    llm_model_configs: dict
-    run_configs: dict
+    llm_model_configs: dict | None
+    run_configs: dict | None
     llm_outputs: dict | None = None
     error: str | None = None
     start_run: AwareDatetime | None = None
     end_run: AwareDatetime | None = None
+    run_metadata: dict = {}
+    # Durations of the stages of the run, in seconds. Persisting the run is only timed in the metrics, as the run is
+    # written before that stage ends.
+    queue_wait_s: float | None = None
+    grammar_s: float | None = None
+    prompt_eval_s: float | None = None
+    generation_s: float | None = None
+    parse_s: float | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    tokens_per_s: float | None = None  # generated
+
 
+class LLMConfigSQLModel(BaseSQLModel, table=True):
+    """Model or run configs shared by many LLM runs, stored once"""
 
-class LLMRunSQLModel(UUIDModelMixin, LLMRun, table=True):
+    __tablename__ = "llm_config"
+
+    config_hash: str = Field(primary_key=True)
+    configs: dict = Field(sa_column=Column(JSONB, nullable=False))
+
+
+class LLMRunSQLModel(TimePartitionedModelMixin, LLMRun, table=True):
     __tablename__ = "llm_run"
+    __table_args__ = (
+        Index("ix_llm_run_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    llm_model_configs: dict = Field(sa_column=Column(JSON), default_factory=dict)
-    run_configs: dict = Field(sa_column=Column(JSON), default_factory=dict)
-    llm_outputs: dict = Field(sa_column=Column(JSON), default_factory=dict)
+    # Compact runs (see `src.persistence.compact_llm_run`) have no prompt nor configs, but the template and inputs of
+    # the prompt, and the hashes of their configs
+    prompt: str | None = None
+    prompt_inputs: dict | None = Field(sa_column=Column(JSONB(none_as_null=True)))
+    llm_model_configs: dict | None = Field(sa_column=Column(JSONB(none_as_null=True)), default_factory=dict)
+    run_configs: dict | None = Field(sa_column=Column(JSONB(none_as_null=True)), default_factory=dict)
+    llm_model_config_hash: str | None = Field(
+        default=None, foreign_key=f"{LLMConfigSQLModel.__tablename__}.config_hash"
+    )
+    run_config_hash: str | None = Field(default=None, foreign_key=f"{LLMConfigSQLModel.__tablename__}.config_hash")
+    llm_outputs: dict = Field(sa_column=Column(JSONB), default_factory=dict)
+    run_metadata: dict = Field(sa_column=Column(JSONB), default_factory=dict)
     start_run: AwareDatetime | None = Field(sa_column=Column(DateTime(timezone=True)))
     end_run: AwareDatetime | None = Field(sa_column=Column(DateTime(timezone=True)))
 
 
-class DetectHateSpeechResult(BaseModel):
+class DetectHateSpeechVerdict(BaseModel):
     is_hate_speech: bool
     target_of_hate: list[str]
+
+
+class DetectHateSpeechReasoning(BaseModel):
     reasoning: str
 
 
-class DetectHateSpeech(DetectHateSpeechResult):
+class DetectHateSpeechResult(DetectHateSpeechVerdict):
+    reasoning: str
+
+
+class DetectHateSpeech(DetectHateSpeechVerdict):
+    reasoning: str | None = None  # Not generated for verdict-only detections
     text: str
 
 
-class DetectHateSpeechSQLModel(UUIDModelMixin, DetectHateSpeech, table=True):
+class DetectHateSpeechSQLModel(TimePartitionedModelMixin, DetectHateSpeech, table=True):
     __tablename__ = "detect_hate_speech_result"
+    __table_args__ = (
+        Index("ix_detect_hate_speech_result_created_at", "created_at"),
+        Index("ix_detect_hate_speech_result_is_hate_speech_created_at", "is_hate_speech", "created_at"),
+        Index("ix_detect_hate_speech_result_target_of_hate", "target_of_hate", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     target_of_hate: list[str] = Field(sa_column=Column(ARRAY(String)))
-    llm_run_id: uuid_pkg.UUID = Field(foreign_key=f"{LLMRunSQLModel.__tablename__}.uuid")
+    # Not a foreign key, unsupported on the `uuid` of a partitioned table, as dropping its partitions would
+    llm_run_id: uuid_pkg.UUID = Field(index=True)
+    cache_key: str | None = Field(default=None, index=True)
+
+
+class DetectionJobSQLModel(UUIDModelMixin, table=True):
+    __tablename__ = "detection_job"
+
+    source: str
+    n_items: int
+    created_at: AwareDatetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    started_at: AwareDatetime | None = Field(sa_column=Column(DateTime(timezone=True)))
+
+
+class JobItemStatus(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class DetectionJobItemSQLModel(UUIDModelMixin, table=True):
+    __tablename__ = "detection_job_item"
+    __table_args__ = (
+        Index("ix_detection_job_item_job_id_status", "job_id", "status"),
+        Index("ix_detection_job_item_status_position", "status", "position"),
+    )
+
+    job_id: uuid_pkg.UUID = Field(foreign_key=f"{DetectionJobSQLModel.__tablename__}.uuid")
+    position: int
+    text: str | None = None
+    cache_key: str | None = None
+    status: JobItemStatus = Field(default=JobItemStatus.PENDING, sa_column=Column(String, nullable=False))
+    attempts: int = 0
+    error: str | None = None
+    result_id: uuid_pkg.UUID | None = None  # in the partitioned `detect_hate_speech_result`, not a foreign key
+    claimed_at: AwareDatetime | None = Field(sa_column=Column(DateTime(timezone=True)))
+    finished_at: AwareDatetime | None = Field(sa_column=Column(DateTime(timezone=True)))
@@ -0,0 +1,186 @@
+"""Monthly range partitions of the tables of `TimePartitionedModelMixin` models, keyed on `created_at`.
+
+Partitions are created ahead of time, rows outside of them go to the default partition of the table until the partition
+of their month is created. With a retention, partitions of months entirely older than it are detached and dropped,
+which is instantaneous compared to `DELETE`s.
+
+Usage: python -m src.partitions  # run the maintenance once, e.g.: from a cron job instead of the app
+"""
+import asyncio
+import re
+from collections.abc import Callable
+from contextlib import suppress
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import CONFIGS, PartitionsConfig
+from src.db import async_session_factory, dispose_async_engine, init_async_engine
+from src.logging import configure_logging, get_logger
+from src.models import DetectHateSpeechSQLModel, LLMRunSQLModel
+
+LOGGER = get_logger("Partitions")
+
+PARTITIONED_TABLES = (LLMRunSQLModel.__tablename__, DetectHateSpeechSQLModel.__tablename__)
+
+# Partitions are tables of the database, not of the models, see `migrations/env.py`
+PARTITION_NAME_PATTERN = re.compile(
+    rf"^(?P<table>{'|'.join(PARTITIONED_TABLES)})_(p(?P<year>\d{{4}})_(?P<month>\d{{2}})|default)$"
+)
+
+# Serializes the maintenance of the app replicas
+_ADVISORY_LOCK_ID = 7_019_001
+
+
+def add_months(month: date, n_months: int) -> date:
+    n = month.year * 12 + month.month - 1 + n_months
+    return date(n // 12, n % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> date | None:
+    """First day of the month of the partition named `name`, `None` for default partitions and other tables"""
+    if (match := PARTITION_NAME_PATTERN.match(name)) is None or match["year"] is None:
+        return None
+    return date(int(match["year"]), int(match["month"]), 1)
+
+
+def create_partition_sql(table: str, month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+async def create_month_partition(session: AsyncSession, table: str, month: date, has_default: bool = True) -> None:
+    """Create the partition of `month` of `table`, moving the rows of that month out of the default partition.
+
+    Postgres refuses to create a partition for rows which the default partition holds (e.g.: written with a skewed
+    clock, or while the maintenance was down), so the default partition is detached while they are moved.
+    """
+    default = default_partition_name(table)
+    in_month = f"created_at >= '{month.isoformat()}' AND created_at < '{add_months(month, 1).isoformat()}'"
+    count_sql = f"SELECT count(*) FROM {default} WHERE {in_month}"  # noqa: S608
+    n_rows = (await session.execute(text(count_sql))).scalar() if has_default else 0
+    if not n_rows:
+        await session.execute(text(create_partition_sql(table, month)))
+        return
+    await session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    await session.execute(text(create_partition_sql(table, month)))
+    await session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) "  # noqa: S608
+            f"INSERT INTO {table} SELECT * FROM moved"
+        )
+    )
+    await session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    LOGGER.info("Moved %s rows of %s from %s to %s", n_rows, month, default, partition_name(table, month))
+
+
+def expired_partitions(names: list[str], retention_months: int, today: date) -> list[str]:
+    """Partitions of months entirely older than `retention_months` before `today`"""
+    oldest_kept = add_months(today.replace(day=1), -retention_months)
+    return sorted(name for name in names if (month := partition_month(name)) is not None and month < oldest_kept)
+
+
+async def list_partitions(session: AsyncSession, table: str) -> list[str]:
+    rows = await session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    )
+    return list(rows.scalars())
+
+
+async def maintain_partitions(session: AsyncSession, config: PartitionsConfig, today: date | None = None) -> dict:
+    """Create the partitions of the current and next `premake_months` months, and drop the expired ones"""
+    today = today or datetime.now(tz=timezone.utc).date()
+    await session.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": _ADVISORY_LOCK_ID})
+    created, dropped = [], []
+    for table in PARTITIONED_TABLES:
+        partitions = await list_partitions(session=session, table=table)
+        for n_months in range(config.premake_months + 1):
+            month = add_months(today.replace(day=1), n_months)
+            if (name := partition_name(table, month)) not in partitions:
+                await create_month_partition(
+                    session=session, table=table, month=month, has_default=default_partition_name(table) in partitions
+                )
+                created.append(name)
+        if config.retention_months:
+            for name in expired_partitions(partitions, retention_months=config.retention_months, today=today):
+                await session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                await session.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    await session.commit()
+    if created or dropped:
+        LOGGER.info("Created partitions %s, dropped partitions %s", created, dropped)
+    return {"created": created, "dropped": dropped}
+
+
+class PartitionMaintainer:
+    """Runs `maintain_partitions` every `interval_s` in the background"""
+
+    def __init__(self, session_factory: Callable[[], AsyncSession], config: PartitionsConfig) -> None:
+        self.session_factory = session_factory
+        self.config = config
+        self._task: asyncio.Task | None = None
+        self.n_dropped = 0
+        self.last_run_at: datetime | None = None
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "dropped": self.n_dropped,
+        }
+
+    async def run_once(self) -> dict:
+        async with self.session_factory() as session:
+            res = await maintain_partitions(session=session, config=self.config)
+        self.n_dropped += len(res["dropped"])
+        self.last_run_at = datetime.now(tz=timezone.utc)
+        return res
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                LOGGER.exception("Partition maintenance failed: %s", e)
+            await asyncio.sleep(self.config.interval_s)
+
+
+async def _maintain_once() -> dict:
+    init_async_engine()
+    try:
+        return await PartitionMaintainer(session_factory=async_session_factory, config=CONFIGS.partitions).run_once()
+    finally:
+        await dispose_async_engine()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    LOGGER.info("Partition maintenance: %s", asyncio.run(_maintain_once()))
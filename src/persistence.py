@@ -0,0 +1,206 @@
+import asyncio
+import contextlib
+import hashlib
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel
+
+from src.config import CONFIGS, PersistenceConfig
+from src.db import json_skip_non_serializable_serializer
+from src.llm.prompts import PROMPT_TEMPLATES
+from src.logging import get_logger
+from src.models import LLMConfigSQLModel, LLMRun, LLMRunSQLModel
+
+LOGGER = get_logger("DetectionPersister")
+
+# Configs of an LLM run, with the column of the hash referencing them in compact runs
+_LLM_RUN_CONFIG_FIELDS = {"llm_model_configs": "llm_model_config_hash", "run_configs": "run_config_hash"}
+
+
+def config_hash(configs: dict) -> str:
+    return hashlib.sha256(json_skip_non_serializable_serializer(configs, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def compact_llm_run(llm_run_sql: LLMRunSQLModel) -> list[LLMConfigSQLModel]:
+    """Replace the configs of `llm_run_sql` by their hashes, returning their rows, and drop its prompt if it can be
+    rendered from its template and inputs"""
+    config_rows = []
+    for configs_field, hash_field in _LLM_RUN_CONFIG_FIELDS.items():
+        if (configs := getattr(llm_run_sql, configs_field)) is None:
+            continue
+        config_row = LLMConfigSQLModel(config_hash=config_hash(configs), configs=configs)
+        setattr(llm_run_sql, hash_field, config_row.config_hash)
+        setattr(llm_run_sql, configs_field, None)
+        config_rows.append(config_row)
+    prompt = PROMPT_TEMPLATES.get(llm_run_sql.prompt_template_id or "")
+    if prompt is None or llm_run_sql.prompt_inputs is None or llm_run_sql.prompt is None:
+        return config_rows
+    if prompt.format_inputs(llm_run_sql.prompt_inputs) == llm_run_sql.prompt:
+        llm_run_sql.prompt = None
+    return config_rows
+
+
+async def add_rows(session: AsyncSession, rows: Sequence[SQLModel], compact: bool | None = None) -> None:
+    """Add `rows` to `session`, with their LLM runs compacted if `compact` (as configured if not given), inserting their
+    configs not stored yet
+    """
+    if compact is None:
+        compact = CONFIGS.persistence.compact_llm_runs
+    config_rows: dict[str, LLMConfigSQLModel] = {}
+    for row in rows:
+        if not isinstance(row, LLMRunSQLModel):
+            continue
+        if compact:
+            config_rows.update({config_row.config_hash: config_row for config_row in compact_llm_run(row)})
+        else:
+            row.prompt_inputs = None  # already rendered in the prompt
+    if config_rows:
+        await session.execute(
+            insert(LLMConfigSQLModel)
+            .values([config_row.model_dump() for config_row in config_rows.values()])
+            .on_conflict_do_nothing()
+        )
+    session.add_all(rows)
+
+
+async def expand_llm_run(session: AsyncSession, llm_run_sql: LLMRunSQLModel) -> LLMRun:
+    """`llm_run_sql` with its prompt and configs, whether it is compact or not"""
+    fields = llm_run_sql.model_dump()
+    for configs_field, hash_field in _LLM_RUN_CONFIG_FIELDS.items():
+        if fields[configs_field] is None:
+            config_row = await session.get(LLMConfigSQLModel, fields[hash_field])
+            fields[configs_field] = config_row.configs if config_row else {}
+    if fields["prompt"] is None:
+        prompt = PROMPT_TEMPLATES[fields["prompt_template_id"]]
+        fields["prompt"] = prompt.format_inputs(fields["prompt_inputs"])
+    return LLMRun.model_validate(fields)
+
+
+@dataclass
+class _BufferedRows:
+    rows: list[SQLModel]
+    written: asyncio.Future[None] | None = None
+    attempts: int = 0
+
+
+class DetectionPersister:
+    """Writes the rows of a detection (its LLM run, then its result if any) in a single transaction.
+
+    The primary keys are generated client-side, so nothing is read back after the insert. With `write_behind`, rows of
+    many detections are buffered and written together, in one transaction of multi-row `INSERT`s per table, every
+    `flush_interval_ms` or as soon as `max_batch_rows` are buffered:
+    - by default, `save` returns once the rows are buffered, so rows of the last flush interval are lost if the process
+      crashes before they are written;
+    - with `wait_for_flush`, `save` returns once the rows are committed, as durable as without write-behind but with a
+      single commit for all the detections of a flush.
+    A failed write puts the rows back in the buffer for the next flush, and drops them, counted in `dropped_rows`, once
+    written in `max_write_attempts` failed flushes. `stop` waits for the flush in progress and writes the buffer.
+    Independently, `synchronous_commit = false` makes Postgres acknowledge commits before they reach the disk: a crash
+    of the database server (not of the app) can lose the last few hundred milliseconds of commits, never corrupting
+    data.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession], config: PersistenceConfig) -> None:
+        self.session_factory = session_factory
+        self.config = config
+        self._buffer: list[_BufferedRows] = []
+        self._n_buffered_rows = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.n_flushes = 0
+        self.n_written_rows = 0
+        self.n_dropped_rows = 0
+
+    def start(self) -> None:
+        if self.config.write_behind and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Not cancelled, which would interrupt a flush: the task exits once its flush in progress, if any, is done
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task, self._stopping = None, False
+        await self.flush()
+        while self._buffer:  # rows of failed writes, until written or dropped
+            await asyncio.sleep(self.config.flush_interval_ms / 1000)
+            await self.flush()
+
+    def status(self) -> dict:
+        return {
+            "write_behind": self._task is not None,
+            "buffered_rows": self._n_buffered_rows,
+            "flushes": self.n_flushes,
+            "written_rows": self.n_written_rows,
+            "dropped_rows": self.n_dropped_rows,
+        }
+
+    async def save(self, rows: list[SQLModel]) -> None:
+        if self._task is None:
+            await self._write(rows)
+            self.n_written_rows += len(rows)
+            return
+        if self._n_buffered_rows >= self.config.max_buffered_rows:
+            await self.flush()
+        written: asyncio.Future[None] | None = None
+        if self.config.wait_for_flush:
+            written = asyncio.get_running_loop().create_future()
+        self._buffer.append(_BufferedRows(rows=rows, written=written))
+        self._n_buffered_rows += len(rows)
+        if self._n_buffered_rows >= self.config.max_batch_rows:
+            self._wakeup.set()
+        if written is not None:
+            await written
+
+    async def flush(self) -> None:
+        batch, self._buffer, self._n_buffered_rows = self._buffer, [], 0
+        if not batch:
+            return
+        rows = [row for buffered in batch for row in buffered.rows]
+        try:
+            await self._write(rows)
+        except asyncio.CancelledError:
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            LOGGER.exception("Failed to write %s buffered rows: %s", len(rows), e)
+            for buffered in batch:
+                buffered.attempts += 1
+            self._requeue([buffered for buffered in batch if buffered.attempts < self.config.max_write_attempts])
+            for buffered in batch:
+                if buffered.attempts >= self.config.max_write_attempts:
+                    self.n_dropped_rows += len(buffered.rows)
+                    if buffered.written is not None and not buffered.written.done():
+                        buffered.written.set_exception(e)
+            return
+        self.n_flushes += 1
+        self.n_written_rows += len(rows)
+        for buffered in batch:
+            if buffered.written is not None and not buffered.written.done():
+                buffered.written.set_result(None)
+
+    def _requeue(self, batch: list[_BufferedRows]) -> None:
+        """Put rows that were not written back in front of the buffer, to be written first by the next flush"""
+        self._buffer[:0] = batch
+        self._n_buffered_rows += sum(len(buffered.rows) for buffered in batch)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config.flush_interval_ms / 1000)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write(self, rows: list[SQLModel]) -> None:
+        async with self.session_factory() as session:
+            if not self.config.synchronous_commit:
+                await session.execute(text("SET LOCAL synchronous_commit TO OFF"))
+            # The unit of work inserts the runs before the results referencing them, batching the rows of each table
+            await add_rows(session=session, rows=rows, compact=self.config.compact_llm_runs)
+            await session.commit()
@@ -0,0 +1,96 @@
+"""Multi-process serving, with the models loaded once in the parent process before forking the workers.
+
+With `use_mmap` (the llama.cpp default), the weights are read-only mappings of the GGUF file, shared by every process
+through the page cache. The rest of the memory allocated while loading is shared copy-on-write after the fork, and
+`use_mlock` keeps the weights in RAM. The workers accept connections on the socket bound by the parent, which restarts
+the ones that exit, without reloading the models.
+"""
+import os
+import signal
+import socket
+import time
+from types import FrameType
+
+import uvicorn
+from fastapi import FastAPI
+
+from src.config import UvicornConfig, WorkersConfig
+from src.llm.registry import ModelRegistry
+from src.logging import get_logger
+
+LOGGER = get_logger("Prefork")
+
+_RESTART_DELAY_S = 1
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    def __init__(
+        self, app: FastAPI, registry: ModelRegistry, uvicorn_config: UvicornConfig, config: WorkersConfig
+    ) -> None:
+        self.app = app
+        self.registry = registry
+        self.uvicorn_config = uvicorn_config
+        self.config = config
+        self._workers: dict[int, int] = {}  # index per pid
+        self._is_stopping = False
+
+    def run(self) -> None:
+        sock = bind_socket(host=self.uvicorn_config.host, port=self.uvicorn_config.port)
+        start = time.perf_counter()
+        # Before any thread is started, which the fork would not copy
+        self.registry.preload()
+        LOGGER.info("Loaded the models in %.2fs, forking %d workers", time.perf_counter() - start, self.config.count)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for idx in range(self.config.count):
+            self._fork(idx=idx, sock=sock)
+        while self._workers:
+            try:
+                pid, wait_status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self._workers:
+                continue
+            idx = self._workers.pop(pid)
+            if self._is_stopping:
+                continue
+            LOGGER.warning("Worker %d (pid %d) exited with status %d, restarting it", idx, pid, wait_status)
+            time.sleep(_RESTART_DELAY_S)
+            self._fork(idx=idx, sock=sock)
+        sock.close()
+
+    def _fork(self, idx: int, sock: socket.socket) -> None:
+        if (pid := os.fork()) != 0:
+            self._workers[pid] = idx
+            return
+        exit_code = 0
+        try:
+            self._run_worker(sock=sock)
+        except BaseException as e:
+            LOGGER.exception("Worker %d failed: %s", idx, e)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _run_worker(self, sock: socket.socket) -> None:
+        # Uvicorn handles them in the workers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if self.config.split_threads:
+            self.registry.split_n_threads(n_workers=self.config.count)
+        server = uvicorn.Server(uvicorn.Config(self.app, **self.uvicorn_config.model_dump()))
+        server.run(sockets=[sock])
+
+    def _stop(self, signum: int, _frame: FrameType | None) -> None:
+        self._is_stopping = True
+        for pid in self._workers:
+            os.kill(pid, signum)
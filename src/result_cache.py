@@ -0,0 +1,134 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from src.config import LLMConfig, ResultCacheConfig
+from src.llm.prompts import PromptTemplate
+from src.logging import get_logger
+from src.models import DetectHateSpeechSQLModel
+
+LOGGER = get_logger("ResultCache")
+
+CACHE_HEADER = "X-Cache"
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_WHITESPACES_PATTERN = re.compile(r"\s+")
+
+
+class LRUCache(Generic[K, V]):
+    """In-process LRU cache whose entries expire `ttl_s` seconds after being set"""
+
+    def __init__(self, max_size: int, ttl_s: float) -> None:
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        if (entry := self._entries.get(key)) is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:  # noqa: A003
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_s, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespaces, so trivially different copies of a text share a cache entry"""
+    return _WHITESPACES_PATTERN.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def detection_cache_key(text: str, prompt: PromptTemplate, llm_config: LLMConfig) -> str:
+    key = json.dumps(
+        {
+            "text": normalize_text(text),
+            "prompt_template": hashlib.sha256(prompt.template.encode("utf-8")).hexdigest(),
+            "model_name": llm_config.model_name,
+            "run_configs": llm_config.run_configs,
+        },
+        sort_keys=True,
+        default=lambda o: f"{type(o).__qualname__}",
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class DetectionResultCache:
+    """Two-tier cache of detection results: an in-process LRU in front of the `detect_hate_speech_result` table"""
+
+    def __init__(self, config: ResultCacheConfig) -> None:
+        self.config = config
+        self._lru: LRUCache[str, DetectHateSpeechSQLModel] = LRUCache(max_size=config.max_size, ttl_s=config.ttl_s)
+        self.n_hits = 0
+        self.n_db_hits = 0
+        self.n_misses = 0
+
+    async def get(self, session: AsyncSession, key: str) -> DetectHateSpeechSQLModel | None:
+        if not self.config.enabled:
+            return None
+        if (result := self._lru.get(key)) is not None:
+            self.n_hits += 1
+            return result
+        if self.config.db_lookup:
+            stmt = select(DetectHateSpeechSQLModel).where(DetectHateSpeechSQLModel.cache_key == key).limit(1)
+            if (result := (await session.execute(stmt)).scalars().first()) is not None:
+                self.n_hits += 1
+                self.n_db_hits += 1
+                self.put(key=key, result=result)
+                return result
+        self.n_misses += 1
+        return None
+
+    async def get_many(self, session: AsyncSession, keys: list[str]) -> dict[str, DetectHateSpeechSQLModel]:
+        """Look up several keys at once, with a single DB query for the in-process misses"""
+        if not self.config.enabled:
+            return {}
+        results = {key: result for key in keys if (result := self._lru.get(key)) is not None}
+        self.n_hits += len(results)
+        if self.config.db_lookup and (missing_keys := set(keys) - results.keys()):
+            stmt = select(DetectHateSpeechSQLModel).where(col(DetectHateSpeechSQLModel.cache_key).in_(missing_keys))
+            for result in (await session.execute(stmt)).scalars():
+                # Matched on `cache_key`, which is thus set
+                if (key := result.cache_key) is not None and key not in results:
+                    self.n_hits += 1
+                    self.n_db_hits += 1
+                    self.put(key=key, result=result)
+                    results[key] = result
+        self.n_misses += len(set(keys) - results.keys())
+        return results
+
+    def put(self, key: str, result: DetectHateSpeechSQLModel) -> None:
+        if self.config.enabled:
+            # Detached copy, so the cached entry is independent of the session the result was loaded or stored with
+            self._lru.set(key, DetectHateSpeechSQLModel(**result.model_dump()))
+
+    def status(self) -> dict:
+        n_lookups = self.n_hits + self.n_misses
+        return {
+            "enabled": self.config.enabled,
+            "size": len(self._lru),
+            "hits": self.n_hits,
+            "db_hits": self.n_db_hits,
+            "misses": self.n_misses,
+            "hit_ratio": self.n_hits / n_lookups if n_lookups else 0,
+        }
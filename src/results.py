@@ -0,0 +1,164 @@
+import base64
+import binascii
+import uuid as uuid_pkg
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime
+from enum import Enum
+
+from pydantic import AwareDatetime, BaseModel
+from sqlalchemy import ColumnElement, String, func, literal_column, or_, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from src.models import DetectHateSpeechSQLModel, LLMRun, LLMRunSQLModel
+from src.persistence import expand_llm_run
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class ResultFilters(BaseModel):
+    """Filters of the stored detection results, `created_before` excluded"""
+
+    created_after: AwareDatetime | None = None
+    created_before: AwareDatetime | None = None
+    is_hate_speech: bool | None = None
+    target: str | None = None  # one of the `target_of_hate`
+
+
+class ResultsPage(BaseModel):
+    results: list[DetectHateSpeechSQLModel]
+    next_cursor: str | None = None  # `None` on the last page
+
+
+class CountsGroupBy(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    TARGET = "target"
+
+
+class ResultCount(BaseModel):
+    key: str | None = None  # start of the period or target, `None` for the total
+    total: int
+    hate_speech: int
+
+
+class ResultCounts(BaseModel):
+    total: ResultCount
+    groups: list[ResultCount] = []
+
+
+class StoredLLMRun(LLMRun):
+    uuid: uuid_pkg.UUID
+    created_at: AwareDatetime
+
+
+def encode_cursor(result: DetectHateSpeechSQLModel) -> str:
+    return base64.urlsafe_b64encode(f"{result.created_at.isoformat()}|{result.uuid}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid_pkg.UUID]:
+    try:
+        created_at, uuid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid_pkg.UUID(uuid)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor `{cursor}`") from e
+
+
+def _filter_clauses(filters: ResultFilters) -> list[ColumnElement[bool]]:
+    clauses = []
+    if filters.created_after is not None:
+        clauses.append(col(DetectHateSpeechSQLModel.created_at) >= filters.created_after)
+    if filters.created_before is not None:
+        clauses.append(col(DetectHateSpeechSQLModel.created_at) < filters.created_before)
+    if filters.is_hate_speech is not None:
+        clauses.append(col(DetectHateSpeechSQLModel.is_hate_speech) == filters.is_hate_speech)
+    if filters.target is not None:
+        # `@>`, served by the GIN index
+        target_of_hate = type_coerce(DetectHateSpeechSQLModel.target_of_hate, ARRAY(String))
+        clauses.append(target_of_hate.contains([filters.target]))
+    return clauses
+
+
+def results_stmt(
+    filters: ResultFilters, limit: int, cursor: str | None = None
+) -> SelectOfScalar[DetectHateSpeechSQLModel]:
+    """Results matching `filters`, newest first, after the result of `cursor` if given.
+
+    Keyset pagination: the position of the last result is a condition on the indexed `created_at` rather than an
+    `OFFSET`, so every page costs the same whatever its depth.
+    """
+    clauses = _filter_clauses(filters)
+    if cursor is not None:
+        created_at, uuid = decode_cursor(cursor)
+        created_at_col = col(DetectHateSpeechSQLModel.created_at)
+        clauses.append(created_at_col <= created_at)
+        clauses.append(or_(created_at_col < created_at, col(DetectHateSpeechSQLModel.uuid) < uuid))
+    return (
+        select(DetectHateSpeechSQLModel)
+        .where(*clauses)
+        .order_by(col(DetectHateSpeechSQLModel.created_at).desc(), col(DetectHateSpeechSQLModel.uuid).desc())
+        .limit(limit)
+    )
+
+
+async def list_results(session: AsyncSession, filters: ResultFilters, limit: int, cursor: str | None) -> ResultsPage:
+    results = list((await session.execute(results_stmt(filters=filters, limit=limit + 1, cursor=cursor))).scalars())
+    if len(results) <= limit:
+        return ResultsPage(results=results)
+    return ResultsPage(results=results[:limit], next_cursor=encode_cursor(results[limit - 1]))
+
+
+async def iter_results(
+    session_factory: Callable[[], AsyncSession], filters: ResultFilters, chunk_size: int
+) -> AsyncIterator[DetectHateSpeechSQLModel]:
+    """All the results matching `filters`, read page by page, each in its own short transaction"""
+    cursor = None
+    while True:
+        async with session_factory() as session:
+            page = await list_results(session=session, filters=filters, limit=chunk_size, cursor=cursor)
+        for result in page.results:
+            yield result
+        if page.next_cursor is None:
+            return
+        cursor = page.next_cursor
+
+
+async def count_results(
+    session: AsyncSession, filters: ResultFilters, group_by: CountsGroupBy | None = None
+) -> ResultCounts:
+    """Number of results matching `filters`, of which hate speech, in total and per `group_by` if given"""
+    counts = (func.count(), func.count().filter(col(DetectHateSpeechSQLModel.is_hate_speech)))
+    clauses = _filter_clauses(filters)
+    total, hate_speech = (await session.execute(select(*counts).where(*clauses))).one()
+    res = ResultCounts(total=ResultCount(total=total, hate_speech=hate_speech))
+    if group_by is None:
+        return res
+
+    if group_by == CountsGroupBy.TARGET:
+        key = func.unnest(DetectHateSpeechSQLModel.target_of_hate).label("key")
+    else:
+        key = func.date_trunc(group_by.value, DetectHateSpeechSQLModel.created_at).label("key")
+    stmt = select(key, *counts).where(*clauses).group_by(literal_column("key")).order_by(literal_column("key"))
+    res.groups = [
+        ResultCount(key=key.isoformat() if isinstance(key, datetime) else key, total=total, hate_speech=hate_speech)
+        for key, total, hate_speech in (await session.execute(stmt)).all()
+    ]
+    return res
+
+
+async def get_result_llm_run(session: AsyncSession, result: DetectHateSpeechSQLModel) -> StoredLLMRun | None:
+    """LLM run of `result`, with its prompt and configs even if stored compact"""
+    # Created before the result, which skips the partitions of the later months
+    stmt = select(LLMRunSQLModel).where(
+        LLMRunSQLModel.uuid == result.llm_run_id, col(LLMRunSQLModel.created_at) <= result.created_at
+    )
+    if (llm_run_sql := (await session.execute(stmt)).scalars().first()) is None:
+        return None
+    llm_run = await expand_llm_run(session=session, llm_run_sql=llm_run_sql)
+    return StoredLLMRun(uuid=llm_run_sql.uuid, created_at=llm_run_sql.created_at, **llm_run.model_dump())
@@ -0,0 +1,156 @@
+"""Startup of the app in its lifespan: the app serves `/health/` as `LOADING` while the grammars are compiled and the
+models loaded in the background, then optionally warmed up, and reports readiness once done.
+
+The duration of each phase is logged, reported in `/health/` and exported as the `startup_phase_seconds` metric.
+"""
+import asyncio
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+from functools import partial
+
+from pydantic import BaseModel
+
+from src.config import StartupConfig
+from src.llm import LLMRun, LLMService, get_llama_grammar, precompile_llama_grammars
+from src.llm.executor import InferenceExecutor
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT, HATE_SPEECH_VERDICT_PROMPT, INPUT_TEXT_KEY, PromptTemplate
+from src.llm.registry import ModelRegistry
+from src.logging import get_logger
+from src.models import DetectHateSpeechReasoning, DetectHateSpeechResult, DetectHateSpeechVerdict
+
+LOGGER = get_logger("Startup")
+
+OUTPUT_MODELS: list[type[BaseModel]] = [DetectHateSpeechResult, DetectHateSpeechVerdict, DetectHateSpeechReasoning]
+
+WARMUP_TEXT = "Warm-up text of the startup, not a request."
+# Enough to sample with the grammar, the prompt evaluation being what warms up the model
+WARMUP_MAX_TOKENS = 8
+_WARMUP_PROMPTS: list[tuple[PromptTemplate, type[BaseModel]]] = [
+    (HATE_SPEECH_DETECTION_PROMPT, DetectHateSpeechResult),
+    (HATE_SPEECH_VERDICT_PROMPT, DetectHateSpeechVerdict),
+]
+
+
+def warm_up(llm: LLMService, cancel_event: threading.Event | None = None) -> list[LLMRun]:
+    """Short completions of the detection prompts, which page in the weights and leave the prompt prefixes and the
+    grammars of the worker thread ready for the first requests. The pre-filter is bypassed.
+    """
+    return [
+        llm.run_completion(
+            prompt=prompt,
+            prompt_inputs={INPUT_TEXT_KEY: WARMUP_TEXT},
+            cancel_event=cancel_event,
+            grammar=get_llama_grammar(model=output_model),
+            max_tokens=WARMUP_MAX_TOKENS,
+        )
+        for prompt, output_model in _WARMUP_PROMPTS
+    ]
+
+
+class StartupPhases:
+    """Wall-clock durations of the startup phases, in the order they ran, from the creation of this object"""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.durations_s: dict[str, float] = {}
+        self.ready_s: float | None = None
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations_s[phase] = time.perf_counter() - start
+
+    def set_ready(self) -> None:
+        self.ready_s = time.perf_counter() - self.started_at
+        LOGGER.info("Ready in %.3fs: %s", self.ready_s, ", ".join(f"{p} {s:.3f}s" for p, s in self.durations_s.items()))
+
+    def report(self) -> dict:
+        return {"ready_s": self.ready_s, "phases_s": dict(self.durations_s)}
+
+
+class AppStarter:
+    """Gets the models ready in the background: compiles the grammars, loads the preloaded models, starts their
+    workers and, with `warmup`, runs `warm_up` once on every instance, so that the first requests don't pay for it.
+
+    A failure to load is reported as the startup error, while a failed warm-up is only logged.
+    """
+
+    def __init__(
+        self, registry: ModelRegistry, executor: InferenceExecutor, phases: StartupPhases, config: StartupConfig
+    ) -> None:
+        self.registry = registry
+        self.executor = executor
+        self.phases = phases
+        self.config = config
+        self._task: asyncio.Task | None = None
+        self.error: str | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.phases.ready_s is not None and self.registry.is_ready
+
+    def status(self) -> dict:
+        return {"warmup": self.config.warmup, "error": self.error, **self.phases.report()}
+
+    async def _run(self) -> None:
+        try:
+            with self.phases.measure("grammars"):
+                await asyncio.to_thread(precompile_llama_grammars, OUTPUT_MODELS)
+            with self.phases.measure("models"):
+                await asyncio.to_thread(self.registry.preload)
+            with self.phases.measure("executor"):
+                self.executor.start()
+        except Exception as e:
+            LOGGER.exception("Startup failed: %s", e)
+            self.error = f"{e.__class__.__name__}: {e}"
+            return
+        if self.config.warmup:
+            with self.phases.measure("warmup"):
+                await self._warm_up()
+        self.phases.set_ready()
+
+    async def _warm_up(self) -> None:
+        jobs = []
+        for model_name in self.registry.model_names:
+            if n_instances := self.registry.get_pool(model_name=model_name).n_loaded:
+                # Each worker owns one instance: a worker done warming up waits for the others to have started, so it
+                # can't take a second warm-up job and every instance gets one
+                barrier = threading.Barrier(n_instances, timeout=self.executor.config.request_timeout_s)
+                jobs += [self._warm_up_instance(model_name=model_name, barrier=barrier) for _ in range(n_instances)]
+        for res in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(res, BaseException):
+                LOGGER.warning("Warm-up failed: %s", res)
+            elif failed := [llm_run.error for llm_run in res if not llm_run.success]:
+                LOGGER.warning("Warm-up failed: %s", failed)
+
+    async def _warm_up_instance(self, model_name: str, barrier: threading.Barrier) -> list[LLMRun]:
+        try:
+            return await self.executor.run(partial(_warm_up_then_wait, barrier=barrier), model_name=model_name)
+        finally:
+            # Passed by then, unless the job failed before reaching it (e.g.: its worker has no instance) or was
+            # cancelled: release the other workers rather than have them wait for the timeout
+            barrier.abort()
+
+
+def _warm_up_then_wait(llm: LLMService, cancel_event: threading.Event, barrier: threading.Barrier) -> list[LLMRun]:
+    try:
+        return warm_up(llm=llm, cancel_event=cancel_event)
+    finally:
+        with suppress(threading.BrokenBarrierError):
+            barrier.wait()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from src.llm import LLMRunParsedModel, LLMService
+from src.llm.detect_hate_speech import is_prefiltered, llm_detect_hate_speech
+from src.llm.executor import InferenceExecutor, InferenceJob
+from src.llm.input_guard import GuardedText
+from src.logging import get_logger
+from src.metrics import record_llm_stage, record_queue_wait
+from src.models import DetectHateSpeechResult, DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.persistence import DetectionPersister
+from src.result_cache import DetectionResultCache
+
+LOGGER = get_logger("DetectionStreamer")
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# The grammar makes the model generate the fields in the order of `DetectHateSpeechResult`, verdict first
+_VERDICT_PATTERN = re.compile(r'"is_hate_speech"\s*:\s*(true|false)')
+
+
+class SSE_EVENTS:
+    token = "token"  # noqa: S105
+    verdict = "verdict"
+    result = "result"
+    error = "error"
+
+
+def sse_event(event: str, data: str) -> bytes:
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+@dataclass
+class DetectionStream:
+    text: str
+    cache_key: str
+    job: InferenceJob
+    deltas: asyncio.Queue[str | None]
+    submitted_at: datetime
+
+
+class DetectionStreamer:
+    """Server-sent events of a detection: the generated text as it arrives, the verdict as soon as it is generated,
+    then the stored result, persisted like the non-streaming path.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        result_cache: DetectionResultCache,
+        persister: DetectionPersister,
+    ) -> None:
+        self.executor = executor
+        self.result_cache = result_cache
+        self.persister = persister
+
+    def submit(
+        self, text: str, cache_key: str, model_name: str | None = None, guarded: GuardedText | None = None
+    ) -> DetectionStream:
+        """Queue the detection, of the single text of `guarded` in place of `text` if given, raising
+        `InferenceQueueFullError` before any event is sent if the queue is full
+        """
+        loop = asyncio.get_running_loop()
+        deltas: asyncio.Queue[str | None] = asyncio.Queue()
+
+        def _on_text(delta: str) -> None:
+            loop.call_soon_threadsafe(deltas.put_nowait, delta)
+
+        def _detect(llm: LLMService, cancel_event: threading.Event) -> LLMRunParsedModel[DetectHateSpeechResult]:
+            try:
+                llm_run = llm_detect_hate_speech(
+                    llm=llm, text=guarded.texts[0] if guarded else text, cancel_event=cancel_event, on_text=_on_text
+                )
+                if guarded and guarded.metadata:
+                    llm_run.run_metadata["input"] = guarded.metadata
+                return llm_run
+            finally:
+                loop.call_soon_threadsafe(deltas.put_nowait, None)
+
+        submitted_at = datetime.now(tz=timezone.utc)
+        job = self.executor.submit(fn=_detect, model_name=model_name)
+        return DetectionStream(text=text, cache_key=cache_key, job=job, deltas=deltas, submitted_at=submitted_at)
+
+    async def events(self, stream: DetectionStream) -> AsyncIterator[bytes]:
+        run_task = asyncio.create_task(self.executor.wait(job=stream.job))
+        generated = ""
+        verdict_sent = False
+        try:
+            while True:
+                next_delta = asyncio.ensure_future(stream.deltas.get())
+                await asyncio.wait({next_delta, run_task}, return_when=asyncio.FIRST_COMPLETED)
+                # The end of the deltas is queued before the run ends, so the run ends first only if it never started
+                if not next_delta.done():
+                    next_delta.cancel()
+                    break
+                if (delta := next_delta.result()) is None:
+                    break
+                generated += delta
+                yield sse_event(SSE_EVENTS.token, json.dumps({"text": delta}))
+                if not verdict_sent and (match := _VERDICT_PATTERN.search(generated)):
+                    verdict_sent = True
+                    yield sse_event(SSE_EVENTS.verdict, json.dumps({"is_hate_speech": match.group(1) == "true"}))
+            llm_run: LLMRunParsedModel[DetectHateSpeechResult] = await run_task
+        except Exception as e:
+            LOGGER.exception("Failed to stream hate speech detection: %s", e)
+            yield sse_event(SSE_EVENTS.error, json.dumps({"detail": f"{e.__class__.__name__}: {e}"}))
+            return
+        finally:
+            # Stops the generation if the client went away
+            run_task.cancel()
+
+        record_queue_wait(llm_run=llm_run, submitted_at=stream.submitted_at)
+        if (detect_res := await self._store(llm_run=llm_run, text=stream.text, cache_key=stream.cache_key)) is None:
+            yield sse_event(SSE_EVENTS.error, json.dumps({"detail": llm_run.error}))
+            return
+        if not verdict_sent:
+            yield sse_event(SSE_EVENTS.verdict, json.dumps({"is_hate_speech": detect_res.is_hate_speech}))
+        yield sse_event(SSE_EVENTS.result, detect_res.model_dump_json())
+
+    async def prefiltered_events(
+        self, llm_run: LLMRunParsedModel[DetectHateSpeechResult], text: str, cache_key: str
+    ) -> AsyncIterator[bytes]:
+        """Events of a detection answered by the pre-filter, stored like the streamed ones"""
+        if (detect_res := await self._store(llm_run=llm_run, text=text, cache_key=cache_key)) is None:
+            yield sse_event(SSE_EVENTS.error, json.dumps({"detail": llm_run.error}))
+            return
+        async for event in self.cached_events(result=detect_res):
+            yield event
+
+    async def _store(
+        self, llm_run: LLMRunParsedModel[DetectHateSpeechResult], text: str, cache_key: str
+    ) -> DetectHateSpeechSQLModel | None:
+        """Persist the run and its result, `None` if the run failed"""
+        llm_run_sql = LLMRunSQLModel(**llm_run.model_dump())
+        if not llm_run.success or not llm_run.parsed_output:
+            await self.persister.save([llm_run_sql])
+            return None
+        result_key = None if is_prefiltered(llm_run) else cache_key
+        detect_res = DetectHateSpeechSQLModel(
+            text=text, llm_run_id=llm_run_sql.uuid, cache_key=result_key, **llm_run.parsed_output.model_dump()
+        )
+        persist_start = time.perf_counter()
+        await self.persister.save([llm_run_sql, detect_res])
+        record_llm_stage(stage="persist", duration_s=time.perf_counter() - persist_start)
+        if result_key is not None:
+            self.result_cache.put(key=result_key, result=detect_res)
+        return detect_res
+
+    async def cached_events(self, result: DetectHateSpeechSQLModel) -> AsyncIterator[bytes]:
+        yield sse_event(SSE_EVENTS.verdict, json.dumps({"is_hate_speech": result.is_hate_speech}))
+        yield sse_event(SSE_EVENTS.result, result.model_dump_json())
@@ -1,4 +1,5 @@
 import os
+from collections.abc import Callable, Iterator
 from pathlib import Path
 
 import pytest
@@ -9,9 +10,23 @@ from sqlalchemy import pool
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from src.app import app, get_llm_service
+from benchmarks.stub import StubLlama, patch_llama
+from src.app import (
+    app,
+    get_detection_guard,
+    get_detection_scheduler,
+    get_inference_executor,
+    get_model_registry,
+    get_verdict_guard,
+    get_verdict_scheduler,
+)
 from src.config import CONFIGS
 from src.llm import LLMService
+from src.llm.batching import BatchScheduler
+from src.llm.detect_hate_speech import llm_detect_hate_speech_batch, llm_detect_hate_speech_verdict_batch
+from src.llm.executor import InferenceExecutor
+from src.llm.input_guard import InputGuard
+from src.llm.registry import ModelRegistry
 from tests import TEST_DIR_PATH, TEST_OUTPUTS_DIR_PATH
 
 
@@ -48,6 +63,63 @@ def llm_service() -> LLMService:
     return LLMService()
 
 
+class _FastStubLlama(StubLlama):
+    load_delay_s = 0.0
+    prompt_token_delay_s = 0.0
+    token_delay_s = 0.0
+    batch_token_delay_s = 0.0
+
+
+@pytest.fixture
+def stub_llm_service() -> Iterator[LLMService]:
+    """`LLMService` backed by an offline stub model returning a fixed `DetectHateSpeechResult`"""
+    with patch_llama(stub_cls=_FastStubLlama):
+        yield LLMService()
+
+
+class FakeAsyncSession:
+    """Offline stand-in for `AsyncSession` recording the rows of each commit"""
+
+    def __init__(self, commits: list[list]) -> None:
+        self.commits = commits
+        self._added: list = []
+
+    async def __aenter__(self) -> "FakeAsyncSession":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        pass
+
+    def add(self, row: object) -> None:
+        self._added.append(row)
+
+    def add_all(self, rows: list) -> None:
+        self._added.extend(rows)
+
+    async def commit(self) -> None:
+        self.commits.append(self._added)
+        self._added = []
+
+    async def get(self, model: type, key: object) -> object | None:
+        rows = [
+            row
+            for commit in self.commits
+            for row in commit
+            if isinstance(row, model) and getattr(row, "uuid", None) == key
+        ]
+        return rows[-1] if rows else None
+
+
+@pytest.fixture
+def committed_rows() -> list[list]:
+    return []
+
+
+@pytest.fixture
+def fake_session_factory(committed_rows: list[list]) -> Callable[[], FakeAsyncSession]:
+    return lambda: FakeAsyncSession(commits=committed_rows)
+
+
 @pytest.fixture
 def test_case_out_dir(request: pytest.FixtureRequest) -> Path:
     test_case_path = request.path.parent / request.path.stem
@@ -72,8 +144,21 @@ def run_comparison(
 
 @pytest.fixture(scope="session")
 def application(llm_service: LLMService) -> FastAPI:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=lambda _llm_config: llm_service)
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    scheduler = BatchScheduler(executor=executor, batch_fn=llm_detect_hate_speech_batch, config=CONFIGS.llm.batching)
+    verdict_scheduler = BatchScheduler(
+        executor=executor, batch_fn=llm_detect_hate_speech_verdict_batch, config=CONFIGS.llm.batching
+    )
+    guard = InputGuard(scheduler=scheduler, registry=registry, config=CONFIGS.llm.input)
+    verdict_guard = InputGuard(scheduler=verdict_scheduler, registry=registry, config=CONFIGS.llm.input)
     app.dependency_overrides = {
-        get_llm_service: lambda: llm_service,
+        get_model_registry: lambda: registry,
+        get_inference_executor: lambda: executor,
+        get_detection_scheduler: lambda: scheduler,
+        get_verdict_scheduler: lambda: verdict_scheduler,
+        get_detection_guard: lambda: guard,
+        get_verdict_guard: lambda: verdict_guard,
     }
     return app
 
@@ -1,15 +1,20 @@
 import gzip
+import sys
+import zlib
 from collections.abc import Iterator
 from enum import Enum
 
 from pydantic import BaseModel, Field
 
-from src.logging import get_logger
+from src.config import CONFIGS, MODEL_DIR_PATH
+from src.llm.prefilter import HashedNgramClassifier
+from src.logging import configure_logging, get_logger
 from src.models import DetectHateSpeech
 from tests import DATA_DIR_PATH
 
 HATEXPLAIN_DATA_FILE = DATA_DIR_PATH / "hatexplain.ndjson.gz"
 HATEXPLAIN_DETECTION_CASE_DATA_FILE = DATA_DIR_PATH / "hatexplain_detection_cases.ndjson.gz"
+HOLDOUT_FOLDS = 5
 
 LOGGER = get_logger("Hatexplain")
 
@@ -69,6 +74,21 @@ def load_hatexplain_detection_cases() -> Iterator[DetectHateSpeech]:
                 continue
 
 
+def is_holdout_case(case: DetectHateSpeech) -> bool:
+    """Deterministic split of the cases the pre-filter is not trained on, to evaluate it on"""
+    return zlib.crc32(case.text.encode("utf-8")) % HOLDOUT_FOLDS == 0
+
+
+def train_hatexplain_prefilter() -> None:
+    """Train the pre-filter classifier on the non-holdout detection cases and save it under the model directory"""
+    cases = [case for case in load_hatexplain_detection_cases() if not is_holdout_case(case)]
+    prefilter = HashedNgramClassifier.fit(
+        texts=[case.text for case in cases], labels=[case.is_hate_speech for case in cases]
+    )
+    prefilter.save(path=MODEL_DIR_PATH / CONFIGS.prefilter.model_file)
+    LOGGER.info("Trained the pre-filter on %s cases", len(cases))
+
+
 def build_hatexplain_detection_cases() -> None:
     """Generate HateSpeechDetectionCase from Hatexplain cases that have unanimous annotated label and save to file"""
     with gzip.open(HATEXPLAIN_DATA_FILE, mode="rt") as in_f, gzip.open(
@@ -92,4 +112,8 @@ def build_hatexplain_detection_cases() -> None:
 
 
 if __name__ == "__main__":
-    build_hatexplain_detection_cases()
+    configure_logging()
+    if sys.argv[1:] == ["prefilter"]:
+        train_hatexplain_prefilter()
+    else:
+        build_hatexplain_detection_cases()
@@ -0,0 +1,212 @@
+"""Evaluate hate speech detection on the Hatexplain detection cases with worker processes, each with its own model.
+
+Every case result is appended to an NDJSON checkpoint file as soon as it is ready, so an interrupted run (or one
+with failed cases) started again with the same checkpoint only runs the missing cases. The report has the
+precision/recall of all the checkpointed cases, and the throughput and latencies of the cases run this time.
+
+Usage: python -m tests.evaluation [--workers 2] [--mode full|verdict] [--sample 200 [--seed 0]] [--checkpoint FILE]
+                                  [--stub] [--out FILE]
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path
+
+from pydantic import BaseModel
+from sklearn import metrics
+
+from benchmarks.stub import patch_llama
+from benchmarks.utils import latency_summary, write_report
+from src.config import CONFIGS
+from src.llm import LLMRunParsedModel, LLMService
+from src.llm.detect_hate_speech import llm_detect_hate_speech, llm_detect_hate_speech_verdict
+from src.logging import configure_logging, get_logger
+from tests import TEST_OUTPUTS_DIR_PATH
+from tests.data.hatexplain import load_hatexplain_detection_cases
+
+LOGGER = get_logger("Evaluation")
+
+DETECTION_MODES: dict[str, Callable[..., LLMRunParsedModel]] = {
+    "full": llm_detect_hate_speech,
+    "verdict": llm_detect_hate_speech_verdict,
+}
+
+
+class EvaluationRecord(BaseModel):
+    case_idx: int
+    is_hate_speech: bool
+    predicted: bool | None = None
+    error: str | None = None
+    latency_s: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+def default_checkpoint_file(mode: str, stub: bool) -> Path:
+    name = f"{'stub' if stub else Path(CONFIGS.llm.model_name).stem}_{mode}"
+    return TEST_OUTPUTS_DIR_PATH / "evaluation" / f"{name}.ndjson"
+
+
+def load_checkpoint(path: Path) -> dict[int, EvaluationRecord]:
+    """Latest record of each case in the checkpoint file, skipping a line truncated by an interruption"""
+    records: dict[int, EvaluationRecord] = {}
+    if not path.exists():
+        return records
+    with path.open() as f:
+        for line in f:
+            try:
+                record = EvaluationRecord.model_validate_json(line)
+            except ValueError:
+                LOGGER.warning("Skipped invalid checkpoint line %s", line.strip())
+                continue
+            records[record.case_idx] = record
+    return records
+
+
+def select_cases(n_cases: int, sample: int | None, seed: int) -> list[int]:
+    """Indices of all the cases, or of a reproducible random sample of them"""
+    if sample is None or sample >= n_cases:
+        return list(range(n_cases))
+    return sorted(random.Random(seed).sample(range(n_cases), k=sample))
+
+
+_WORKER_LLM: LLMService | None = None
+_WORKER_CONTEXT = ExitStack()
+
+
+def _init_worker(stub: bool) -> None:
+    global _WORKER_LLM  # noqa: PLW0603
+    if stub:
+        _WORKER_CONTEXT.enter_context(patch_llama())
+    _WORKER_LLM = LLMService()
+
+
+def _evaluate_case(case_idx: int, text: str, is_hate_speech: bool, mode: str) -> EvaluationRecord:
+    assert _WORKER_LLM is not None, "Worker model is not initialized"
+    start = time.perf_counter()
+    try:
+        llm_run = DETECTION_MODES[mode](llm=_WORKER_LLM, text=text)
+    except Exception as e:
+        return EvaluationRecord(
+            case_idx=case_idx, is_hate_speech=is_hate_speech, error=str(e), latency_s=time.perf_counter() - start
+        )
+    usage = (llm_run.llm_outputs or {}).get("usage", {})
+    return EvaluationRecord(
+        case_idx=case_idx,
+        is_hate_speech=is_hate_speech,
+        predicted=llm_run.parsed_output.is_hate_speech if llm_run.success and llm_run.parsed_output else None,
+        error=None if llm_run.success and llm_run.parsed_output else llm_run.error or "No parsed output",
+        latency_s=time.perf_counter() - start,
+        prompt_tokens=usage.get("prompt_tokens", 0),
+        completion_tokens=usage.get("completion_tokens", 0),
+    )
+
+
+def run_evaluation(  # noqa: PLR0913
+    checkpoint: Path,
+    mode: str = "full",
+    n_workers: int = 2,
+    sample: int | None = None,
+    seed: int = 0,
+    stub: bool = False,
+) -> dict:
+    cases = list(load_hatexplain_detection_cases())
+    selected = select_cases(n_cases=len(cases), sample=sample, seed=seed)
+    records = load_checkpoint(path=checkpoint)
+    pending = [idx for idx in selected if idx not in records or records[idx].error is not None]
+    LOGGER.info("Evaluating %s cases, %s already in %s", len(pending), len(selected) - len(pending), checkpoint)
+
+    new_records: list[EvaluationRecord] = []
+    start = time.perf_counter()
+    if pending:
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        with checkpoint.open(mode="a") as f, ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(stub,),
+        ) as pool:
+            futures = [
+                pool.submit(_evaluate_case, idx, cases[idx].text, cases[idx].is_hate_speech, mode) for idx in pending
+            ]
+            for future in as_completed(futures):
+                record = future.result()
+                f.write(record.model_dump_json() + "\n")
+                f.flush()
+                records[record.case_idx] = record
+                new_records.append(record)
+    elapsed_s = time.perf_counter() - start
+
+    return {
+        "model_name": CONFIGS.llm.model_name,
+        "mode": mode,
+        "stub": stub,
+        "n_workers": n_workers,
+        "checkpoint": str(checkpoint),
+        "accuracy": accuracy_summary([records[idx] for idx in selected if idx in records]),
+        "throughput": throughput_summary(records=new_records, elapsed_s=elapsed_s),
+    }
+
+
+def accuracy_summary(records: list[EvaluationRecord]) -> dict:
+    """Precision/recall per class, failed cases counting as wrongly predicted"""
+    y_true = [record.is_hate_speech for record in records]
+    y_pred = [-1 if record.predicted is None else record.predicted for record in records]
+    summary: dict = {"n_cases": len(records), "n_errors": sum(record.error is not None for record in records)}
+    if not records:
+        return summary
+    precision, recall, f_score, support = metrics.precision_recall_fscore_support(
+        y_true=y_true, y_pred=y_pred, labels=[True, False], zero_division=0
+    )
+    for idx, class_name in enumerate(["hate", "not_hate"]):
+        summary[class_name] = {
+            "n_cases": int(support[idx]),
+            "precision": float(precision[idx]),
+            "recall": float(recall[idx]),
+            "f_score": float(f_score[idx]),
+        }
+    return summary
+
+
+def throughput_summary(records: list[EvaluationRecord], elapsed_s: float) -> dict:
+    if not records:
+        return {"n_cases": 0}
+    return {
+        "n_cases": len(records),
+        "elapsed_s": elapsed_s,
+        "cases_per_s": len(records) / elapsed_s,
+        "prompt_tokens_per_s": sum(record.prompt_tokens for record in records) / elapsed_s,
+        "completion_tokens_per_s": sum(record.completion_tokens for record in records) / elapsed_s,
+        "latency": latency_summary([record.latency_s for record in records]),
+    }
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="worker processes, each loading its own model")
+    parser.add_argument("--mode", choices=list(DETECTION_MODES), default="full")
+    parser.add_argument("--sample", type=int, default=None, help="evaluate a random sample of this many cases")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the sample")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="NDJSON checkpoint file to resume from")
+    parser.add_argument("--stub", action="store_true", help="use a stub Llama instead of the configured GGUF model")
+    parser.add_argument("--out", type=Path, default=None, help="JSON report file, stdout if not given")
+    args = parser.parse_args()
+
+    report = run_evaluation(
+        checkpoint=args.checkpoint or default_checkpoint_file(mode=args.mode, stub=args.stub),
+        mode=args.mode,
+        n_workers=args.workers,
+        sample=args.sample,
+        seed=args.seed,
+        stub=args.stub,
+    )
+    write_report(report=report, out_file=args.out)
+
+
+if __name__ == "__main__":
+    main()
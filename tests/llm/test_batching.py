@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.stub import STUB_RESULT
+from src.config import CONFIGS, LLMBatchingConfig, LLMConfig, LLMExecutorConfig, LLMPoolConfig
+from src.llm import LLMService, _n_shared_tokens
+from src.llm.batching import BatchScheduler
+from src.llm.detect_hate_speech import llm_detect_hate_speech_batch
+from src.llm.executor import InferenceExecutor
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT, INPUT_TEXT_KEY
+from src.llm.registry import ModelRegistry
+
+
+class _EchoModel:
+    def __init__(self, llm_config: LLMConfig) -> None:
+        self.batches: list[list[str]] = []
+
+
+def _echo_batch(llm: LLMService, items: list[str], cancel_event: threading.Event) -> list[str]:
+    llm.batches.append(items)  # type: ignore[attr-defined]
+    return [item.upper() for item in items]
+
+
+def _scheduler(config: LLMBatchingConfig) -> tuple[BatchScheduler[str, str], _EchoModel]:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=_EchoModel)  # type: ignore[arg-type]
+    registry.preload()
+    with registry.acquire() as model:
+        pass
+    executor = InferenceExecutor(registry=registry, config=LLMExecutorConfig())
+    return BatchScheduler(executor=executor, batch_fn=_echo_batch, config=config), model  # type: ignore[return-value]
+
+
+@pytest.mark.asyncio
+async def test_batch_scheduler_groups_requests_within_window() -> None:
+    scheduler, model = _scheduler(config=LLMBatchingConfig(enabled=True, max_batch_size=3, max_wait_ms=50))
+    texts = ["a", "b", "c", "d", "e"]
+    results = await asyncio.gather(*[scheduler.submit(text) for text in texts])
+    scheduler.executor.shutdown()
+
+    assert results == [text.upper() for text in texts]
+    assert model.batches == [["a", "b", "c"], ["d", "e"]]
+
+
+@pytest.mark.asyncio
+async def test_batch_scheduler_disabled_dispatches_each_request() -> None:
+    scheduler, model = _scheduler(config=LLMBatchingConfig(enabled=False))
+    results = await asyncio.gather(*[scheduler.submit(text) for text in ["a", "b"]])
+    scheduler.executor.shutdown()
+
+    assert results == ["A", "B"]
+    assert sorted(model.batches) == [["a"], ["b"]]
+
+
+@pytest.mark.asyncio
+async def test_batch_scheduler_spreads_batch_across_pool_instances() -> None:
+    models: list[_EchoModel] = []
+
+    def _create_model(llm_config: LLMConfig) -> _EchoModel:
+        models.append(_EchoModel(llm_config=llm_config))
+        return models[-1]
+
+    llm_config = CONFIGS.llm.model_copy(update={"pool": LLMPoolConfig(size=2)})
+    registry = ModelRegistry(llm_configs=[llm_config], factory=_create_model)  # type: ignore[arg-type]
+    registry.preload()
+    executor = InferenceExecutor(registry=registry, config=LLMExecutorConfig())
+    scheduler = BatchScheduler(
+        executor=executor,
+        batch_fn=_echo_batch,
+        config=LLMBatchingConfig(enabled=True, max_batch_size=5, max_wait_ms=50),
+    )
+    texts = ["a", "b", "c", "d", "e"]
+    results = await asyncio.gather(*[scheduler.submit(text) for text in texts])
+    executor.shutdown()
+
+    assert results == [text.upper() for text in texts]
+    assert sorted(batch for model in models for batch in model.batches) == [["a", "b", "c"], ["d", "e"]]
+    assert scheduler.status()["batches"] == 1
+
+
+def test_batch_completions_are_decoded_together(stub_llm_service: LLMService) -> None:
+    llm_runs = llm_detect_hate_speech_batch(llm=stub_llm_service, texts=["first text", "second text", "third text"])
+
+    assert [llm_run.parsed_output for llm_run in llm_runs] == [STUB_RESULT] * 3
+    assert [llm_run.run_metadata["batch_size"] for llm_run in llm_runs] == [3] * 3
+
+
+def test_batch_is_split_when_its_prompts_do_not_fit_the_context(
+    stub_llm_service: LLMService, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    texts = [f"{ordinal} text, " * 20 for ordinal in ["first", "second", "third", "fourth"]]
+    prompts_tokens = [
+        stub_llm_service.model.tokenize(HATE_SPEECH_DETECTION_PROMPT.format_inputs({INPUT_TEXT_KEY: text}).encode())
+        for text in texts
+    ]
+    n_shared = _n_shared_tokens(prompts_tokens=prompts_tokens)
+    # Room for the 40 words of two texts and their output, not for the ones of four texts
+    n_ctx = n_shared + 2 * (max(len(tokens) for tokens in prompts_tokens) - n_shared + 32)
+    monkeypatch.setattr(stub_llm_service.model, "n_ctx", lambda: n_ctx)
+    llm_runs = llm_detect_hate_speech_batch(llm=stub_llm_service, texts=texts)
+
+    assert [llm_run.parsed_output for llm_run in llm_runs] == [STUB_RESULT] * 4
+    assert [llm_run.run_metadata["batch_size"] for llm_run in llm_runs] == [2] * 4
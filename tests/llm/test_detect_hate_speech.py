@@ -1,12 +1,22 @@
+import statistics
+import time
+from collections.abc import Callable
 from pathlib import Path
 
 import pytest
 from sklearn import metrics
 
-from src.llm import LLMService
-from src.llm.detect_hate_speech import llm_detect_hate_speech
+from src.config import CONFIGS, MODEL_DIR_PATH, PrefilterConfig
+from src.llm import LLMRunParsedModel, LLMService
+from src.llm.detect_hate_speech import (
+    llm_detect_hate_speech,
+    llm_detect_hate_speech_batch,
+    llm_detect_hate_speech_verdict,
+    prefilter_decision,
+)
+from src.llm.prefilter import HashedNgramClassifier
 from src.models import DetectHateSpeechResult
-from tests.data.hatexplain import load_hatexplain_detection_cases
+from tests.data.hatexplain import is_holdout_case, load_hatexplain_detection_cases
 
 EXAMPLE_NOT_HATE_SPEECH = "We have enough problems in the world. Stop hating on each other"
 EXAMPLE_HATE_SPEECH = "Speak English in America ching chong"
@@ -31,6 +41,15 @@ def test_detect_hate_speech_simple(llm_service: LLMService, text: str, is_hate_s
         assert not res.target_of_hate, f"Expected no target. Got {res.target_of_hate}"
 
 
+def test_detect_hate_speech_batch(llm_service: LLMService) -> None:
+    llm_runs = llm_detect_hate_speech_batch(llm=llm_service, texts=[EXAMPLE_NOT_HATE_SPEECH, EXAMPLE_HATE_SPEECH])
+    assert all(llm_run.success for llm_run in llm_runs), [llm_run.error for llm_run in llm_runs]
+    assert [llm_run.run_metadata["batch_size"] for llm_run in llm_runs] == [2, 2]
+    results = [llm_run.parsed_output for llm_run in llm_runs]
+    assert all(isinstance(res, DetectHateSpeechResult) for res in results)
+    assert [res.is_hate_speech for res in results if res] == [False, True], f"Got {results}"
+
+
 @pytest.mark.evaluation
 def test_evaluate_detect_hate_speech_hatexplain(llm_service: LLMService, test_case_out_file: Path) -> None:
     y_true, y_pred = [], []
@@ -69,3 +88,89 @@ def test_evaluate_detect_hate_speech_hatexplain(llm_service: LLMService, test_ca
 - F-score: {f_score[idx]}
 """
             )
+
+
+@pytest.mark.evaluation
+def test_compare_detection_modes_hatexplain(llm_service: LLMService, test_case_out_file: Path) -> None:
+    cases = list(load_hatexplain_detection_cases())
+    y_true = [case.is_hate_speech for case in cases]
+    modes: list[tuple[str, Callable[..., LLMRunParsedModel]]] = [
+        ("full", llm_detect_hate_speech),
+        ("verdict", llm_detect_hate_speech_verdict),
+    ]
+
+    with test_case_out_file.open(mode="w") as f:
+        for mode, detect in modes:
+            y_pred, latencies, prompt_tokens, completion_tokens = [], [], [], []
+            for case in cases:
+                start = time.perf_counter()
+                llm_run = detect(llm=llm_service, text=case.text)
+                latencies.append(time.perf_counter() - start)
+                y_pred.append(llm_run.parsed_output.is_hate_speech if llm_run.parsed_output else -1)
+                if llm_run.llm_outputs:
+                    prompt_tokens.append(llm_run.llm_outputs["usage"]["prompt_tokens"])
+                    completion_tokens.append(llm_run.llm_outputs["usage"]["completion_tokens"])
+
+            f_score = metrics.f1_score(y_true=y_true, y_pred=y_pred, labels=[True, False], average=None)
+            f.write(
+                f"""{mode} mode:
+- No. case: {len(cases)}
+- Mean latency: {statistics.mean(latencies):.3f}s
+- P95 latency: {statistics.quantiles(latencies, n=20)[-1]:.3f}s
+- Mean prompt tokens: {statistics.mean(prompt_tokens):.1f}
+- Mean completion tokens: {statistics.mean(completion_tokens):.1f}
+- F-score (Hate cases, Not Hate cases): {f_score[0]}, {f_score[1]}
+"""
+            )
+
+
+@pytest.mark.evaluation
+def test_evaluate_prefilter_cascade_hatexplain(
+    llm_service: LLMService, test_case_out_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Escalation rate, throughput gain and accuracy of the pre-filter cascade against the LLM alone, on the cases
+    the pre-filter is not trained on (`python -m tests.data.hatexplain prefilter`)
+    """
+    prefilter = HashedNgramClassifier.load(path=MODEL_DIR_PATH / CONFIGS.prefilter.model_file)
+    cases = [case for case in load_hatexplain_detection_cases() if is_holdout_case(case)]
+    y_true = [case.is_hate_speech for case in cases]
+
+    llm_pred, llm_latencies, scores, prefilter_latencies = [], [], [], []
+    for case in cases:
+        start = time.perf_counter()
+        scores.append(prefilter.predict_proba(text=case.text))
+        prefilter_latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        llm_run = llm_detect_hate_speech(llm=llm_service, text=case.text)
+        llm_latencies.append(time.perf_counter() - start)
+        llm_pred.append(llm_run.parsed_output.is_hate_speech if llm_run.parsed_output else -1)
+
+    llm_f_score = metrics.f1_score(y_true=y_true, y_pred=llm_pred, labels=[True, False], average=None)
+    with test_case_out_file.open(mode="w") as f:
+        f.write(
+            f"""LLM only:
+- No. case: {len(cases)}
+- Total time: {sum(llm_latencies):.1f}s
+- F-score (Hate cases, Not Hate cases): {llm_f_score[0]}, {llm_f_score[1]}
+"""
+        )
+        for benign_below, hateful_above in sorted(
+            {(CONFIGS.prefilter.benign_below, CONFIGS.prefilter.hateful_above), (0.05, 0.95), (0.1, 0.9), (0.2, 0.8)}
+        ):
+            config = PrefilterConfig(benign_below=benign_below, hateful_above=hateful_above)
+            decisions = [prefilter_decision(score=score, config=config) for score in scores]
+            cascade_pred = [
+                llm if decision is None else decision for decision, llm in zip(decisions, llm_pred, strict=True)
+            ]
+            cascade_time = sum(prefilter_latencies) + sum(
+                latency for decision, latency in zip(decisions, llm_latencies, strict=True) if decision is None
+            )
+            cascade_f_score = metrics.f1_score(y_true=y_true, y_pred=cascade_pred, labels=[True, False], average=None)
+            f.write(
+                f"""Cascade benign below {benign_below}, hateful above {hateful_above}:
+- Escalation rate: {decisions.count(None) / len(cases):.3f}
+- Total time: {cascade_time:.1f}s
+- Throughput gain: {sum(llm_latencies) / cascade_time:.2f}x
+- F-score (Hate cases, Not Hate cases): {cascade_f_score[0]}, {cascade_f_score[1]}
+"""
+            )
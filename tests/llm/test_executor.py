@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.config import CONFIGS, LLMConfig, LLMExecutorConfig, LLMPoolConfig
+from src.llm import LLMService
+from src.llm.executor import (
+    InferenceExecutor,
+    InferenceFn,
+    InferenceJob,
+    InferenceQueueFullError,
+    InferenceTimeoutError,
+)
+from src.llm.registry import ModelRegistry
+
+
+class _SlowModel:
+    """Fake model whose completion blocks the calling thread like llama.cpp does, until done or cancelled"""
+
+    def __init__(self, llm_config: LLMConfig) -> None:
+        self.n_completions = 0
+
+    def complete(self, duration_s: float, cancel_event: threading.Event) -> str:
+        self.n_completions += 1
+        cancelled = cancel_event.wait(timeout=duration_s)
+        return "cancelled" if cancelled else "done"
+
+
+def _executor(pool_size: int = 1, queue_size: int = 4) -> InferenceExecutor:
+    llm_config = CONFIGS.llm.model_copy(update={"pool": LLMPoolConfig(size=pool_size)})
+    registry = ModelRegistry(llm_configs=[llm_config], factory=_SlowModel)  # type: ignore[arg-type]
+    registry.preload()
+    return InferenceExecutor(registry=registry, config=LLMExecutorConfig(queue_size=queue_size, request_timeout_s=5))
+
+
+def _slow_inference(duration_s: float) -> InferenceFn[str]:
+    def _fn(llm: LLMService, cancel_event: threading.Event) -> str:
+        res: str = llm.complete(duration_s=duration_s, cancel_event=cancel_event)  # type: ignore[attr-defined]
+        return res
+
+    return _fn
+
+
+@pytest.mark.asyncio
+async def test_executor_keeps_event_loop_responsive() -> None:
+    executor = _executor(pool_size=2)
+    n_ticks = 0
+
+    async def _heartbeat() -> None:
+        nonlocal n_ticks
+        while True:
+            await asyncio.sleep(0.01)
+            n_ticks += 1
+
+    heartbeat = asyncio.create_task(_heartbeat())
+    start = time.perf_counter()
+    results = await asyncio.gather(*[executor.run(_slow_inference(duration_s=0.3)) for _ in range(2)])
+    elapsed = time.perf_counter() - start
+    heartbeat.cancel()
+    executor.shutdown()
+
+    assert results == ["done", "done"]
+    assert elapsed < 0.3 * 2, "Expected both workers to run concurrently"
+    assert n_ticks > 10, f"Expected event loop to keep running during inference. Got {n_ticks} ticks"  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_queue_is_full() -> None:
+    executor = _executor(pool_size=1, queue_size=1)
+    running = asyncio.create_task(executor.run(_slow_inference(duration_s=0.5)))
+    await asyncio.sleep(0.05)
+    queued = asyncio.create_task(executor.run(_slow_inference(duration_s=0.01)))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(InferenceQueueFullError) as exc_info:
+        await executor.run(_slow_inference(duration_s=0.01))
+    assert exc_info.value.retry_after_s == executor.config.retry_after_s
+
+    assert await running == "done"
+    assert await queued == "done"
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_timeout_cancels_running_inference() -> None:
+    executor = _executor(pool_size=1)
+    start = time.perf_counter()
+    with pytest.raises(InferenceTimeoutError):
+        await executor.run(_slow_inference(duration_s=5), timeout=0.1)
+
+    # The cancelled job frees the worker right away for the next request
+    assert await executor.run(_slow_inference(duration_s=0.01)) == "done"
+    assert time.perf_counter() - start < 1
+    executor.shutdown()
+
+
+def _model(llm: LLMService, cancel_event: threading.Event) -> LLMService:
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_executor_swaps_reloaded_model_without_dropping_jobs() -> None:
+    executor = _executor(pool_size=1)
+    old_model = await executor.run(_model)
+    in_flight = asyncio.create_task(executor.run(_slow_inference(duration_s=0.5)))
+    await asyncio.sleep(0.05)
+    queued = asyncio.create_task(executor.run(_slow_inference(duration_s=0.01)))
+    await asyncio.sleep(0.01)
+
+    model_name = executor.registry.default_model_name
+    await asyncio.to_thread(executor.registry.reload, model_name)
+    swap = asyncio.create_task(asyncio.to_thread(executor.swap_workers, model_name))
+    await asyncio.sleep(0.01)
+
+    # New jobs are served by the new instance while the replaced one finishes its jobs
+    assert await executor.run(_model) is not old_model
+    assert not in_flight.done()
+    assert await in_flight == "done"
+    assert await queued == "done"
+    await swap
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_runs_job_submitted_while_workers_are_swapped() -> None:
+    executor = _executor(pool_size=1)
+    model_name = executor.registry.default_model_name
+    assert await executor.run(_slow_inference(duration_s=0), timeout=1) == "done"
+    old_queue = executor._models[model_name].queue
+    put_nowait = old_queue.put_nowait
+    swap = threading.Thread(target=executor.swap_workers, args=(model_name,))
+
+    def _put_nowait_during_swap(item: InferenceJob | None) -> None:
+        # The swap starts between picking the workers of the job and queueing it
+        swap.start()
+        swap.join(timeout=0.1)
+        put_nowait(item)
+
+    old_queue.put_nowait = _put_nowait_during_swap  # type: ignore[method-assign]
+    assert await executor.run(_slow_inference(duration_s=0), timeout=1) == "done"
+    swap.join()
+    executor.shutdown()
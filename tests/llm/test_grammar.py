@@ -0,0 +1,22 @@
+import threading
+
+from src.llm import get_llama_grammar, precompile_llama_grammars
+from src.models import DetectHateSpeechResult
+
+
+def test_llama_grammar_is_cached_per_thread() -> None:
+    precompile_llama_grammars(models=[DetectHateSpeechResult])
+    grammar = get_llama_grammar(model=DetectHateSpeechResult)
+    assert get_llama_grammar(model=DetectHateSpeechResult) is grammar
+
+    other_thread_grammars = []
+    thread = threading.Thread(
+        target=lambda: other_thread_grammars.append(get_llama_grammar(model=DetectHateSpeechResult))
+    )
+    thread.start()
+    thread.join()
+    other_thread_grammar = other_thread_grammars[0]
+
+    assert other_thread_grammar is not grammar
+    assert other_thread_grammar.grammar != grammar.grammar, "Expected threads to not share grammar state"
+    assert other_thread_grammar._grammar_rules is grammar._grammar_rules, "Expected threads to share parsed rules"
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.config import CONFIGS, InputPolicy, LLMInputConfig
+from src.llm import LLMRunParsedModel, LLMService
+from src.llm.input_guard import InputGuard, InputTooLongError, chunk_spans, guard_text
+from src.llm.registry import ModelRegistry
+from src.models import DetectHateSpeechResult
+
+LONG_TEXT = " ".join(f"word{i}" for i in range(20))
+
+
+class _FakeScheduler:
+    """Flags the texts containing `word12`, targeting their first word"""
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+        self.n_concurrent = self.max_concurrent = 0
+
+    async def submit(self, item: str, model_name: str | None = None) -> LLMRunParsedModel[DetectHateSpeechResult]:
+        self.texts.append(item)
+        self.n_concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.n_concurrent)
+        await asyncio.sleep(0.01)
+        self.n_concurrent -= 1
+        is_hate_speech = "word12" in item.split()
+        return LLMRunParsedModel[DetectHateSpeechResult](
+            prompt=item,
+            llm_model_name="fake",
+            success=True,
+            llm_model_configs={},
+            run_configs={},
+            completion_tokens=10,
+            parsed_output=DetectHateSpeechResult(
+                is_hate_speech=is_hate_speech,
+                target_of_hate=[item.split()[0]] if is_hate_speech else [],
+                reasoning=f"Reasoning of {item.split()[0]}",
+            ),
+        )
+
+
+def test_chunk_spans_cover_text_with_overlap() -> None:
+    assert chunk_spans(n_tokens=20, max_tokens=8, overlap=2) == [(0, 8), (6, 14), (12, 20)]
+    assert chunk_spans(n_tokens=9, max_tokens=8, overlap=0) == [(0, 8), (8, 9)]
+
+
+def test_guard_text_policies(stub_llm_service: LLMService) -> None:
+    config = LLMInputConfig(max_tokens=8, chunk_overlap_tokens=2, max_chunks=3)
+    assert guard_text(llm=stub_llm_service, text="a short text", config=config).texts == ["a short text"]
+
+    with pytest.raises(InputTooLongError):
+        guard_text(llm=stub_llm_service, text=LONG_TEXT, config=config, policy=InputPolicy.REJECT)
+
+    truncated = guard_text(llm=stub_llm_service, text=LONG_TEXT, config=config, policy=InputPolicy.TRUNCATE)
+    assert truncated.texts == [" ".join(LONG_TEXT.split()[:8])]
+    assert truncated.metadata == {"policy": "truncate", "n_tokens": 20, "token_spans": [(0, 8)]}
+
+    chunked = guard_text(llm=stub_llm_service, text=LONG_TEXT, config=config)
+    assert [text.split()[0] for text in chunked.texts] == ["word0", "word6", "word12"]
+
+    with pytest.raises(InputTooLongError):
+        guard_text(llm=stub_llm_service, text=LONG_TEXT, config=config.model_copy(update={"max_chunks": 2}))
+
+
+@pytest.mark.asyncio
+async def test_input_guard_combines_concurrent_chunks(stub_llm_service: LLMService) -> None:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=lambda _llm_config: stub_llm_service)
+    scheduler = _FakeScheduler()
+    config = LLMInputConfig(max_tokens=8, chunk_overlap_tokens=2)
+    guard = InputGuard(scheduler=scheduler, registry=registry, config=config)
+
+    llm_run = await guard.submit(LONG_TEXT)
+
+    assert scheduler.max_concurrent == 3  # noqa: PLR2004
+    assert llm_run.success
+    assert llm_run.prompt == LONG_TEXT
+    assert llm_run.completion_tokens == 30  # noqa: PLR2004
+    assert llm_run.run_metadata["input"]["token_spans"] == [(0, 8), (6, 14), (12, 20)]
+    assert llm_run.parsed_output == DetectHateSpeechResult(
+        is_hate_speech=True,
+        target_of_hate=["word6", "word12"],
+        reasoning="Chunk 2/3: Reasoning of word6\n\nChunk 3/3: Reasoning of word12",
+    )
+    assert guard.status()["chunked"] == 1
@@ -0,0 +1,106 @@
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+
+from src.batch import BatchDetector, iter_texts
+from src.config import CONFIGS, BatchConfig, PrefilterConfig, ResultCacheConfig
+from src.llm import LLMRunParsedModel, LLMService
+from src.llm.detect_hate_speech import PrefilterCascade, llm_detect_hate_speech, prefilter_decision
+from src.llm.prefilter import PREFILTER_MODEL_NAME, HashedNgramClassifier
+from src.models import DetectHateSpeechResult, DetectHateSpeechSQLModel
+from src.result_cache import DetectionResultCache
+
+HATEFUL_TEXTS = ["those vermin should be deported", "deport the vermin now", "vermin like them ruin everything"]
+BENIGN_TEXTS = ["what a lovely sunny day", "the concert was lovely", "have a lovely weekend everyone"]
+
+
+@pytest.fixture
+def prefilter_config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> PrefilterConfig:
+    prefilter = HashedNgramClassifier.fit(
+        texts=HATEFUL_TEXTS + BENIGN_TEXTS, labels=[True] * len(HATEFUL_TEXTS) + [False] * len(BENIGN_TEXTS)
+    )
+    prefilter.save(path=tmp_path / "prefilter.npz")
+    monkeypatch.setattr("src.llm.prefilter.MODEL_DIR_PATH", tmp_path)
+    config = PrefilterConfig(enabled=True, model_file="prefilter.npz", benign_below=0.2, hateful_above=0.8)
+    monkeypatch.setattr("src.llm.detect_hate_speech.CONFIGS.prefilter", config)
+    return config
+
+
+def test_hashed_ngram_classifier_round_trip(tmp_path: Path) -> None:
+    prefilter = HashedNgramClassifier.fit(texts=HATEFUL_TEXTS + BENIGN_TEXTS, labels=[True] * 3 + [False] * 3)
+    prefilter.save(path=tmp_path / "prefilter.npz")
+    loaded = HashedNgramClassifier.load(path=tmp_path / "prefilter.npz")
+
+    assert loaded.predict_proba("deport that vermin") > 0.5  # noqa: PLR2004
+    assert loaded.predict_proba("a lovely day") < 0.5  # noqa: PLR2004
+    assert loaded.predict_proba("unseen words") == pytest.approx(prefilter.predict_proba("unseen words"), rel=1e-6)
+
+
+def test_prefilter_decision_escalates_uncertain_scores() -> None:
+    config = PrefilterConfig(benign_below=0.1, hateful_above=0.9)
+    assert prefilter_decision(score=0.05, config=config) is False
+    assert prefilter_decision(score=0.5, config=config) is None
+    assert prefilter_decision(score=0.95, config=config) is True
+
+
+class _RecordingScheduler:
+    def __init__(self, llm: LLMService) -> None:
+        self.llm = llm
+        self.texts: list[str] = []
+
+    async def submit(self, item: str, model_name: str | None = None) -> LLMRunParsedModel[DetectHateSpeechResult]:
+        self.texts.append(item)
+        return llm_detect_hate_speech(llm=self.llm, text=item)
+
+
+@pytest.mark.asyncio
+async def test_cascade_submits_only_uncertain_texts(
+    stub_llm_service: LLMService, prefilter_config: PrefilterConfig
+) -> None:
+    scheduler = _RecordingScheduler(llm=stub_llm_service)
+    cascade = PrefilterCascade(scheduler=scheduler, output_model=DetectHateSpeechResult)
+    texts = ["deport the vermin", "some unrelated words", "a lovely day"]
+    llm_runs = [await cascade.submit(text) for text in texts]
+
+    assert scheduler.texts == ["some unrelated words"]
+    assert [llm_run.llm_model_name == PREFILTER_MODEL_NAME for llm_run in llm_runs] == [True, False, True]
+    assert [llm_run.prompt for llm_run in llm_runs][::2] == texts[::2]
+    assert llm_runs[0].parsed_output is not None
+    assert llm_runs[0].parsed_output.is_hate_speech
+    assert llm_runs[2].parsed_output is not None
+    assert not llm_runs[2].parsed_output.is_hate_speech
+
+
+@pytest.mark.asyncio
+async def test_prefiltered_results_are_not_cached(
+    stub_llm_service: LLMService,
+    prefilter_config: PrefilterConfig,
+    fake_session_factory: Callable,
+    committed_rows: list[list],
+) -> None:
+    result_cache = DetectionResultCache(config=ResultCacheConfig(db_lookup=False))
+    detector = BatchDetector(
+        scheduler=PrefilterCascade(
+            scheduler=_RecordingScheduler(llm=stub_llm_service), output_model=DetectHateSpeechResult
+        ),
+        result_cache=result_cache,
+        llm_config=CONFIGS.llm,
+        session_factory=fake_session_factory,
+        config=BatchConfig(),
+    )
+    _ = [line async for line in detector.stream(iter_texts(["deport the vermin", "some unrelated words"]))]
+
+    results = {
+        row.text: row for commit in committed_rows for row in commit if isinstance(row, DetectHateSpeechSQLModel)
+    }
+    assert results["deport the vermin"].cache_key is None
+    assert (cache_key := results["some unrelated words"].cache_key) is not None
+    assert result_cache.status()["size"] == 1
+    assert await result_cache.get(session=None, key=cache_key) is not None  # type: ignore[arg-type]
+
+
+def test_prefilter_config_requires_ordered_thresholds() -> None:
+    with pytest.raises(ValidationError):
+        PrefilterConfig(benign_below=0.6, hateful_above=0.4)
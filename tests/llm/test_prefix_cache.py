@@ -0,0 +1,25 @@
+from src.llm import LLMService
+from src.llm.prompts import PromptTemplate
+
+PROMPT = PromptTemplate(template="Some static instructions for the model to follow: {text}", input_keys=["text"])
+OTHER_PROMPT = PromptTemplate(template="Other instructions: {text}", input_keys=["text"])
+
+
+def test_prompt_prefix_is_evaluated_once(stub_llm_service: LLMService) -> None:
+    first_run = stub_llm_service.run_completion(prompt=PROMPT, prompt_inputs={"text": "first text"})
+    assert "prefix_eval_s" in first_run.run_metadata["prefix_cache"]
+
+    second_run = stub_llm_service.run_completion(prompt=PROMPT, prompt_inputs={"text": "second text"})
+    prefix_cache = second_run.run_metadata["prefix_cache"]
+    assert "prefix_eval_s" not in prefix_cache
+    assert prefix_cache["reused_prompt_tokens"] == prefix_cache["prefix_tokens"]
+
+
+def test_prompt_prefix_is_restored_after_other_prompt(stub_llm_service: LLMService) -> None:
+    stub_llm_service.run_completion(prompt=PROMPT, prompt_inputs={"text": "first text"})
+    stub_llm_service.run_completion(prompt=OTHER_PROMPT, prompt_inputs={"text": "first text"})
+
+    llm_run = stub_llm_service.run_completion(prompt=PROMPT, prompt_inputs={"text": "second text"})
+    prefix_cache = llm_run.run_metadata["prefix_cache"]
+    assert prefix_cache["restored"]
+    assert prefix_cache["reused_prompt_tokens"] == prefix_cache["prefix_tokens"]
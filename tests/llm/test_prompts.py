@@ -15,3 +15,9 @@ def test_prompt_format_missing_input() -> None:
     text = "Some text"
     with pytest.raises(KeyError):
         SAMPLE_PROMPT.format_inputs(inputs={"textt": text})
+
+
+def test_prompt_static_prefix() -> None:
+    prompt = PromptTemplate(template="Some {{text}}: {text} and {other}", input_keys=["text", "other"])
+    assert prompt.static_prefix == "Some {text}: "
+    assert prompt.format_inputs(inputs={"text": "a", "other": "b"}).startswith(prompt.static_prefix)
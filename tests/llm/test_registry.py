@@ -0,0 +1,92 @@
+import pytest
+
+from src.config import CONFIGS, LLMConfig, LLMPoolConfig
+from src.llm.registry import LLMPoolExhaustedError, LLMServicePool, ModelRegistry
+
+
+class _FakeFactory:
+    def __init__(self) -> None:
+        self.n_calls = 0
+
+    def __call__(self, llm_config: LLMConfig) -> object:
+        self.n_calls += 1
+        return object()
+
+
+def _llm_config(size: int, preload: bool = True) -> LLMConfig:
+    return CONFIGS.llm.model_copy(update={"pool": LLMPoolConfig(size=size, preload=preload)})
+
+
+def test_pool_loads_each_instance_once() -> None:
+    factory = _FakeFactory()
+    pool_size = 2
+    pool = LLMServicePool(llm_config=_llm_config(size=pool_size), factory=factory)  # type: ignore[arg-type]
+    pool.load()
+    assert pool.is_ready
+    for _ in range(5):
+        with pool.acquire():
+            pass
+    pool.load()
+    assert factory.n_calls == pool_size
+
+
+def test_pool_lazily_loads_up_to_size() -> None:
+    factory = _FakeFactory()
+    pool_size = 2
+    pool = LLMServicePool(
+        llm_config=_llm_config(size=pool_size, preload=False), factory=factory  # type: ignore[arg-type]
+    )
+    assert factory.n_calls == 0
+    with pool.acquire() as first, pool.acquire() as second:
+        assert first is not second
+        with pytest.raises(LLMPoolExhaustedError), pool.acquire(timeout=0.01):
+            pass
+    assert factory.n_calls == pool_size
+
+
+def test_pool_tokenizer_loads_vocabulary_without_checking_out_an_instance() -> None:
+    llm_configs: list[LLMConfig] = []
+
+    def _factory(llm_config: LLMConfig) -> object:
+        llm_configs.append(llm_config)
+        return object()
+
+    pool = LLMServicePool(llm_config=_llm_config(size=1, preload=False), factory=_factory)  # type: ignore[arg-type]
+    with pool.acquire() as instance:
+        tokenizer = pool.tokenizer()
+    assert tokenizer is instance
+
+    lazy_pool = LLMServicePool(llm_config=_llm_config(size=1, preload=False), factory=_factory)  # type: ignore[arg-type]
+    tokenizer = lazy_pool.tokenizer()
+    assert lazy_pool.tokenizer() is tokenizer
+    assert lazy_pool.n_loaded == 0
+    assert llm_configs[-1].model_configs["vocab_only"] is True
+    with lazy_pool.acquire() as instance:
+        assert instance is not tokenizer
+
+
+def test_registry_readiness_ignores_lazy_pools() -> None:
+    registry = ModelRegistry(
+        llm_configs=[_llm_config(size=1, preload=False)], factory=_FakeFactory()  # type: ignore[arg-type]
+    )
+    registry.preload()
+    assert registry.is_ready
+    assert registry.status()[CONFIGS.llm.model_name]["loaded"] == 0
+
+
+class _FakeService:
+    def __init__(self, llm_config: LLMConfig) -> None:
+        self.n_threads = llm_config.model_configs.get("n_threads")
+
+    def set_n_threads(self, n_threads: int, n_threads_batch: int) -> None:
+        self.n_threads = n_threads
+
+
+def test_pool_splits_threads_between_workers() -> None:
+    llm_config = _llm_config(size=1).model_copy(update={"model_configs": {"n_threads": 16, "n_threads_batch": 16}})
+    pool = LLMServicePool(llm_config=llm_config, factory=_FakeService)  # type: ignore[arg-type]
+    pool.load()
+    pool.split_n_threads(n_workers=3)
+    with pool.acquire() as service:
+        assert service.n_threads == 5  # type: ignore[attr-defined]  # noqa: PLR2004
+    assert pool.llm_config.model_configs == {"n_threads": 5, "n_threads_batch": 5}
@@ -0,0 +1,45 @@
+import pytest
+
+from src.config import CONFIGS, LLMModelConfig, LLMRoutingConfig
+from src.llm.registry import ModelRegistry, model_llm_configs
+from src.llm.routing import ModelRouter, ModelRoutingError
+
+_OTHER_MODEL = "phi-2.Q4_K_M.gguf"
+
+
+def _registry() -> ModelRegistry:
+    llm_config = CONFIGS.llm.model_copy(
+        update={"models": [LLMModelConfig(model_name=_OTHER_MODEL, model_configs={"n_ctx": 1024})]}
+    )
+    return ModelRegistry(llm_configs=model_llm_configs(llm_config), factory=lambda _llm_config: object())  # type: ignore[arg-type, return-value]
+
+
+def test_additional_models_override_default_configs() -> None:
+    default_config, other_config = model_llm_configs(
+        CONFIGS.llm.model_copy(update={"models": [LLMModelConfig(model_name=_OTHER_MODEL, run_configs={"seed": 1})]})
+    )
+    assert default_config.model_name == CONFIGS.llm.model_name
+    assert other_config.model_name == _OTHER_MODEL
+    assert other_config.model_configs == default_config.model_configs
+    assert other_config.run_configs == {**default_config.run_configs, "seed": 1}
+
+
+def test_router_splits_texts_stickily() -> None:
+    router = ModelRouter(registry=_registry(), config=LLMRoutingConfig(split={_OTHER_MODEL: 30}))
+    texts = [f"text {idx}" for idx in range(1000)]
+    routes = [router.route(key=text) for text in texts]
+    assert routes == [router.route(key=text) for text in texts]
+    assert 250 < routes.count(_OTHER_MODEL) < 350  # noqa: PLR2004
+    assert set(routes) == {CONFIGS.llm.model_name, _OTHER_MODEL}
+
+
+def test_router_overrides() -> None:
+    router = ModelRouter(registry=_registry(), config=LLMRoutingConfig(split={_OTHER_MODEL: 100}))
+    assert router.route(key="text", model_name=CONFIGS.llm.model_name) == CONFIGS.llm.model_name
+    with pytest.raises(ModelRoutingError):
+        router.route(key="text", model_name="unknown.gguf")
+    router = ModelRouter(registry=_registry(), config=LLMRoutingConfig(allow_override=False))
+    with pytest.raises(ModelRoutingError):
+        router.route(key="text", model_name=_OTHER_MODEL)
+    with pytest.raises(ValueError, match="sum up to 100"):
+        ModelRouter(registry=_registry(), config=LLMRoutingConfig(split={_OTHER_MODEL: 60, CONFIGS.llm.model_name: 50}))
@@ -0,0 +1,47 @@
+from typing import Any
+
+import pytest
+
+from benchmarks.stub import StubLlama, patch_llama
+from src.llm import LLMService
+from src.llm.detect_hate_speech import llm_detect_hate_speech
+
+
+class _TimedStubLlama(StubLlama):
+    load_delay_s = 0.0
+    prompt_token_delay_s = 0.0001
+    token_delay_s = 0.0002
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_run_records_stage_timings_and_tokens(streamed: bool) -> None:
+    with patch_llama(stub_cls=_TimedStubLlama):
+        llm_run = llm_detect_hate_speech(
+            llm=LLMService(), text="Some text", on_text=(lambda _delta: None) if streamed else None
+        )
+
+    assert llm_run.success
+    assert llm_run.grammar_s is not None
+    assert llm_run.parse_s is not None
+    assert llm_run.prompt_tokens == llm_run.llm_outputs["usage"]["prompt_tokens"]  # type: ignore[index]
+    assert llm_run.completion_tokens == llm_run.llm_outputs["usage"]["completion_tokens"]  # type: ignore[index]
+    # The static prompt prefix is evaluated before the run, only the rest of the prompt is evaluated during it
+    assert 0 < llm_run.prompt_eval_s < llm_run.prompt_tokens * _TimedStubLlama.prompt_token_delay_s  # type: ignore
+    assert llm_run.generation_s == pytest.approx(llm_run.completion_tokens * _TimedStubLlama.token_delay_s)
+    assert llm_run.tokens_per_s == pytest.approx(1 / _TimedStubLlama.token_delay_s)
+
+
+class _EmptyStreamStubLlama(StubLlama):
+    load_delay_s = 0.0
+
+    def create_completion(self, prompt: str, max_tokens: int | None = 16, stream: bool = False, **kwargs: Any) -> Any:
+        return iter([]) if stream else super().create_completion(prompt, max_tokens=max_tokens, **kwargs)
+
+
+def test_streamed_run_without_any_chunk_fails() -> None:
+    with patch_llama(stub_cls=_EmptyStreamStubLlama):
+        llm_run = llm_detect_hate_speech(llm=LLMService(), text="Some text", on_text=lambda _delta: None)
+
+    assert not llm_run.success
+    assert llm_run.error is not None
+    assert "without any chunk" in llm_run.error
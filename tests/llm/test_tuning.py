@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+
+from src.llm import LLMError, _cap_max_tokens, tuning
+from src.llm.tuning import read_calibration, resolve_model_configs, write_calibration
+
+
+def test_available_cpus_within_cgroup_quota(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    cpu_max = tmp_path / "cpu.max"
+    monkeypatch.setattr(tuning, "_CGROUP_V2_CPU_MAX_PATH", cpu_max)
+    monkeypatch.setattr(tuning.os, "sched_getaffinity", lambda _pid: set(range(8)))
+    cpu_max.write_text("max 100000\n")
+    assert tuning.available_cpus() == 8  # noqa: PLR2004
+    cpu_max.write_text("250000 100000\n")
+    assert tuning.available_cpus() == 3  # noqa: PLR2004
+
+
+def test_auto_model_configs(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(tuning, "available_cpus", lambda: 8)
+    monkeypatch.setattr(tuning, "_is_smt_active", lambda: True)
+    model_configs = {"n_ctx": 256, "n_threads": "auto", "n_threads_batch": "auto", "n_batch": "auto"}
+    assert resolve_model_configs(model_name="model.gguf", model_configs=model_configs) == {
+        "n_ctx": 256,
+        "n_threads": 4,
+        "n_threads_batch": 8,
+        "n_batch": 256,
+    }
+    assert resolve_model_configs(model_name="model.gguf", model_configs={"n_threads": 2}) == {"n_threads": 2}
+
+    path = tmp_path / "calibration.json"
+    write_calibration(model_name="model.gguf", n_cpus=8, model_configs={"n_threads": 6}, path=path)
+    assert read_calibration(model_name="model.gguf", n_cpus=8, path=path) == {"n_threads": 6}
+    assert read_calibration(model_name="model.gguf", n_cpus=4, path=path) == {}
+
+
+def test_max_tokens_capped_to_context() -> None:
+    assert _cap_max_tokens(max_tokens=2048, n_ctx=2048, n_prompt_tokens=300) == 1748  # noqa: PLR2004
+    assert _cap_max_tokens(max_tokens=64, n_ctx=2048, n_prompt_tokens=300) == 64  # noqa: PLR2004
+    assert _cap_max_tokens(max_tokens=None, n_ctx=2048, n_prompt_tokens=300) == 1748  # noqa: PLR2004
+    with pytest.raises(LLMError):
+        _cap_max_tokens(max_tokens=64, n_ctx=2048, n_prompt_tokens=2048)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Callable
+
+import httpx
+import pytest
+
+from src.app import PATHS, app, get_batch_detector
+from src.batch import NDJSON_MEDIA_TYPE, BatchDetectionItem, BatchDetector, iter_ndjson_texts
+from src.config import CONFIGS, BatchConfig, LLMBatchingConfig, ResultCacheConfig
+from src.llm import LLMService
+from src.llm.batching import BatchScheduler
+from src.llm.detect_hate_speech import llm_detect_hate_speech_batch
+from src.llm.executor import InferenceExecutor
+from src.llm.registry import ModelRegistry
+from src.models import DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.result_cache import DetectionResultCache
+
+
+async def _chunks(data: bytes, chunk_size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_batch_detector_streams_results_and_bulk_inserts(
+    stub_llm_service: LLMService, fake_session_factory: Callable, committed_rows: list[list]
+) -> None:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=lambda _llm_config: stub_llm_service)
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    scheduler = BatchScheduler(
+        executor=executor,
+        batch_fn=llm_detect_hate_speech_batch,
+        config=LLMBatchingConfig(enabled=True, max_batch_size=4, max_wait_ms=10),
+    )
+    result_cache = DetectionResultCache(config=ResultCacheConfig(db_lookup=False))
+    detector = BatchDetector(
+        scheduler=scheduler,
+        result_cache=result_cache,
+        llm_config=CONFIGS.llm,
+        session_factory=fake_session_factory,
+        config=BatchConfig(max_in_flight=2, write_chunk_size=4),
+    )
+    upload = b'{"text": "first"}\n{"text": "second"}\nnot json\n{"text": "first"}\n{"text": "third"}'
+    texts = iter_ndjson_texts(_chunks(upload, chunk_size=7))
+
+    lines = [line async for line in detector.stream(texts)]
+    executor.shutdown()
+
+    items = sorted((BatchDetectionItem.model_validate(json.loads(line)) for line in lines), key=lambda i: i.index)
+    assert [item.index for item in items] == [0, 1, 2, 3, 4]
+    assert items[2].error is not None
+    assert all(item.result is not None for item in items if item.index != 2)  # noqa: PLR2004
+
+    rows = [row for commit in committed_rows for row in commit]
+    assert sum(isinstance(row, LLMRunSQLModel) for row in rows) == 4  # noqa: PLR2004
+    assert sum(isinstance(row, DetectHateSpeechSQLModel) for row in rows) == 4  # noqa: PLR2004
+    assert len(committed_rows) > 1, "Expected rows to be inserted in chunks"
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_detects_ndjson_upload(
+    stub_llm_service: LLMService, fake_session_factory: Callable
+) -> None:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=lambda _llm_config: stub_llm_service)
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    scheduler = BatchScheduler(
+        executor=executor, batch_fn=llm_detect_hate_speech_batch, config=LLMBatchingConfig(enabled=False)
+    )
+    detector = BatchDetector(
+        scheduler=scheduler,
+        result_cache=DetectionResultCache(config=ResultCacheConfig(db_lookup=False)),
+        llm_config=CONFIGS.llm,
+        session_factory=fake_session_factory,
+        config=BatchConfig(),
+    )
+    overrides = app.dependency_overrides
+    app.dependency_overrides = {**overrides, get_batch_detector: lambda: detector}
+    # httpx types the ASGI scope and messages as `dict`s, Starlette as `MutableMapping`s
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await asyncio.wait_for(
+                client.post(
+                    PATHS.detect_hate_speech_batch,
+                    content=b'{"text": "first"}\nnot json\n{"text": "second"}\n',
+                    headers={"content-type": NDJSON_MEDIA_TYPE},
+                ),
+                timeout=10,
+            )
+    finally:
+        app.dependency_overrides = overrides
+        executor.shutdown()
+
+    items = sorted(
+        (BatchDetectionItem.model_validate_json(line) for line in resp.text.splitlines()), key=lambda i: i.index
+    )
+    assert [item.index for item in items] == [0, 1, 2]
+    assert items[1].error is not None
+    assert items[0].result is not None and items[2].result is not None
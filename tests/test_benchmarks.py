@@ -0,0 +1,19 @@
+from benchmarks.suite import compare_reports, flatten_metrics
+
+
+def test_flatten_metrics_keeps_latencies_and_throughputs() -> None:
+    report = {
+        "commit": "abc",
+        "stub": True,
+        "http_load": {"throughput_rps": 10, "latency": {"count": 5, "p50_ms": 2.0}},
+    }
+    assert flatten_metrics(report) == {"http_load.throughput_rps": 10.0, "http_load.latency.p50_ms": 2.0}
+
+
+def test_compare_reports_flags_slower_latency_and_lower_throughput() -> None:
+    base = {"latency": {"p50_ms": 100.0, "p95_ms": 200.0}, "throughput_rps": 10.0, "tokens_per_s": 50.0}
+    head = {"latency": {"p50_ms": 150.0, "p95_ms": 150.0}, "throughput_rps": 5.0, "tokens_per_s": 60.0}
+    regressions = {
+        change["metric"] for change in compare_reports(base=base, head=head, threshold=0.1) if change["regression"]
+    }
+    assert regressions == {"latency.p50_ms", "throughput_rps"}
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy.pool import NullPool, QueuePool
+
+from src.config import CONFIGS
+from src.db import (
+    async_session_factory,
+    create_async_engine_from_config,
+    dispose_async_engine,
+    get_async_engine,
+    init_async_engine,
+    json_skip_non_serializable_serializer,
+    pool_status,
+)
+
+
+def test_json_serializer_names_non_serializable_values() -> None:
+    obj = {"b": object(), "a": {1: "one"}}
+    assert json_skip_non_serializable_serializer(obj, sort_keys=True) == '{"a":{"1":"one"},"b":"object"}'
+
+
+def test_create_async_engine_from_config() -> None:
+    config = CONFIGS.db.model_copy(update={"pool_size": 3, "max_overflow": 2, "pool_recycle_s": 60})
+    pool = create_async_engine_from_config(config).pool
+    assert isinstance(pool, QueuePool)
+    assert pool.size() == 3  # noqa: PLR2004
+    assert pool._max_overflow == 2  # noqa: PLR2004
+    assert pool._recycle == 60  # noqa: PLR2004
+
+    assert isinstance(create_async_engine_from_config(config, poolclass=NullPool).pool, NullPool)
+
+
+@pytest.mark.asyncio
+async def test_init_and_dispose_async_engine() -> None:
+    assert pool_status() == {}
+    engine = init_async_engine()
+    assert init_async_engine() is engine
+    assert async_session_factory.kw["bind"] is engine
+    assert pool_status() == {"size": CONFIGS.db.pool_size, "checked_out": 0, "idle": 0, "overflow": 0}
+
+    await dispose_async_engine()
+    assert get_async_engine() is None
+    assert pool_status() == {}
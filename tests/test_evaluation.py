@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from tests.evaluation import EvaluationRecord, load_checkpoint, run_evaluation, select_cases
+
+
+def test_load_checkpoint_keeps_latest_record_and_skips_truncated_line(tmp_path: Path) -> None:
+    checkpoint = tmp_path / "checkpoint.ndjson"
+    failed = EvaluationRecord(case_idx=1, is_hate_speech=True, error="Failed", latency_s=0.1)
+    retried = EvaluationRecord(case_idx=1, is_hate_speech=True, predicted=True, latency_s=0.2)
+    checkpoint.write_text(f"{failed.model_dump_json()}\n{retried.model_dump_json()}\n" + '{"case_idx": 2, "is_h')
+
+    assert load_checkpoint(path=checkpoint) == {1: retried}
+
+
+def test_select_cases_samples_reproducibly() -> None:
+    assert select_cases(n_cases=5, sample=None, seed=0) == [0, 1, 2, 3, 4]
+    assert select_cases(n_cases=100, sample=10, seed=1) == select_cases(n_cases=100, sample=10, seed=1)
+    assert len(set(select_cases(n_cases=100, sample=10, seed=1))) == 10  # noqa: PLR2004
+
+
+def test_run_evaluation_resumes_from_checkpoint(tmp_path: Path) -> None:
+    checkpoint = tmp_path / "checkpoint.ndjson"
+    first = run_evaluation(checkpoint=checkpoint, n_workers=1, sample=3, stub=True)
+    resumed = run_evaluation(checkpoint=checkpoint, n_workers=1, sample=4, stub=True)
+
+    assert first["throughput"]["n_cases"] == 3  # noqa: PLR2004
+    assert resumed["throughput"]["n_cases"] == 1
+    assert resumed["accuracy"]["n_cases"] == 4  # noqa: PLR2004
+    assert len(checkpoint.read_text().splitlines()) == 4  # noqa: PLR2004
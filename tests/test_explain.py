@@ -0,0 +1,82 @@
+import uuid
+from collections.abc import Callable
+
+import pytest
+
+from src.config import CONFIGS, LLMModelConfig, ResultCacheConfig
+from src.explain import DetectionExplainer
+from src.llm import LLMService
+from src.llm.detect_hate_speech import PREFILTER_MODEL_NAME
+from src.llm.executor import InferenceExecutor
+from src.llm.registry import ModelRegistry, model_llm_configs
+from src.models import DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.result_cache import DetectionResultCache
+
+_OTHER_MODEL = "phi-2.Q4_K_M.gguf"
+
+
+@pytest.mark.asyncio
+async def test_detection_explainer_fills_missing_reasoning(
+    stub_llm_service: LLMService, fake_session_factory: Callable, committed_rows: list[list]
+) -> None:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=lambda _llm_config: stub_llm_service)
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    result_cache = DetectionResultCache(config=ResultCacheConfig(db_lookup=False))
+    explainer = DetectionExplainer(executor=executor, result_cache=result_cache, session_factory=fake_session_factory)
+    verdict_res = DetectHateSpeechSQLModel(
+        text="Some text", is_hate_speech=True, target_of_hate=["Someone"], llm_run_id=uuid.uuid4(), cache_key="key"
+    )
+    committed_rows.append([verdict_res])
+
+    explained = await explainer.explain(result_id=verdict_res.uuid)
+    executor.shutdown()
+
+    assert explained is not None
+    assert explained.reasoning
+    llm_run_sql, updated_res = committed_rows[-1]
+    assert isinstance(llm_run_sql, LLMRunSQLModel)
+    assert llm_run_sql.prompt is not None
+    assert "a hate speech targeting Someone" in llm_run_sql.prompt
+    assert updated_res is verdict_res
+    assert (cached := await result_cache.get(session=None, key="key")) is not None  # type: ignore[arg-type]
+    assert cached.reasoning == explained.reasoning
+    assert await explainer.explain(result_id=uuid.uuid4()) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("verdict_model_name", "explain_model_name"),
+    [
+        (_OTHER_MODEL, _OTHER_MODEL),
+        (PREFILTER_MODEL_NAME, CONFIGS.llm.model_name),
+        ("unregistered.gguf", CONFIGS.llm.model_name),
+    ],
+)
+async def test_detection_explainer_uses_the_model_of_the_verdict(
+    verdict_model_name: str,
+    explain_model_name: str,
+    stub_llm_service: LLMService,
+    fake_session_factory: Callable,
+    committed_rows: list[list],
+) -> None:
+    # `stub_llm_service` keeps llama.cpp patched with the stub, for the services created by the registry
+    _ = stub_llm_service
+    llm_config = CONFIGS.llm.model_copy(update={"models": [LLMModelConfig(model_name=_OTHER_MODEL)]})
+    registry = ModelRegistry(llm_configs=model_llm_configs(llm_config), factory=LLMService)
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    explainer = DetectionExplainer(
+        executor=executor,
+        result_cache=DetectionResultCache(config=ResultCacheConfig(db_lookup=False)),
+        session_factory=fake_session_factory,
+    )
+    verdict_run = LLMRunSQLModel(llm_model_name=verdict_model_name, success=True, llm_model_configs={}, run_configs={})
+    verdict_res = DetectHateSpeechSQLModel(
+        text="Some text", is_hate_speech=False, target_of_hate=[], llm_run_id=verdict_run.uuid
+    )
+    committed_rows.append([verdict_run, verdict_res])
+
+    await explainer.explain(result_id=verdict_res.uuid)
+    executor.shutdown()
+
+    llm_run_sql, _updated_res = committed_rows[-1]
+    assert llm_run_sql.llm_model_name == explain_model_name
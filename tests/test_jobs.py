@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from src.config import CONFIGS, JobsConfig, ResultCacheConfig
+from src.jobs import JobSourceError, JobWorker, create_job, job_progress, read_job_items, resolve_job_source
+from src.models import DetectionJobItemSQLModel, DetectionJobSQLModel, JobItemStatus
+from src.result_cache import DetectionResultCache
+
+
+def test_resolve_job_source_rejects_paths_outside_input_dir(tmp_path: Path) -> None:
+    (tmp_path / "texts.ndjson").write_text('{"text": "Some text"}\n')
+    assert resolve_job_source(source="texts.ndjson", input_dir=tmp_path) == tmp_path / "texts.ndjson"
+    with pytest.raises(JobSourceError):
+        resolve_job_source(source="../texts.ndjson", input_dir=tmp_path / "jobs")
+    with pytest.raises(JobSourceError):
+        resolve_job_source(source="missing.ndjson", input_dir=tmp_path)
+
+
+def test_read_job_items(tmp_path: Path) -> None:
+    path = tmp_path / "texts.ndjson.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(b'{"text": "first"}\n\nnot json\n{"text": "second"}\n')
+    rows = read_job_items(path=path, job_id=uuid.uuid4(), llm_config=CONFIGS.llm)
+
+    assert [row["position"] for row in rows] == [0, 1, 2]
+    assert [row["status"] for row in rows] == [JobItemStatus.PENDING, JobItemStatus.FAILED, JobItemStatus.PENDING]
+    assert rows[0]["cache_key"] != rows[2]["cache_key"]
+
+
+def test_job_progress() -> None:
+    started_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    job = DetectionJobSQLModel(source="texts.ndjson", n_items=100, created_at=started_at, started_at=started_at)
+    progress = job_progress(
+        job=job, counts={"DONE": 40, "FAILED": 10, "RUNNING": 8}, last_finished_at=started_at + timedelta(seconds=10)
+    )
+
+    assert progress.status == JobItemStatus.RUNNING
+    assert progress.remaining == 50  # noqa: PLR2004
+    assert progress.throughput_per_s == 5  # noqa: PLR2004
+    assert progress.eta_s == 10  # noqa: PLR2004
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_job_workers_claim_disjoint_items(db_engine: AsyncEngine, tmp_path: Path) -> None:
+    (tmp_path / "texts.ndjson").write_text("".join(f'{{"text": "text {idx}"}}\n' for idx in range(10)))
+    session_factory = async_sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    config = JobsConfig(input_dir=tmp_path, claim_size=4)
+    async with session_factory() as session:
+        job = await create_job(session=session, source="texts.ndjson", llm_config=CONFIGS.llm, config=config)
+
+    workers = [
+        JobWorker(
+            scheduler=None,  # type: ignore[arg-type]
+            result_cache=DetectionResultCache(config=ResultCacheConfig()),
+            session_factory=session_factory,
+            config=config,
+        )
+        for _ in range(3)
+    ]
+
+    async def _claim(worker: JobWorker) -> list:
+        async with session_factory() as session:
+            return [item for item in await worker._claim(session=session) if item.job_id == job.uuid]
+
+    claims = await asyncio.gather(*[_claim(worker) for worker in workers])
+    claimed_ids = [item.uuid for items in claims for item in items]
+    assert len(claimed_ids) == len(set(claimed_ids)), "Expected workers to never claim the same item"
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_job_worker_fails_items_abandoned_on_every_attempt(db_engine: AsyncEngine, tmp_path: Path) -> None:
+    (tmp_path / "texts.ndjson").write_text("".join(f'{{"text": "text {idx}"}}\n' for idx in range(4)))
+    session_factory = async_sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    config = JobsConfig(input_dir=tmp_path, claim_size=10, lease_s=60, max_attempts=2)
+    async with session_factory() as session:
+        job = await create_job(session=session, source="texts.ndjson", llm_config=CONFIGS.llm, config=config)
+        # Claimed by workers which died before finishing them, positions 0 and 1 on their last allowed attempt
+        for position, attempts in enumerate([2, 2, 1, 1]):
+            await session.execute(
+                update(DetectionJobItemSQLModel)
+                .where(
+                    col(DetectionJobItemSQLModel.job_id) == job.uuid,
+                    col(DetectionJobItemSQLModel.position) == position,
+                )
+                .values(
+                    status=JobItemStatus.RUNNING.value,
+                    claimed_at=datetime.now(tz=timezone.utc) - timedelta(seconds=120),
+                    attempts=attempts,
+                )
+            )
+        await session.commit()
+
+    worker = JobWorker(
+        scheduler=None,  # type: ignore[arg-type]
+        result_cache=DetectionResultCache(config=ResultCacheConfig()),
+        session_factory=session_factory,
+        config=config,
+    )
+    async with session_factory() as session:
+        claimed = [item for item in await worker._claim(session=session) if item.job_id == job.uuid]
+    async with session_factory() as session:
+        stmt = select(DetectionJobItemSQLModel).where(col(DetectionJobItemSQLModel.job_id) == job.uuid)
+        items = {item.position: item for item in (await session.execute(stmt)).scalars()}
+
+    assert sorted(item.position for item in claimed) == [2, 3]
+    assert [items[position].status for position in range(4)] == [
+        JobItemStatus.FAILED,
+        JobItemStatus.FAILED,
+        JobItemStatus.RUNNING,
+        JobItemStatus.RUNNING,
+    ]
+    assert [items[position].attempts for position in range(4)] == [2, 2, 2, 2]
@@ -0,0 +1,66 @@
+import httpx
+import pytest
+
+from src.app import PATHS, app
+from src.metrics import (
+    LLM_GENERATION_SECONDS,
+    LLM_RUNS,
+    LLM_TOKENS,
+    METRICS_MEDIA_TYPE,
+    MetricsRegistry,
+    record_llm_run,
+)
+from src.models import LLMRun
+
+
+def test_metrics_render_prometheus_text_format() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["path"])
+    histogram = registry.histogram("duration_seconds", "Durations", ["path"], buckets=[0.1, 1])
+    registry.callback("queue_depth", "Queue depth", lambda: {(): 3})
+    counter.inc("/a")
+    counter.inc("/a", value=2)
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{path="/a"} 3.0' in lines
+    assert 'duration_seconds_bucket{path="/a",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{path="/a",le="1.0"} 2' in lines
+    assert 'duration_seconds_bucket{path="/a",le="+Inf"} 3' in lines
+    assert 'duration_seconds_sum{path="/a"} 5.55' in lines
+    assert 'duration_seconds_count{path="/a"} 3' in lines
+    assert "queue_depth 3.0" in lines
+
+
+def test_record_llm_run_counts_tokens_and_stages() -> None:
+    llm_run = LLMRun(
+        prompt="prompt",
+        llm_model_name="metrics-test-model",
+        success=True,
+        llm_model_configs={},
+        run_configs={},
+        prompt_eval_s=0.2,
+        generation_s=0.5,
+        completion_tokens=10,
+    )
+    record_llm_run(llm_run=llm_run)
+
+    assert LLM_RUNS.get("metrics-test-model", "success") == 1
+    assert LLM_TOKENS.get("metrics-test-model", "completion") == 10  # noqa: PLR2004
+    assert LLM_GENERATION_SECONDS.get("metrics-test-model") == 0.5  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_counts_requests_per_route() -> None:
+    # httpx types the ASGI scope and messages as `dict`s, Starlette as `MutableMapping`s
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get(PATHS.metrics)
+        resp = await client.get(PATHS.metrics)
+
+    assert resp.headers["content-type"].startswith(METRICS_MEDIA_TYPE)
+    assert 'http_requests_total{method="GET",path="/metrics",status="200"}' in resp.text
+    assert "inference_queue_depth 0" in resp.text
@@ -0,0 +1,75 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.models import DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.partitions import (
+    add_months,
+    create_month_partition,
+    create_partition_sql,
+    expired_partitions,
+    list_partitions,
+    partition_month,
+)
+
+
+def test_partitions_are_monthly() -> None:
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert create_partition_sql("llm_run", date(2026, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS llm_run_p2026_12 PARTITION OF llm_run "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+    )
+    assert partition_month("detect_hate_speech_result_p2026_03") == date(2026, 3, 1)
+    assert partition_month("llm_run_default") is None
+    assert partition_month("llm_config") is None
+
+
+def test_expired_partitions() -> None:
+    names = ["llm_run_default", "llm_run_p2026_03", "llm_run_p2026_04", "llm_run_p2026_10"]
+    assert expired_partitions(names, retention_months=6, today=date(2026, 10, 18)) == ["llm_run_p2026_03"]
+    assert expired_partitions(names, retention_months=1, today=date(2026, 10, 18)) == [
+        "llm_run_p2026_03",
+        "llm_run_p2026_04",
+    ]
+
+
+def test_partitioned_models_are_identified_by_uuid() -> None:
+    for model in [LLMRunSQLModel, DetectHateSpeechSQLModel]:
+        assert set(model.__table__.primary_key.columns.keys()) == {"uuid", "created_at"}  # type: ignore[attr-defined]
+        assert [column.name for column in inspect(model).primary_key] == ["uuid"]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_month_partition_takes_its_rows_from_the_default_partition(db_engine: AsyncEngine) -> None:
+    session_factory = async_sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    # Months far ahead of the premade partitions, so that their rows are in the default partition
+    in_month, next_month = (
+        LLMRunSQLModel(llm_model_name="model", success=True, created_at=datetime(2099, month, 15, tzinfo=timezone.utc))
+        for month in [1, 2]
+    )
+    async with session_factory() as session:
+        session.add_all([in_month, next_month])
+        await session.commit()
+        try:
+            await create_month_partition(session=session, table="llm_run", month=date(2099, 1, 1))
+            await session.commit()
+
+            rows = await session.execute(
+                text("SELECT uuid, tableoid::regclass::text FROM llm_run WHERE uuid = ANY(:uuids)"),
+                {"uuids": [in_month.uuid, next_month.uuid]},
+            )
+            assert dict(rows.tuples().all()) == {in_month.uuid: "llm_run_p2099_01", next_month.uuid: "llm_run_default"}
+            assert {"llm_run_p2099_01", "llm_run_default"} <= set(
+                await list_partitions(session=session, table="llm_run")
+            )
+        finally:
+            await session.rollback()
+            await session.execute(
+                text("DELETE FROM llm_run WHERE uuid = ANY(:uuids)"), {"uuids": [in_month.uuid, next_month.uuid]}
+            )
+            await session.execute(text("DROP TABLE IF EXISTS llm_run_p2099_01"))
+            await session.commit()
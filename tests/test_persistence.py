@@ -0,0 +1,168 @@
+import asyncio
+from collections.abc import Callable
+
+import pytest
+
+from src.backfill import find_prompt_template
+from src.config import PersistenceConfig
+from src.llm.prompts import HATE_SPEECH_REASONING_PROMPT, INPUT_TEXT_KEY, INPUT_VERDICT_KEY
+from src.models import DetectHateSpeechSQLModel, LLMConfigSQLModel, LLMRunSQLModel
+from src.persistence import DetectionPersister, compact_llm_run, expand_llm_run
+from tests.conftest import FakeAsyncSession
+
+
+def _detection_rows(text: str) -> list:
+    llm_run = LLMRunSQLModel(prompt=text, llm_model_name="model", success=True, llm_model_configs={}, run_configs={})
+    detect_res = DetectHateSpeechSQLModel(
+        text=text, llm_run_id=llm_run.uuid, is_hate_speech=False, target_of_hate=[], reasoning="Reasoning"
+    )
+    return [llm_run, detect_res]
+
+
+@pytest.mark.asyncio
+async def test_save_writes_run_and_result_in_one_transaction(
+    fake_session_factory: Callable, committed_rows: list[list]
+) -> None:
+    persister = DetectionPersister(session_factory=fake_session_factory, config=PersistenceConfig())
+    rows = _detection_rows("text")
+    await persister.save(rows)
+
+    assert committed_rows == [rows]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_groups_detections_into_one_transaction(
+    fake_session_factory: Callable, committed_rows: list[list]
+) -> None:
+    config = PersistenceConfig(write_behind=True, flush_interval_ms=60_000)
+    persister = DetectionPersister(session_factory=fake_session_factory, config=config)
+    persister.start()
+    detections = [_detection_rows(f"text {idx}") for idx in range(3)]
+    for rows in detections:
+        await persister.save(rows)
+    assert committed_rows == []
+    assert persister.status()["buffered_rows"] == 6  # noqa: PLR2004
+
+    await persister.stop()
+    assert committed_rows == [[row for rows in detections for row in rows]]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_waits_for_flush(fake_session_factory: Callable, committed_rows: list[list]) -> None:
+    config = PersistenceConfig(write_behind=True, flush_interval_ms=10, wait_for_flush=True)
+    persister = DetectionPersister(session_factory=fake_session_factory, config=config)
+    persister.start()
+    await asyncio.wait_for(
+        asyncio.gather(persister.save(_detection_rows("first")), persister.save(_detection_rows("second"))), timeout=1
+    )
+    await persister.stop()
+
+    assert len(committed_rows) == 1
+    assert len(committed_rows[0]) == 4  # noqa: PLR2004
+
+
+class _FlakyAsyncSession(FakeAsyncSession):
+    """Fails its first `n_failures` commits, counted across sessions in `failures`"""
+
+    def __init__(self, commits: list[list], failures: list[int], n_failures: int) -> None:
+        super().__init__(commits=commits)
+        self.failures, self.n_failures = failures, n_failures
+
+    async def commit(self) -> None:
+        if len(self.failures) < self.n_failures:
+            self.failures.append(1)
+            raise ConnectionError("Database unavailable")
+        await super().commit()
+
+
+def _flaky_session_factory(commits: list[list], n_failures: int) -> Callable:
+    failures: list[int] = []
+    return lambda: _FlakyAsyncSession(commits=commits, failures=failures, n_failures=n_failures)
+
+
+@pytest.mark.asyncio
+async def test_write_behind_retries_failed_writes(committed_rows: list[list]) -> None:
+    config = PersistenceConfig(write_behind=True, flush_interval_ms=10, wait_for_flush=True, max_write_attempts=3)
+    persister = DetectionPersister(session_factory=_flaky_session_factory(committed_rows, n_failures=2), config=config)
+    persister.start()
+    rows = _detection_rows("text")
+    await asyncio.wait_for(persister.save(rows), timeout=1)
+    await persister.stop()
+
+    assert committed_rows == [rows]
+    assert persister.status()["dropped_rows"] == 0
+
+
+@pytest.mark.asyncio
+async def test_write_behind_drops_rows_after_max_write_attempts(committed_rows: list[list]) -> None:
+    config = PersistenceConfig(write_behind=True, flush_interval_ms=10, max_write_attempts=2)
+    persister = DetectionPersister(session_factory=_flaky_session_factory(committed_rows, n_failures=2), config=config)
+    persister.start()
+    await persister.save(_detection_rows("text"))
+    await asyncio.wait_for(persister.stop(), timeout=1)
+
+    assert committed_rows == []
+    assert persister.status()["dropped_rows"] == 2  # noqa: PLR2004
+
+
+class _SlowAsyncSession(FakeAsyncSession):
+    def __init__(self, commits: list[list], committing: asyncio.Event) -> None:
+        super().__init__(commits=commits)
+        self.committing = committing
+
+    async def commit(self) -> None:
+        self.committing.set()
+        await asyncio.sleep(0.05)
+        await super().commit()
+
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_the_flush_in_progress(committed_rows: list[list]) -> None:
+    committing = asyncio.Event()
+    session_factory: Callable = lambda: _SlowAsyncSession(commits=committed_rows, committing=committing)  # noqa: E731
+    config = PersistenceConfig(write_behind=True, flush_interval_ms=10, wait_for_flush=True)
+    persister = DetectionPersister(session_factory=session_factory, config=config)
+    persister.start()
+    rows = _detection_rows("text")
+    saved = asyncio.create_task(persister.save(rows))
+    await asyncio.wait_for(committing.wait(), timeout=1)
+    await persister.stop()
+
+    assert committed_rows == [rows]
+    await asyncio.wait_for(saved, timeout=1)
+
+
+class _ConfigSession:
+    def __init__(self, config_rows: list[LLMConfigSQLModel]) -> None:
+        self.config_rows = {row.config_hash: row for row in config_rows}
+
+    async def get(self, model: type, key: str) -> LLMConfigSQLModel | None:
+        return self.config_rows.get(key)
+
+
+@pytest.mark.asyncio
+async def test_compact_and_expand_llm_run() -> None:
+    prompt_inputs = {INPUT_TEXT_KEY: "Some ```text```\non two lines", INPUT_VERDICT_KEY: "not hate speech"}
+    llm_run = LLMRunSQLModel(
+        prompt=HATE_SPEECH_REASONING_PROMPT.format_inputs(prompt_inputs),
+        llm_model_name="model",
+        success=True,
+        llm_model_configs={"n_ctx": 2048},
+        run_configs={"temperature": 0, "grammar": object()},
+    )
+    full_llm_run = llm_run.model_copy()
+    find_prompt_template(llm_run)
+    assert llm_run.prompt_template_id == HATE_SPEECH_REASONING_PROMPT.template_id
+    assert llm_run.prompt_inputs == prompt_inputs
+
+    config_rows = compact_llm_run(llm_run)
+    assert llm_run.prompt is None
+    assert llm_run.llm_model_configs is None
+    assert llm_run.run_configs is None
+    assert [row.config_hash for row in config_rows] == [llm_run.llm_model_config_hash, llm_run.run_config_hash]
+    assert compact_llm_run(llm_run) == [], "Expected a compact run to be left as is"
+
+    expanded = await expand_llm_run(session=_ConfigSession(config_rows), llm_run_sql=llm_run)  # type: ignore[arg-type]
+    assert expanded.prompt == full_llm_run.prompt
+    assert expanded.llm_model_configs == full_llm_run.llm_model_configs
+    assert expanded.run_configs == full_llm_run.run_configs
@@ -0,0 +1,54 @@
+import time
+import uuid
+
+import pytest
+
+from src.config import CONFIGS, ResultCacheConfig
+from src.llm.prompts import HATE_SPEECH_DETECTION_PROMPT
+from src.models import DetectHateSpeechSQLModel
+from src.result_cache import DetectionResultCache, LRUCache, detection_cache_key
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache: LRUCache[str, int] = LRUCache(max_size=2, ttl_s=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3  # noqa: PLR2004
+
+
+def test_lru_cache_expires_entries() -> None:
+    cache: LRUCache[str, int] = LRUCache(max_size=2, ttl_s=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_detection_cache_key() -> None:
+    key = detection_cache_key(text="Some  text\n", prompt=HATE_SPEECH_DETECTION_PROMPT, llm_config=CONFIGS.llm)
+    assert key == detection_cache_key(text="Some text", prompt=HATE_SPEECH_DETECTION_PROMPT, llm_config=CONFIGS.llm)
+
+    other_run_configs = CONFIGS.llm.model_copy(update={"run_configs": {**CONFIGS.llm.run_configs, "temperature": 1}})
+    assert key != detection_cache_key(
+        text="Some text", prompt=HATE_SPEECH_DETECTION_PROMPT, llm_config=other_run_configs
+    )
+
+
+@pytest.mark.asyncio
+async def test_detection_result_cache_serves_in_process_hits() -> None:
+    cache = DetectionResultCache(config=ResultCacheConfig(db_lookup=False))
+    result = DetectHateSpeechSQLModel(
+        text="Some text", is_hate_speech=False, target_of_hate=[], reasoning="", llm_run_id=uuid.uuid4()
+    )
+    assert await cache.get(session=None, key="key") is None  # type: ignore[arg-type]
+    cache.put(key="key", result=result)
+
+    cached = await cache.get(session=None, key="key")  # type: ignore[arg-type]
+    assert cached is not None
+    assert cached.uuid == result.uuid
+    assert cached.llm_run_id == result.llm_run_id
+    assert cache.status()["hit_ratio"] == 0.5  # noqa: PLR2004
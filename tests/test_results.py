@@ -0,0 +1,39 @@
+import uuid as uuid_pkg
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.models import DetectHateSpeechSQLModel
+from src.results import InvalidCursorError, ResultFilters, decode_cursor, encode_cursor, results_stmt
+
+
+def _compile(filters: ResultFilters, cursor: str | None = None) -> str:
+    return str(results_stmt(filters=filters, limit=10, cursor=cursor).compile(dialect=postgresql.dialect()))
+
+
+def test_cursor_roundtrip() -> None:
+    result = DetectHateSpeechSQLModel(
+        text="text", is_hate_speech=False, target_of_hate=[], reasoning="", llm_run_id=uuid_pkg.uuid4()
+    )
+    assert decode_cursor(encode_cursor(result)) == (result.created_at, result.uuid)
+    for cursor in ["not a cursor", "bm90IGEgY3Vyc29y"]:
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor)
+
+
+def test_results_stmt_uses_keyset_pagination() -> None:
+    sql = _compile(ResultFilters())
+    assert "WHERE" not in sql
+    assert "ORDER BY detect_hate_speech_result.created_at DESC, detect_hate_speech_result.uuid DESC" in sql
+
+    result = DetectHateSpeechSQLModel(
+        text="text", is_hate_speech=True, target_of_hate=["Women"], reasoning="", llm_run_id=uuid_pkg.uuid4()
+    )
+    sql = _compile(
+        ResultFilters(created_after=datetime(2026, 1, 1, tzinfo=timezone.utc), is_hate_speech=True, target="Women"),
+        cursor=encode_cursor(result),
+    )
+    assert "OFFSET" not in sql
+    assert "detect_hate_speech_result.target_of_hate @> " in sql
+    assert "detect_hate_speech_result.created_at < %(created_at_3)s OR detect_hate_speech_result.uuid < " in sql
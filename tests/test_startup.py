@@ -0,0 +1,61 @@
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from src.config import CONFIGS, LLMExecutorConfig, LLMPoolConfig, StartupConfig
+from src.llm import LLMService
+from src.llm.executor import InferenceExecutor
+from src.llm.registry import ModelRegistry
+from src.startup import WARMUP_TEXT, AppStarter, StartupPhases
+from tests import TEST_DIR_PATH
+
+
+def test_import_app_loads_no_settings_llama_cpp_nor_numpy() -> None:
+    code = (
+        "import sys, src.app, src.config; "
+        "assert src.config.load_configs.cache_info().currsize == 0; "
+        "assert 'dynaconf' not in sys.modules and 'llama_cpp.llama' not in sys.modules; "
+        "assert 'numpy.linalg' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=TEST_DIR_PATH.parent, check=True)  # noqa: S603
+
+
+@pytest.mark.asyncio
+async def test_app_starter_warms_up_every_instance_before_ready(
+    stub_llm_service: LLMService, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    prompts: list[str] = []
+    worker_names: list[str] = []
+    run_completion = stub_llm_service.run_completion
+
+    def _record_run_completion(**kwargs: object) -> object:
+        prompts.append(kwargs["prompt_inputs"])  # type: ignore[arg-type]
+        worker_names.append(threading.current_thread().name)
+        return run_completion(**kwargs)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(stub_llm_service, "run_completion", _record_run_completion)
+    llm_config = CONFIGS.llm.model_copy(update={"pool": LLMPoolConfig(size=2)})
+    registry = ModelRegistry(llm_configs=[llm_config], factory=lambda _llm_config: stub_llm_service)
+    executor = InferenceExecutor(registry=registry, config=LLMExecutorConfig())
+    starter = AppStarter(
+        registry=registry, executor=executor, phases=StartupPhases(), config=StartupConfig(warmup=True)
+    )
+    assert not starter.is_ready
+    # A worker still busy when the warm-up starts
+    busy_job = executor.submit(lambda llm, cancel_event: time.sleep(0.2))
+
+    starter.start()
+    await starter._task  # type: ignore[misc]
+    await executor.wait(busy_job)
+    executor.shutdown()
+
+    assert starter.is_ready
+    assert starter.error is None
+    assert list(starter.status()["phases_s"]) == ["grammars", "models", "executor", "warmup"]
+    # Both prompts on both instances, i.e.: on both workers
+    assert prompts == [{"text": WARMUP_TEXT}] * 4
+    assert sorted(Counter(worker_names).values()) == [2, 2]
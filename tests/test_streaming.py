@@ -0,0 +1,56 @@
+import json
+from collections.abc import Callable
+
+import pytest
+
+from src.config import CONFIGS, PersistenceConfig, ResultCacheConfig
+from src.llm import LLMService
+from src.llm.detect_hate_speech import llm_detect_hate_speech
+from src.llm.executor import InferenceExecutor
+from src.llm.registry import ModelRegistry
+from src.models import DetectHateSpeechSQLModel, LLMRunSQLModel
+from src.persistence import DetectionPersister
+from src.result_cache import DetectionResultCache
+from src.streaming import SSE_EVENTS, DetectionStreamer
+
+
+def _parse_sse(events: list[bytes]) -> list[tuple[str, dict]]:
+    parsed = []
+    for event in events:
+        event_line, data_line = event.decode().strip().split("\n")
+        parsed.append((event_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: "))))
+    return parsed
+
+
+@pytest.mark.asyncio
+async def test_detection_streamer_sends_verdict_before_reasoning_ends(
+    stub_llm_service: LLMService, fake_session_factory: Callable, committed_rows: list[list]
+) -> None:
+    registry = ModelRegistry(llm_configs=[CONFIGS.llm], factory=lambda _llm_config: stub_llm_service)
+    executor = InferenceExecutor(registry=registry, config=CONFIGS.llm.executor)
+    streamer = DetectionStreamer(
+        executor=executor,
+        result_cache=DetectionResultCache(config=ResultCacheConfig(db_lookup=False)),
+        persister=DetectionPersister(session_factory=fake_session_factory, config=PersistenceConfig()),
+    )
+    stream = streamer.submit(text="Some text", cache_key="key")
+    events = _parse_sse([event async for event in streamer.events(stream=stream)])
+    executor.shutdown()
+
+    event_names = [name for name, _ in events]
+    assert event_names[-1] == SSE_EVENTS.result
+    assert event_names.count(SSE_EVENTS.verdict) == 1
+    assert event_names.index(SSE_EVENTS.verdict) < len(event_names) - 2, "Expected verdict before the last token"
+
+    llm_run_sql, detect_res = committed_rows[0]
+    assert isinstance(llm_run_sql, LLMRunSQLModel)
+    assert isinstance(detect_res, DetectHateSpeechSQLModel)
+    assert llm_run_sql.queue_wait_s is not None
+    generated = "".join(data["text"] for name, data in events if name == SSE_EVENTS.token)
+    assert llm_run_sql.llm_outputs["choices"][0]["text"] == generated
+
+    non_streamed_run = llm_detect_hate_speech(llm=stub_llm_service, text="Some text")
+    assert llm_run_sql.llm_outputs["usage"] == non_streamed_run.llm_outputs["usage"]  # type: ignore[index]
+    assert non_streamed_run.parsed_output is not None
+    assert events[-1][1] == json.loads(detect_res.model_dump_json())
+    assert detect_res.is_hate_speech == non_streamed_run.parsed_output.is_hate_speech